@@ -1,10 +1,9 @@
 """Welcome to Pynecone! This file outlines the steps to create a basic app."""
-import asyncio
 from typing import Literal
 
 import reflex as rx
 
-from core import generate_answer
+from core import agenerate_answer
 
 
 class State(rx.State):
@@ -28,11 +27,10 @@ class State(rx.State):
 
         # send question -> get answer
         self.chat_history.append(("bot", ""))
-        for res in generate_answer(self.question):
+        async for res in agenerate_answer(self.question):
             self.is_loading = False
             self.chat_history[-1] = ("bot", self.chat_history[-1][1] + res)
             yield
-            await asyncio.sleep(0.05)
 
 
 def header_container():
@@ -0,0 +1,13 @@
+"""
+OpenAI 없이 core의 처리량과 지연을 측정하는 benchmark.
+
+    python -m benchmarks --iterations 20 --output benchmarks/results/latest.json
+
+brute-force index의 양자화 형식별 memory/recall 비교
+
+    python -m benchmarks.quantization --size 20000 --top-k 10
+
+chroma HNSW 설정(M, construction_ef, search_ef)별 recall/지연/index 크기 비교
+
+    python -m benchmarks.hnsw --m 8,16,32 --search-ef 10,50,100
+"""
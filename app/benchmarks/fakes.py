@@ -0,0 +1,121 @@
+"""benchmark와 test용 가짜 chat model, embedding, tokenizer. 같은 입력에는 항상 같은 결과를 반환합니다."""
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, Optional
+
+import numpy as np
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings.base import Embeddings
+from langchain.schema import ChatGeneration, ChatResult
+from langchain.schema.messages import AIMessage, BaseMessage
+
+from core.llm_cache import LLMCacheMixin
+
+
+class FakeChatModel(LLMCacheMixin, BaseChatModel):
+    """
+    정해진 response를 token 단위로 나눠 생성하는 chat model.
+    첫 token까지 first_token_latency, 이후 token마다 token_latency만큼 기다립니다.
+    llm_cache를 지정하면 실제 chain과 같이 응답을 cache 합니다.
+    """
+
+    response: str = "가짜 답변입니다."
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def get_tokens(self) -> list[str]:
+        return re.findall(r"\s*\S+", self.response) or [self.response]
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self.get_tokens()):
+            if i:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self.get_tokens()):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    문자 bigram을 hashing한 embedding.
+    글자가 겹치는 문장끼리 가까워서 검색과 router가 실제와 비슷하게 동작합니다.
+    요청마다 latency, text마다 latency_per_text만큼 기다립니다.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        text = f" {text.strip()} "
+        for i in range(len(text) - 1):
+            digest = hashlib.md5(text[i:i + 2].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_latency(self, count: int) -> float:
+        self.calls += 1
+        return self.latency + self.latency_per_text * count
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self._get_latency(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self._get_latency(1))
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(self._get_latency(len(texts)))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self._get_latency(1))
+        return self._embed(text)
+
+
+class FakeEncoding:
+    """
+    tiktoken BPE 파일을 내려받지 않고 token 수를 세는 encoding.
+    글자 두 개, 기호 하나, 연속된 공백을 각각 token 하나로 셉니다.
+    """
+
+    _TOKEN = re.compile(r"\w{1,2}|[^\w\s]|\s+")
+
+    def encode(self, text: str, **kwargs: Any) -> list[int]:
+        return [len(token) for token in self._TOKEN.findall(text)]
@@ -0,0 +1,170 @@
+"""
+chroma HNSW 설정(M, construction_ef, search_ef)별 recall@k, 검색 지연, index 크기를 비교합니다.
+
+적재된 chroma collection(config.CHROMA_COLLECTION_NAME과 data source별 collection)의 embedding으로
+설정마다 임시 collection을 새로 만들고, numpy 전체 탐색 결과를 정답으로 recall@k를 계산합니다.
+적재된 data가 없거나 --size를 주면 cluster가 있는 가짜 embedding을 사용합니다.
+
+    python -m benchmarks.hnsw --m 8,16,32 --construction-ef 100,200 --search-ef 10,50,100
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from benchmarks.quantization import get_recall, make_queries, make_vectors
+from benchmarks.run import get_stats
+from core.vectorstore import NumpyVectorStore, normalize_rows
+from rxconfig import config
+
+# chroma는 batch_size개씩 HNSW에 넣기 전까지 brute-force buffer에 둡니다.
+BATCH_SIZE = 100
+
+
+def load_corpus(persist_directory: str, collection_name: str) -> Optional[np.ndarray]:
+    """적재된 chroma collection들의 embedding을 읽습니다. 없으면 None"""
+    if not os.path.exists(persist_directory):
+        return None
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    vectors = []
+    for collection in client.list_collections():
+        if collection.name == collection_name or collection.name.startswith(f"{collection_name}_"):
+            vectors.extend(collection.get(include=["embeddings"])["embeddings"])
+    return normalize_rows(np.asarray(vectors, dtype=np.float32)) if vectors else None
+
+
+def get_directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def evaluate(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    expected: np.ndarray,
+    top_k: int,
+    metadata: dict[str, Any],
+    workdir: str,
+) -> dict[str, Any]:
+    import chromadb
+
+    # sqlite를 제외한 segment 디렉터리 크기를 재기 위해 설정마다 새 디렉터리를 사용합니다.
+    client = chromadb.PersistentClient(path=workdir)
+    indexed = len(vectors) // BATCH_SIZE * BATCH_SIZE
+    collection = client.create_collection(
+        "tuning",
+        metadata={
+            **metadata,
+            "hnsw:batch_size": BATCH_SIZE,
+            # 전체를 넣은 뒤 한 번만 디스크에 저장합니다.
+            "hnsw:sync_threshold": max(indexed, BATCH_SIZE),
+        },
+        embedding_function=None,
+    )
+
+    started = time.perf_counter()
+    for start in range(0, len(vectors), 5000):
+        batch = vectors[start:start + 5000]
+        collection.add(ids=[f"{start + i}" for i in range(len(batch))], embeddings=batch.tolist())
+    build_seconds = time.perf_counter() - started
+
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=top_k, include=[])
+        latencies.append(time.perf_counter() - started)
+        found.append([int(i) for i in result["ids"][0]])
+
+    stats = get_stats(latencies)
+    stats[f"recall@{top_k}"] = get_recall(found, expected.tolist())
+    stats["build_seconds"] = build_seconds
+    stats["index_bytes"] = get_directory_size(workdir) - os.path.getsize(os.path.join(workdir, "chroma.sqlite3"))
+    stats["indexed"] = indexed
+    return stats
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    vectors = None if args.size else load_corpus(config.CHROMA_PERSIST_DIRECTORY, config.CHROMA_COLLECTION_NAME)
+    source = "chroma"
+    if vectors is None:
+        vectors = make_vectors(args.size or 20000, args.dim, args.clusters, args.noise, args.seed)
+        source = "synthetic"
+
+    queries = make_queries(vectors, args.queries, args.query_noise, args.seed + 1)
+    exact = NumpyVectorStore([f"{i}" for i in range(len(vectors))], {}, vectors)
+    expected, _ = exact.search_indices(queries, args.top_k)
+
+    results = []
+    for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+        metadata = {
+            "hnsw:space": "cosine",
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef,
+        }
+        with tempfile.TemporaryDirectory(prefix="hnsw-") as workdir:
+            stats = evaluate(vectors, queries, expected, args.top_k, metadata, workdir)
+        results.append({"M": m, "construction_ef": construction_ef, "search_ef": search_ef, **stats})
+        print(
+            f"M {m:3d}  construction_ef {construction_ef:4d}  search_ef {search_ef:4d}"
+            f"  recall@{args.top_k} {stats[f'recall@{args.top_k}']:.4f}"
+            f"  p50 {stats['p50_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms"
+            f"  index {stats['index_bytes'] / 2 ** 20:8.1f}MB  build {stats['build_seconds']:6.1f}s"
+        )
+
+    return {
+        "settings": {
+            "source": source,
+            "size": int(len(vectors)),
+            "dim": int(vectors.shape[1]),
+            "queries": int(len(queries)),
+            "top_k": args.top_k,
+            "current": {
+                "M": config.CHROMA_HNSW_M,
+                "construction_ef": config.CHROMA_HNSW_CONSTRUCTION_EF,
+                "search_ef": config.CHROMA_HNSW_SEARCH_EF,
+            },
+        },
+        "results": results,
+    }
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--m", type=parse_ints, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=parse_ints, default=[100, 200])
+    parser.add_argument("--search-ef", type=parse_ints, default=[10, 50, 100])
+    parser.add_argument("--size", type=int, help="가짜 embedding 개수. 주면 적재된 data 대신 사용합니다.")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.02)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 경로")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+brute-force index의 양자화 형식별 memory 사용량, recall@k, 검색 지연을 비교합니다.
+
+float32("none") 검색 결과를 정답으로 두고, float16/int8 1차 검색 + float32 re-ranking의 recall@k를 계산합니다.
+기본값은 cluster가 있는 가짜 embedding이고, --store로 적재된 index(chroma/<collection>.vectors)를 지정하면
+실제 chunk embedding에 저장된 chunk를 질문으로 사용합니다.
+
+    python -m benchmarks.quantization --size 20000 --dim 1536 --top-k 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from benchmarks.run import get_stats
+from core.vectorstore import QUANTIZATIONS, NumpyVectorStore, normalize_rows
+
+
+def make_vectors(size: int, dim: int, clusters: int, noise: float, seed: int) -> np.ndarray:
+    """비슷한 chunk끼리 모여 있는 corpus처럼 cluster 중심 주변에 vector를 만듭니다."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=size)] + noise * rng.normal(size=(size, dim)).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """corpus에서 고른 vector를 조금 흔들어, 저장된 vector와 똑같지 않은 질문을 만듭니다."""
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+    return normalize_rows(
+        np.asarray(vectors[picked], dtype=np.float32)
+        + noise * rng.normal(size=(len(picked), vectors.shape[1])).astype(np.float32)
+    )
+
+
+def get_recall(found: list[list[int]], expected: list[list[int]]) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, expected) if len(b)]))
+
+
+def evaluate(
+    store: NumpyVectorStore,
+    queries: np.ndarray,
+    top_k: int,
+    expected: Optional[np.ndarray],
+) -> tuple[dict[str, Any], np.ndarray]:
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        indices, _ = store.search_indices([query], top_k)
+        latencies.append(time.perf_counter() - started)
+        results.append(indices[0])
+    results = np.asarray(results)
+
+    stats = get_stats(latencies)
+    stats["memory_bytes"] = store.nbytes
+    stats["bytes_per_vector"] = store.nbytes / len(store)
+    if expected is not None:
+        stats[f"recall@{top_k}"] = get_recall(results.tolist(), expected.tolist())
+    return stats, results
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="quantization-") as workdir:
+        if args.store:
+            path = args.store
+            vectors = np.load(f"{path}.npy", mmap_mode="r")
+        else:
+            path = os.path.join(workdir, "vectors")
+            vectors = make_vectors(args.size, args.dim, args.clusters, args.noise, args.seed)
+            NumpyVectorStore([f"{i}" for i in range(len(vectors))], {}, vectors).save(path)
+
+        queries = make_queries(vectors, args.queries, args.query_noise, args.seed + 1)
+
+        results, expected = {}, None
+        for quantization in QUANTIZATIONS:
+            store = NumpyVectorStore.load(path, quantization=quantization, rerank_multiplier=args.rerank_multiplier)
+            results[quantization], found = evaluate(store, queries, args.top_k, expected)
+            if quantization == "none":
+                expected = found
+                results[quantization][f"recall@{args.top_k}"] = 1.0
+
+    return {
+        "settings": {
+            "store": args.store,
+            "size": int(len(vectors)),
+            "dim": int(vectors.shape[1]),
+            "queries": int(len(queries)),
+            "top_k": args.top_k,
+            "rerank_multiplier": args.rerank_multiplier,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="적재된 index 경로(.npy/.json 확장자 제외). 없으면 가짜 embedding을 만듭니다.")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.02)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-multiplier", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 경로")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=4)
+
+    recall = f"recall@{args.top_k}"
+    for quantization, stats in report["results"].items():
+        print(
+            f"{quantization:8s} memory {stats['memory_bytes'] / 2 ** 20:8.1f}MB"
+            f"  {recall} {stats[recall]:.4f}"
+            f"  p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+가짜 LLM/embedding과 임시 chroma 디렉터리로 core의 처리량과 지연을 측정하고 JSON으로 저장합니다.
+
+측정 항목
+- load_data_and_upload_chroma: 전처리 + 적재 + 요약 시간
+- get_similar_docs: 검색 지연
+- get_similar_docs_batch: QUERIES 전체를 한 번에 검색하는 지연
+- create_answer: 답변 생성 지연
+- generate_answer: 첫 token까지의 시간과 전체 시간
+
+결과 파일에는 commit, 가짜 backend 설정, 항목별 통계와 단계별(core.metrics) 분위수가 함께 기록되어
+--baseline으로 이전 commit의 결과와 비교할 수 있습니다.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeEncoding
+from rxconfig import PROJECT_DIR, config
+
+QUERIES = [
+    "카카오싱크가 뭐야?",
+    "카카오싱크 간편가입 설정 방법 알려줘",
+    "카카오 소셜 로그인은 어떻게 연동해?",
+    "카카오톡 친구 목록 가져오기",
+    "카카오톡 채널 메시지는 어떻게 보내?",
+    "채널 관리자센터에서 채널을 만드는 방법",
+    "안녕하세요",
+    "그거 버그 같아",
+]
+
+# chain별 가짜 응답. 나머지 chain은 ANSWER를 생성합니다.
+RESPONSES = {
+    "intent": "question",
+    "branch": "sync",
+    "summarize": "카카오 API, 로그인, 메시지, 채널, 설정",
+    "summarize_history": "사용자는 카카오 API 사용 방법을 질문했습니다.",
+}
+ANSWER = (
+    "카카오싱크는 카카오톡 사용자 정보로 서비스에 간편하게 가입하고 로그인할 수 있게 해주는 기능입니다. "
+    "내 애플리케이션 설정에서 카카오 로그인을 활성화한 뒤 동의 항목을 설정하면 사용할 수 있습니다."
+)
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_stats(latencies: list[float], elapsed: Optional[float] = None) -> dict[str, float]:
+    values = np.array(latencies, dtype=np.float64) * 1000
+    stats = {
+        "count": len(latencies),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+    if elapsed:
+        stats["throughput_per_sec"] = len(latencies) / elapsed
+    return stats
+
+
+def measure(func: Callable[[int], Any], iterations: int) -> dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - call_started)
+    return get_stats(latencies, time.perf_counter() - started)
+
+
+def setup(workdir: str, args: argparse.Namespace) -> dict[str, Any]:
+    """config를 임시 디렉터리로 돌리고, core의 chain과 embedding을 가짜 backend로 바꿉니다."""
+    config.CHROMA_PERSIST_DIRECTORY = os.path.join(workdir, "chroma")
+    config.HISTORY_BACKEND = "sqlite"
+    config.HISTORY_DB_PATH = os.path.join(workdir, "history.db")
+    config.ANSWER_CACHE_ENABLED = args.answer_cache
+    config.RETRIEVAL_CACHE_ENABLED = args.retrieval_cache
+    config.LLM_CACHE_ENABLED = args.llm_cache
+    config.LLM_CACHE_PATH = os.path.join(workdir, "llm_cache.db")
+    config.VECTOR_STORE_BACKEND = args.vector_store
+    if args.prefetch:
+        config.PIPELINE_PREFETCH_STAGES = ["branch"]
+        config.SPECULATIVE_RETRIEVAL = True
+    config.METRICS_ENABLED = True
+    config.METRICS_JSONL_PATH = ""
+
+    # chain을 만들 때 key 형식만 확인하고, 실제 요청은 가짜 backend로 보냅니다.
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    from core import chroma, const, llm, memory, metrics, preprocess
+    from core.cache import RETRIEVAL_CACHE
+    from core.embedding_cache import CachedEmbeddings
+
+    # token 수는 tiktoken BPE 파일을 내려받지 않는 가짜 encoding으로 셉니다.
+    encoding = FakeEncoding()
+    memory.get_encoding = lambda: encoding
+
+    chroma.EMBEDDINGS = FakeEmbeddings(
+        latency=args.embedding_latency,
+        latency_per_text=args.embedding_latency_per_text,
+    )
+    if args.embedding_cache:
+        chroma.EMBEDDINGS = CachedEmbeddings(
+            chroma.EMBEDDINGS,
+            path=os.path.join(workdir, "embeddings.db"),
+            max_size=config.EMBEDDING_CACHE_MAX_SIZE,
+        )
+    chroma.init_chroma()
+
+    llm.init_chains()
+    for name, chain in llm.CHAIN_DICT.items():
+        fake = FakeChatModel(
+            response=RESPONSES.get(name, ANSWER),
+            first_token_latency=args.llm_latency,
+            token_latency=args.token_latency,
+        )
+        # 실제 chain과 같이 streaming하지 않는 chain만 LLM cache를 사용합니다.
+        fake.llm_cache = chain.llm.llm_cache
+        chain.llm = llm.LLM_DICT[name] = fake
+
+    llm.HISTORY_DIR = os.path.join(workdir, "history")
+    # 전처리한 data도 repository가 아닌 임시 디렉터리에 저장합니다.
+    const.PRE_DIR = os.path.join(workdir, "pre")
+    preprocess.SUCCESS_PATH = os.path.join(workdir, "RESULT.json")
+    return dict(chroma=chroma, llm=llm, metrics=metrics, preprocess=preprocess, retrieval_cache=RETRIEVAL_CACHE)
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        core = setup(workdir, args)
+        chroma, llm, metrics, preprocess = core["chroma"], core["llm"], core["metrics"], core["preprocess"]
+        results, stages = {}, {}
+
+        def record(name: str, func: Callable[[int], Any], iterations: int):
+            metrics.reset()
+            results[name] = measure(func, iterations)
+            stages[name] = metrics.export_json()
+
+        def load_data(_: int):
+            preprocess.SUMMARY = {}
+            preprocess.load_data_and_upload_chroma()
+
+        record("load_data_and_upload_chroma", load_data, 1)
+        results["load_data_and_upload_chroma"]["documents"] = chroma.count_documents()
+
+        record(
+            "get_similar_docs",
+            lambda i: chroma.get_similar_docs(QUERIES[i % len(QUERIES)], top_k=args.top_k),
+            args.iterations,
+        )
+
+        record(
+            "get_similar_docs_batch",
+            lambda _: chroma.get_similar_docs_batch(QUERIES, top_k=args.top_k),
+            max(1, args.iterations // len(QUERIES)),
+        )
+        results["get_similar_docs_batch"]["queries_per_call"] = len(QUERIES)
+        if args.retrieval_cache:
+            results["get_similar_docs_batch"]["retrieval_cache"] = core["retrieval_cache"].stats()
+
+        record(
+            "create_answer",
+            lambda i: llm.create_answer(QUERIES[i % len(QUERIES)], conversation_id=f"benchmark-{uuid.uuid4()}"),
+            args.iterations,
+        )
+
+        first_tokens = []
+
+        def generate(i: int):
+            started = time.perf_counter()
+            first_token = None
+            for _ in llm.generate_answer(QUERIES[i % len(QUERIES)], conversation_id=f"benchmark-{uuid.uuid4()}"):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            first_tokens.append(first_token or 0.0)
+
+        record("generate_answer", generate, args.iterations)
+        results["generate_answer_first_token"] = get_stats(first_tokens)
+
+        return {
+            "commit": get_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "settings": {
+                "iterations": args.iterations,
+                "top_k": args.top_k,
+                "llm_latency": args.llm_latency,
+                "token_latency": args.token_latency,
+                "embedding_latency": args.embedding_latency,
+                "embedding_latency_per_text": args.embedding_latency_per_text,
+                "answer_cache": args.answer_cache,
+                "retrieval_cache": args.retrieval_cache,
+                "llm_cache": args.llm_cache,
+                "embedding_cache": args.embedding_cache,
+                "vector_store": args.vector_store,
+                "prefetch": args.prefetch,
+                "router": config.ROUTER_ENABLED,
+            },
+            "results": results,
+            "stages": stages,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    """baseline 대비 p50/p95 변화율"""
+    lines = [f"baseline {baseline.get('commit')} -> {report.get('commit')}"]
+    for name, stats in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        for key in ["p50_ms", "p95_ms"]:
+            if previous.get(key):
+                change = (stats[key] - previous[key]) / previous[key] * 100
+                lines.append(f"{name:32s} {key:6s} {previous[key]:10.2f} -> {stats[key]:10.2f} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="첫 token까지의 지연(초)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="token 사이의 지연(초)")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="embedding 요청당 지연(초)")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=0.0)
+    parser.add_argument("--answer-cache", action="store_true", help="semantic answer cache를 켜고 측정합니다.")
+    parser.add_argument("--retrieval-cache", action="store_true", help="검색 결과 cache를 켜고 측정합니다.")
+    parser.add_argument("--llm-cache", action="store_true", help="intent/branch 등의 LLM 응답 cache를 켜고 측정합니다.")
+    parser.add_argument("--embedding-cache", action="store_true", help="embedding cache를 켜고 측정합니다.")
+    parser.add_argument(
+        "--prefetch", action="store_true",
+        help="branch 판단과 문서 검색을 intent 판단과 동시에 미리 실행하고 측정합니다.",
+    )
+    parser.add_argument(
+        "--vector-store", choices=["auto", "numpy", "chroma"], default=config.VECTOR_STORE_BACKEND,
+        help="검색 backend. auto는 chunk 수에 따라 numpy brute-force와 chroma 중 선택합니다.",
+    )
+    parser.add_argument("--output", help="결과 JSON 경로. 기본값은 benchmarks/results/<commit>.json")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    output = args.output or os.path.join(
+        PROJECT_DIR, "benchmarks", "results", f"{report['commit'] or 'latest'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+
+    for name, stats in report["results"].items():
+        print(f"{name:32s} p50 {stats['p50_ms']:9.2f}ms  p95 {stats['p95_ms']:9.2f}ms")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            print("\n".join(compare(report, json.load(file))))
+    print(f"saved to {output}")
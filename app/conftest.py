@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 os.environ["VERBOSE"] = "true"
 
 # from core import init
@@ -7,3 +9,51 @@ os.environ["VERBOSE"] = "true"
 #
 # def pytest_sessionstart():
 #     init()
+
+
+@pytest.fixture
+def fake_encoding(monkeypatch):
+    """tiktoken BPE 파일을 내려받지 않도록 core.memory의 token 수를 가짜 encoding으로 셉니다."""
+    from benchmarks.fakes import FakeEncoding
+    from core import memory
+
+    encoding = FakeEncoding()
+    monkeypatch.setattr(memory, "get_encoding", lambda: encoding)
+    return encoding
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path, fake_encoding):
+    """
+    core.llm의 chain을 benchmark와 같은 가짜 chat model로 바꾸고, 대화 기록은 임시 sqlite에 저장합니다.
+    chain별 응답은 반환된 module의 CHAIN_DICT[name].llm.response로 바꿀 수 있습니다.
+    """
+    import core
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from benchmarks.run import ANSWER, RESPONSES
+    from core import chroma, llm
+    from rxconfig import config
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(core, "_INITIALIZED", True)
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "RETRIEVAL_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "ROUTER_ENABLED", False)
+    monkeypatch.setattr(config, "HISTORY_BACKEND", "sqlite")
+    monkeypatch.setattr(config, "HISTORY_DB_PATH", f"{tmp_path / 'history.db'}")
+    monkeypatch.setattr(llm, "HISTORY_DIR", f"{tmp_path / 'history'}")
+    monkeypatch.setattr(chroma, "EMBEDDINGS", FakeEmbeddings())
+    monkeypatch.setattr(llm, "LLM_DICT", {})
+    monkeypatch.setattr(llm, "CHAIN_DICT", {})
+    monkeypatch.setattr(llm, "PROMPT_BUILDER_DICT", {})
+
+    async def aget_documents(user_message: str, branch: str, embedding=None) -> list[str]:
+        return [f"{branch} 문서"]
+
+    monkeypatch.setattr(llm, "aget_documents", aget_documents)
+
+    llm.init_chains()
+    for name, chain in llm.CHAIN_DICT.items():
+        chain.llm = llm.LLM_DICT[name] = FakeChatModel(response=RESPONSES.get(name, ANSWER))
+    return llm
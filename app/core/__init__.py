@@ -1,24 +1,88 @@
-from .chroma import get_similar_docs, query_db, init_chroma
-from .preprocess import load_data_and_upload_chroma
-from .llm import init_chains, create_answer, generate_answer
+"""
+import core는 아무것도 초기화하지 않습니다.
+아래의 함수는 처음 접근할 때 해당 module을 import 하고,
+chroma/chain 생성과 data 적재는 init()을 직접 호출하거나 답변/검색 함수를 처음 호출할 때 실행됩니다.
+"""
+import importlib
+import threading
+
+_EXPORTS = {
+    "get_similar_docs": "chroma",
+    "aget_similar_docs": "chroma",
+    "get_similar_docs_batch": "chroma",
+    "aget_similar_docs_batch": "chroma",
+    "query_db": "chroma",
+    "init_chroma": "chroma",
+    "load_data_and_upload_chroma": "preprocess",
+    "init_chains": "llm",
+    "create_answer": "llm",
+    "generate_answer": "llm",
+    "acreate_answer": "llm",
+    "agenerate_answer": "llm",
+    "create_answers": "llm",
+    "acreate_answers": "llm",
+}
 
 __all__ = [
     "init",
+    "ainit",
     "query_db",
     "get_similar_docs",
+    "aget_similar_docs",
+    "get_similar_docs_batch",
+    "aget_similar_docs_batch",
     "create_answer",
     "generate_answer",
+    "acreate_answer",
+    "agenerate_answer",
+    "create_answers",
+    "acreate_answers",
 ]
 
 _INITIALIZED = False
+_LOCK = threading.Lock()
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
+
+
+def is_initialized() -> bool:
+    return _INITIALIZED
 
 
 def init():
+    """chroma와 chain을 만들고 data를 적재합니다. 여러 번 호출해도 한 번만 실행됩니다."""
     global _INITIALIZED
+    if _INITIALIZED:
+        return
+    with _LOCK:
+        if not _INITIALIZED:
+            from .chroma import init_chroma
+            from .llm import init_chains
+            from .preprocess import load_data_and_upload_chroma
+            from .router import init_routers
+
+            init_chroma()
+            init_chains()
+            load_data_and_upload_chroma()
+            # 첫 질문이 예시 embedding을 기다리지 않도록 data source 요약까지 읽은 뒤 router를 만듭니다.
+            init_routers()
+            _INITIALIZED = True
+
+
+async def ainit():
+    """init의 async 버전. 초기화는 thread pool에서 실행되어 event loop를 막지 않습니다."""
     if not _INITIALIZED:
-        init_chroma()
-        init_chains()
-        load_data_and_upload_chroma()
-        _INITIALIZED = True
+        import asyncio
 
-init()
+        await asyncio.to_thread(init)
@@ -0,0 +1,194 @@
+"""질문 embedding 유사도 기반 답변 cache와 검색 결과 cache"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Iterator, Optional
+
+import numpy as np
+from langchain.schema.document import Document
+
+from core.embedding_cache import normalize_text
+
+from rxconfig import config
+
+
+@dataclass
+class _Entry:
+    key: Hashable
+    vector: np.ndarray
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    같은 key(branch, intent, corpus version)를 가진 답변 중,
+    질문 embedding의 cosine 유사도가 threshold 이상인 답변을 재사용합니다.
+    ttl이 지난 답변은 버리고, max_size를 넘으면 가장 오래 사용되지 않은 답변부터 제거합니다.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_size: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: list[float] | np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, vector: list[float] | np.ndarray, key: Hashable) -> Optional[str]:
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry.key != key:
+                    continue
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id].answer
+
+    def put(self, vector: list[float] | np.ndarray, key: Hashable, answer: str):
+        with self._lock:
+            self._entries[self._next_id] = _Entry(
+                key=key,
+                vector=self._normalize(vector),
+                answer=answer,
+                created_at=time.monotonic(),
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def canonicalize_filters(filters: Any) -> Any:
+    """순서만 다른 filter가 같은 key가 되도록 dict key와 $and/$or/$in/$nin의 항목을 정렬합니다."""
+    if isinstance(filters, dict):
+        return {
+            key: sorted((canonicalize_filters(value) for value in filters[key]), key=json.dumps)
+            if key in ("$and", "$or", "$in", "$nin") else canonicalize_filters(filters[key])
+            for key in sorted(filters)
+        }
+    return filters
+
+
+class RetrievalCache:
+    """
+    (정규화한 질문, filter, top_k)별 검색 결과 LRU.
+    corpus version이 바뀌면 이전 version의 결과는 모두 버리고, 검색 중에 version이 바뀐 결과는 저장하지 않습니다.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.memory_bytes = 0
+        self._entries: OrderedDict[tuple, tuple[list[Document], int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(query: str, top_k: int, filters: Optional[dict[str, Any]]) -> tuple:
+        filters = json.dumps(canonicalize_filters(filters or {}), ensure_ascii=False, sort_keys=True)
+        return normalize_text(query), filters, top_k
+
+    @staticmethod
+    def _sizeof(documents: list[Document]) -> int:
+        return sum(
+            len(doc.page_content.encode("utf-8")) + len(json.dumps(doc.metadata, ensure_ascii=False).encode("utf-8"))
+            for doc in documents
+        )
+
+    def _sync(self, version: int):
+        if version != self.version:
+            self._entries.clear()
+            self.memory_bytes = 0
+            self.version = version
+
+    def get(self, query: str, top_k: int, filters: Optional[dict[str, Any]], version: int) -> Optional[list[Document]]:
+        key = self.get_key(query, top_k, filters)
+        with self._lock:
+            self._sync(version)
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(self._entries[key][0])
+
+    def put(self, query: str, top_k: int, filters: Optional[dict[str, Any]], version: int, documents: list[Document]):
+        key = self.get_key(query, top_k, filters)
+        size = self._sizeof(documents)
+        with self._lock:
+            if self.version is not None and version < self.version:
+                return
+            self._sync(version)
+            if key in self._entries:
+                self.memory_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (list(documents), size)
+            self.memory_bytes += size
+            while len(self._entries) > self.max_size:
+                self.memory_bytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "version": self.version,
+            "memory_bytes": self.memory_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+ANSWER_CACHE = SemanticAnswerCache(
+    threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl=config.ANSWER_CACHE_TTL_SECONDS,
+    max_size=config.ANSWER_CACHE_MAX_SIZE,
+)
+
+
+RETRIEVAL_CACHE = RetrievalCache(max_size=config.RETRIEVAL_CACHE_MAX_SIZE)
+
+
+def iter_cached_answer(answer: str) -> Iterator[str]:
+    """cache된 답변을 생성 중인 답변처럼 단어 단위로 나누어 yield 합니다."""
+    yield from re.findall(r"\s*\S+\s*", answer) or [answer]
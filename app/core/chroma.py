@@ -1,54 +1,695 @@
-from typing import Optional, Any
+import asyncio
+import os
+import threading
+import uuid
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Any
 
 from rxconfig import config
-import chromadb
+from langchain.embeddings.base import Embeddings
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.schema.document import Document
 from langchain.schema.retriever import BaseRetriever
-from langchain.vectorstores import Chroma
 
-CLIENT: Optional[chromadb.Client] = None
-DB: Optional[Chroma] = None
+from core import init
+from core.cache import RETRIEVAL_CACHE
+from core.const import DataSource
+from core.embedding_cache import CachedEmbeddings
+from core.lexical import BM25Index, normalize, reciprocal_rank_fusion
+from core.metrics import span
+from core.passages import diversify, diversify_by_text, merge_adjacent_chunks
+from core.ratelimit import RateLimitedEmbeddings
+from core.vectorstore import NumpyVectorStore
+
+if TYPE_CHECKING:
+    import chromadb
+    from chromadb.api.models.Collection import Collection
+    from langchain.vectorstores import Chroma
+
+CLIENT: Optional["chromadb.Client"] = None
+DB: Optional["Chroma"] = None
 RETRIEVER: Optional[BaseRetriever] = None
+EMBEDDINGS: Optional[Embeddings] = None
+LEXICAL_INDEX: Optional[BM25Index] = None
+_LEXICAL_LOCK = threading.Lock()
+# data source별 collection. get_collection에서 만들고, 다시 적재할 때 교체합니다.
+COLLECTIONS: dict[str, "Collection"] = {}
+# 검색마다 count를 조회하지 않도록 collection별 문서 수를 저장합니다.
+COLLECTION_COUNTS: dict[str, int] = {}
+_PARTITIONED: Optional[bool] = None
+# chunk 수가 적을 때 chroma 대신 사용하는 brute-force 검색 index
+VECTOR_STORE: Optional[NumpyVectorStore] = None
+_VECTOR_STORE_LOADED = False
+_VECTOR_STORE_LOCK = threading.Lock()
+
+# collection에 문서가 새로 적재될 때마다 증가합니다. 검색 결과에 의존하는 cache의 key로 사용합니다.
+CORPUS_VERSION: int = 0
+
+
+def get_corpus_version() -> int:
+    return CORPUS_VERSION
+
+
+def bump_corpus_version() -> int:
+    global CORPUS_VERSION, _PARTITIONED
+    CORPUS_VERSION += 1
+    _PARTITIONED = None
+    return CORPUS_VERSION
+
+
+def get_embeddings() -> Embeddings:
+    """chroma와 router가 함께 사용하는 embedding 함수를 반환합니다."""
+    global EMBEDDINGS
+    if not EMBEDDINGS:
+        if config.RATE_LIMIT_ENABLED:
+            # 재시도는 rate limiter의 backoff가 담당합니다.
+            EMBEDDINGS = RateLimitedEmbeddings(OpenAIEmbeddings(max_retries=1))
+        else:
+            EMBEDDINGS = OpenAIEmbeddings()
+        if config.EMBEDDING_CACHE_ENABLED:
+            # cache에 있는 text는 rate limiter도 거치지 않습니다.
+            EMBEDDINGS = CachedEmbeddings(
+                EMBEDDINGS,
+                path=config.EMBEDDING_CACHE_PATH,
+                max_size=config.EMBEDDING_CACHE_MAX_SIZE,
+            )
+    return EMBEDDINGS
+
+
+def get_lexical_index_path() -> str:
+    return os.path.join(config.CHROMA_PERSIST_DIRECTORY, f"{config.CHROMA_COLLECTION_NAME}.bm25.json")
+
+
+def get_lexical_index() -> BM25Index:
+    """
+    chroma와 같은 chunk로 만든 BM25 index를 반환합니다.
+    저장된 index가 없으면 chroma collection에 적재된 chunk로 만들어 저장합니다.
+    """
+    global LEXICAL_INDEX
+    if LEXICAL_INDEX is None:
+        with _LEXICAL_LOCK:
+            if LEXICAL_INDEX is None:
+                path = get_lexical_index_path()
+                if os.path.exists(path):
+                    LEXICAL_INDEX = BM25Index.load(path)
+                else:
+                    index = BM25Index(config.LEXICAL_NGRAM_SIZES, config.BM25_K1, config.BM25_B)
+                    if DB:
+                        for collection, _ in resolve_collections(None):
+                            data = collection.get(include=["documents", "metadatas"])
+                            index.add_documents([
+                                Document(page_content=content, metadata=metadata or {})
+                                for content, metadata in zip(data["documents"], data["metadatas"])
+                            ])
+                        if len(index):
+                            index.save(path)
+                    LEXICAL_INDEX = index
+    return LEXICAL_INDEX
+
+
+def update_lexical_index(data_source: str, documents: list[Document]):
+    """data source의 chunk를 새로 적재한 documents로 바꾸고 index를 저장합니다."""
+    index = get_lexical_index()
+    with _LEXICAL_LOCK:
+        index.replace_documents("data_source", data_source, documents)
+        index.save(get_lexical_index_path())
+
+
+def search_lexical(
+    query: str,
+    top_k: int,
+    filters: Optional[dict[str, Any]] = None,
+) -> tuple[list[Document], bool]:
+    """
+    BM25 검색 결과와, vector 검색 없이 이 결과만으로 답해도 되는지를 반환합니다.
+    짧은 keyword 질문이고 상위 top_k개 문서가 모두 질문의 n-gram을 전부 포함할 때만 확실하다고 봅니다.
+    """
+    candidates = top_k * config.HYBRID_CANDIDATE_MULTIPLIER
+    with span("lexical.search"):
+        results = get_lexical_index().search(query, top_k=get_fetch_k(candidates) or candidates, filters=filters)
+    confident = (
+        config.LEXICAL_FAST_PATH_ENABLED
+        and len(normalize(query)) <= config.LEXICAL_FAST_PATH_MAX_QUERY_LENGTH
+        and len(results) >= top_k
+        and all(coverage >= 1.0 for _, _, coverage in results[:top_k])
+    )
+    docs = [doc for doc, _, _ in results]
+    if config.MMR_ENABLED:
+        # vector 검색과 같이 이웃 chunk를 먼저 합치고 서로 다른 passage를 고릅니다.
+        scores = [score for _, score, _ in results]
+        docs = diversify_by_text(docs, scores, candidates, config.MMR_LAMBDA, config.MERGE_ADJACENT_CHUNKS)
+    return docs[:candidates], confident
+
+
+def fuse_results(vector_docs: list[Document], lexical_docs: list[Document], top_k: int) -> list[Document]:
+    return reciprocal_rank_fusion([vector_docs, lexical_docs], k=config.RRF_K)[:top_k]
 
 
 def init_chroma():
     global CLIENT, DB, RETRIEVER
     if not DB:
+        # chromadb는 처음 사용할 때 import 합니다.
+        from langchain.vectorstores import Chroma
+
         DB = Chroma(
             persist_directory=config.CHROMA_PERSIST_DIRECTORY,
             collection_name=config.CHROMA_COLLECTION_NAME,
-            embedding_function=OpenAIEmbeddings(),
-            collection_metadata={"hnsw:space": "cosine"}
+            embedding_function=get_embeddings(),
+            collection_metadata=get_collection_metadata(),
         )
         CLIENT = DB._client
         RETRIEVER = DB.as_retriever()
 
 
+def get_collection_metadata() -> dict[str, Any]:
+    """collection을 만들 때 사용하는 HNSW index 설정"""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": config.CHROMA_HNSW_M,
+        "hnsw:construction_ef": config.CHROMA_HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": config.CHROMA_HNSW_SEARCH_EF,
+    }
+
+
+def get_collection_name(data_source: str, title: bool = False) -> str:
+    """data source별 collection 이름. Title element는 `_title` collection에 따로 저장합니다."""
+    name = f"{config.CHROMA_COLLECTION_NAME}_{data_source}"
+    return f"{name}_title" if title else name
+
+
+def get_collection(name: str) -> "Collection":
+    if name not in COLLECTIONS:
+        if not CLIENT:
+            init_chroma()
+        # embedding은 항상 직접 계산해서 넘기므로 collection의 embedding 함수는 사용하지 않습니다.
+        COLLECTIONS[name] = CLIENT.get_or_create_collection(
+            name, metadata=get_collection_metadata(), embedding_function=None
+        )
+    return COLLECTIONS[name]
+
+
+def get_partition_names() -> list[str]:
+    """이미 만들어진 data source별 collection의 이름. 없는 collection은 만들지 않습니다."""
+    if not CLIENT:
+        init_chroma()
+    existing = {collection.name for collection in CLIENT.list_collections()}
+    names = [get_collection_name(data_source, title) for data_source in DataSource for title in (False, True)]
+    return [name for name in names if name in existing]
+
+
+def is_partitioned() -> bool:
+    """
+    data source별 collection에 적재되어 있으면 True.
+    config.CHROMA_PARTITION_BY_SOURCE를 켜기 전에 하나의 collection에 적재한 data는 그대로 검색합니다.
+    """
+    global _PARTITIONED
+    if _PARTITIONED is None:
+        _PARTITIONED = config.CHROMA_PARTITION_BY_SOURCE and any(
+            get_collection(name).count() for name in get_partition_names()
+        )
+        # 새로 적재된 뒤에는 문서 수도 다시 조회합니다.
+        COLLECTION_COUNTS.clear()
+    return _PARTITIONED
+
+
+class PartitionedRetriever(BaseRetriever):
+    """data source별 collection을 함께 검색하는 retriever. DB.as_retriever()와 같은 형식의 문서를 반환합니다."""
+
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> list[Document]:
+        return query_collections([get_embeddings().embed_query(query)], self.k)[0]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: Any) -> list[Document]:
+        return await asyncio.to_thread(self._get_relevant_documents, query, run_manager=run_manager)
+
+
+def split_conditions(filters: Optional[dict[str, Any]]) -> list[dict[str, Any]]:
+    """where filter를 $and로 묶인 조건 목록으로 펼칩니다."""
+    conditions = []
+    for key, value in (filters or {}).items():
+        if key == "$and":
+            for sub in value:
+                conditions.extend(split_conditions(sub))
+        else:
+            conditions.append({key: value})
+    return conditions
+
+
+def join_conditions(conditions: list[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    # chroma는 조건이 하나뿐인 $and를 허용하지 않습니다.
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def resolve_collections(filters: Optional[dict[str, Any]]) -> list[tuple["Collection", Optional[dict[str, Any]]]]:
+    """
+    검색할 collection과 각 collection에 적용할 where filter를 반환합니다.
+    data_source 조건과 category의 Title 조건은 collection 선택으로 바꾸고, 나머지 조건만 where로 남깁니다.
+    """
+    if not DB:
+        init()
+    if not is_partitioned():
+        return [(DB._collection, filters or None)]
+
+    data_sources = [f"{data_source}" for data_source in DataSource]
+    titles = [False, True]
+    where = []
+    for condition in split_conditions(filters):
+        (key, value), = condition.items()
+        if isinstance(value, dict):
+            operator, operand = next(iter(value.items())) if len(value) == 1 else (None, None)
+        else:
+            operator, operand = "$eq", value
+
+        if key == "data_source" and operator in ("$eq", "$in"):
+            operands = operand if operator == "$in" else [operand]
+            data_sources = [data_source for data_source in data_sources if data_source in operands]
+            continue
+        if key == "category" and operator in ("$eq", "$ne"):
+            if operand == "Title":
+                titles = [title for title in titles if title == (operator == "$eq")]
+                continue
+            if operator == "$eq":
+                titles = [title for title in titles if not title]
+        where.append(condition)
+
+    where = join_conditions(where)
+    return [
+        (get_collection(get_collection_name(data_source, title)), where)
+        for data_source in data_sources
+        for title in titles
+    ]
+
+
+def query_collections(
+    embeddings: list[list[float]],
+    top_k: int,
+    filters: Optional[dict[str, Any]] = None,
+    fetch_k: Optional[int] = None,
+) -> list[list[Document]]:
+    """
+    filters에 해당하는 collection에 embeddings를 한 번씩 질의하고,
+    query별로 여러 collection의 결과를 distance 순서로 합쳐 top_k개를 반환합니다.
+    brute-force index를 사용하면 chroma 대신 index에서 정확한 top_k개를 찾습니다.
+    fetch_k를 주면 fetch_k개를 가져와 이웃 chunk를 먼저 합치고(MERGE_ADJACENT_CHUNKS),
+    저장된 embedding으로 MMR을 적용해 top_k개의 passage를 고릅니다.
+    """
+    n_results = max(fetch_k or 0, top_k)
+    store = get_vector_store()
+    if store is not None:
+        with span("vector_store.search"):
+            indices, _ = store.search_indices(embeddings, n_results, filters)
+        batches = []
+        for query, row in zip(embeddings, indices):
+            docs = [store.get_document(i) for i in row.tolist()]
+            if fetch_k:
+                docs = diversify(query, docs, store.vectors[row], top_k, config.MMR_LAMBDA, config.MERGE_ADJACENT_CHUNKS)
+            batches.append(docs)
+        return batches
+
+    include = ["documents", "metadatas", "distances", *(["embeddings"] if fetch_k else [])]
+    hits: list[list[tuple[float, Document, Optional[list[float]]]]] = [[] for _ in embeddings]
+    for collection, where in resolve_collections(filters):
+        if collection.name not in COLLECTION_COUNTS:
+            COLLECTION_COUNTS[collection.name] = collection.count()
+        count = COLLECTION_COUNTS[collection.name]
+        if not count:
+            continue
+        results = collection.query(
+            query_embeddings=embeddings,
+            n_results=min(n_results, count),
+            where=where,
+            include=include,
+        )
+        for i, (contents, metadatas, distances) in enumerate(
+            zip(results["documents"], results["metadatas"], results["distances"])
+        ):
+            vectors = results["embeddings"][i] if fetch_k else [None] * len(contents)
+            hits[i].extend(
+                (distance, Document(page_content=content, metadata=metadata or {}), vector)
+                for content, metadata, distance, vector in zip(contents, metadatas, distances, vectors)
+            )
+
+    batches = []
+    for query, query_hits in zip(embeddings, hits):
+        query_hits = sorted(query_hits, key=lambda hit: hit[0])[:n_results]
+        docs = [doc for _, doc, _ in query_hits]
+        if fetch_k:
+            vectors = [vector for _, _, vector in query_hits]
+            docs = diversify(query, docs, vectors, top_k, config.MMR_LAMBDA, config.MERGE_ADJACENT_CHUNKS)
+        batches.append(docs)
+    return batches
+
+
+def get_fetch_k(top_k: int) -> Optional[int]:
+    """MMR을 사용하면 vector 검색에서 가져올 후보 수를 반환합니다."""
+    return top_k * config.MMR_FETCH_MULTIPLIER if config.MMR_ENABLED else None
+
+
+def merge_passages(docs: list[Document]) -> list[Document]:
+    """
+    검색 결과에서 같은 element의 이웃 chunk를 하나의 passage로 합칩니다.
+    vector와 lexical 결과를 합치면 한쪽의 passage와 다른 쪽의 chunk가 겹칠 수 있어 마지막에 한 번 더 합칩니다.
+    """
+    return merge_adjacent_chunks(docs) if config.MERGE_ADJACENT_CHUNKS else docs
+
+
+def upload_documents(data_source: str, documents: list[Document]):
+    """
+    data source의 chunk를 적재합니다.
+    config.CHROMA_PARTITION_BY_SOURCE를 켜면 data source별 collection을 새로 만들고 Title element는 따로 저장합니다.
+    """
+    if not config.CHROMA_PARTITION_BY_SOURCE:
+        from langchain.vectorstores import Chroma
+
+        Chroma.from_documents(
+            documents,
+            get_embeddings(),
+            persist_directory=config.CHROMA_PERSIST_DIRECTORY,
+            collection_name=config.CHROMA_COLLECTION_NAME,
+            collection_metadata=get_collection_metadata(),
+        )
+        return
+
+    init_chroma()
+    embeddings = get_embeddings().embed_documents([doc.page_content for doc in documents])
+    for title in (False, True):
+        name = get_collection_name(data_source, title)
+        if name in [collection.name for collection in CLIENT.list_collections()]:
+            CLIENT.delete_collection(name)
+        COLLECTIONS.pop(name, None)
+        collection = get_collection(name)
+
+        pairs = [
+            (doc, embedding) for doc, embedding in zip(documents, embeddings)
+            if (doc.metadata.get("category") == "Title") == title
+        ]
+        if pairs:
+            collection.add(
+                ids=[str(uuid.uuid4()) for _ in pairs],
+                embeddings=[embedding for _, embedding in pairs],
+                metadatas=[doc.metadata for doc, _ in pairs],
+                documents=[doc.page_content for doc, _ in pairs],
+            )
+
+
+def count_documents() -> int:
+    return sum(collection.count() for collection, _ in resolve_collections(None))
+
+
+def get_vector_store_path() -> str:
+    return os.path.join(config.CHROMA_PERSIST_DIRECTORY, f"{config.CHROMA_COLLECTION_NAME}.vectors")
+
+
+def get_vector_store() -> Optional[NumpyVectorStore]:
+    """
+    brute-force 검색을 사용할 때 NumpyVectorStore를 반환합니다.
+    config.VECTOR_STORE_BACKEND가 "auto"이면 chunk 수가 VECTOR_STORE_MAX_SIZE 이하일 때만 사용합니다.
+    """
+    global VECTOR_STORE, _VECTOR_STORE_LOADED
+    if config.VECTOR_STORE_BACKEND == "chroma":
+        return None
+    if not _VECTOR_STORE_LOADED:
+        with _VECTOR_STORE_LOCK:
+            if not _VECTOR_STORE_LOADED:
+                VECTOR_STORE = load_vector_store()
+                _VECTOR_STORE_LOADED = True
+    return VECTOR_STORE
+
+
+def load_vector_store() -> Optional[NumpyVectorStore]:
+    """저장된 index를 열고, 없으면 chroma에 적재된 chunk와 embedding으로 만들어 저장합니다."""
+    max_size = config.VECTOR_STORE_MAX_SIZE if config.VECTOR_STORE_BACKEND == "auto" else None
+    path = get_vector_store_path()
+    options = dict(
+        quantization=config.VECTOR_STORE_QUANTIZATION,
+        rerank_multiplier=config.VECTOR_STORE_RERANK_MULTIPLIER,
+    )
+    if not NumpyVectorStore.exists(path):
+        count = count_documents()
+        if not count or (max_size is not None and count > max_size):
+            return None
+
+        documents, embeddings = [], []
+        for collection, _ in resolve_collections(None):
+            data = collection.get(include=["documents", "metadatas", "embeddings"])
+            documents.extend(
+                Document(page_content=content, metadata=metadata or {})
+                for content, metadata in zip(data["documents"], data["metadatas"])
+            )
+            embeddings.extend(data["embeddings"])
+        NumpyVectorStore.from_documents(documents, embeddings).save(path)
+
+    # 저장한 파일을 다시 열어 float32 행렬은 memory-map으로만 사용합니다.
+    store = NumpyVectorStore.load(path, **options)
+    if max_size is not None and len(store) > max_size:
+        return None
+    return store
+
+
+def reset_vector_store():
+    """적재한 뒤에 호출합니다. 저장된 index를 지우고 다음 검색에서 다시 만듭니다."""
+    global VECTOR_STORE, _VECTOR_STORE_LOADED
+    with _VECTOR_STORE_LOCK:
+        NumpyVectorStore.remove(get_vector_store_path())
+        VECTOR_STORE = None
+        _VECTOR_STORE_LOADED = False
+
+
+def get_cached_docs(query: str, top_k: int, filters: Optional[dict[str, Any]]) -> Optional[list[Document]]:
+    if not config.RETRIEVAL_CACHE_ENABLED:
+        return None
+    return RETRIEVAL_CACHE.get(query, top_k, filters, get_corpus_version())
+
+
+def cache_docs(query: str, top_k: int, filters: Optional[dict[str, Any]], version: int, docs: list[Document]):
+    """검색을 시작할 때의 corpus version으로 결과를 저장합니다. 그 사이 다시 적재되었으면 저장되지 않습니다."""
+    if config.RETRIEVAL_CACHE_ENABLED:
+        RETRIEVAL_CACHE.put(query, top_k, filters, version, docs)
+
+
 def get_similar_docs(
     query: str,
     top_k: int = 5,
     filters: Optional[dict[str, Any]] = None,
     only_contents: bool = True,
 ) -> list[str | Document]:
-    global DB
     if not DB:
-        raise Exception("CHROMA Retriever is not initialized")
-    docs = DB.similarity_search(query, k=top_k, filter=filters)
+        init()
+    version = get_corpus_version()
+    docs = get_cached_docs(query, top_k, filters)
+    if docs is None:
+        if not config.HYBRID_SEARCH_ENABLED:
+            with span("get_similar_docs"):
+                docs = query_collections([get_embeddings().embed_query(query)], top_k, filters, get_fetch_k(top_k))[0]
+        else:
+            lexical_docs, confident = search_lexical(query, top_k, filters)
+            if confident:
+                docs = lexical_docs[:top_k]
+            else:
+                with span("get_similar_docs"):
+                    vector_docs = query_collections(
+                        [get_embeddings().embed_query(query)],
+                        top_k * config.HYBRID_CANDIDATE_MULTIPLIER,
+                        filters,
+                        get_fetch_k(top_k * config.HYBRID_CANDIDATE_MULTIPLIER),
+                    )[0]
+                docs = fuse_results(vector_docs, lexical_docs, top_k)
+        docs = merge_passages(docs)
+        cache_docs(query, top_k, filters, version, docs)
+    if only_contents:
+        return [doc.page_content for doc in docs]
+    return docs
+
+
+def get_similar_docs_by_vector(
+    embedding: list[float],
+    top_k: int = 5,
+    filters: Optional[dict[str, Any]] = None,
+    only_contents: bool = True,
+) -> list[str | Document]:
+    """이미 계산된 query embedding으로 검색합니다."""
+    if not DB:
+        init()
+    with span("chroma.search"):
+        docs = query_collections([embedding], top_k, filters, get_fetch_k(top_k))[0]
+    if only_contents:
+        return [doc.page_content for doc in docs]
+    return docs
+
+
+async def aget_similar_docs(
+    query: str,
+    top_k: int = 5,
+    filters: Optional[dict[str, Any]] = None,
+    only_contents: bool = True,
+    embedding: Optional[list[float] | Callable[[], Awaitable[list[float]]]] = None,
+) -> list[str | Document]:
+    """
+    get_similar_docs의 async 버전.
+    query embedding은 async로 요청하고, chroma 검색은 thread pool에서 실행합니다.
+    embedding에 coroutine 함수를 주면 cache와 lexical 검색만으로 답할 수 없을 때만 호출합니다.
+    """
+    if not DB:
+        await asyncio.to_thread(init)
+    version = get_corpus_version()
+    docs = get_cached_docs(query, top_k, filters)
+    if docs is not None:
+        return [doc.page_content for doc in docs] if only_contents else docs
+
+    lexical_docs, confident = [], False
+    if config.HYBRID_SEARCH_ENABLED:
+        # 처음 호출하면 chroma에서 chunk를 읽어 index를 만들므로 BM25 검색도 thread pool에서 실행합니다.
+        lexical_docs, confident = await asyncio.to_thread(search_lexical, query, top_k, filters)
+    if confident:
+        docs = lexical_docs[:top_k]
+    else:
+        if callable(embedding):
+            embedding = await embedding()
+        if embedding is None:
+            with span("embedding.query"):
+                embedding = await get_embeddings().aembed_query(query)
+        docs = await asyncio.to_thread(
+            get_similar_docs_by_vector,
+            embedding,
+            top_k=top_k * config.HYBRID_CANDIDATE_MULTIPLIER if config.HYBRID_SEARCH_ENABLED else top_k,
+            filters=filters,
+            only_contents=False,
+        )
+        if config.HYBRID_SEARCH_ENABLED:
+            docs = fuse_results(docs, lexical_docs, top_k)
+    docs = merge_passages(docs)
+    cache_docs(query, top_k, filters, version, docs)
+
     if only_contents:
         return [doc.page_content for doc in docs]
     return docs
 
 
+def get_similar_docs_by_vectors(
+    embeddings: list[list[float]],
+    top_k: int = 5,
+    filters: Optional[dict[str, Any]] = None,
+    only_contents: bool = True,
+) -> list[list[str | Document]]:
+    """여러 query embedding을 한 번의 collection.query로 검색하고, query별 결과를 순서대로 반환합니다."""
+    if not embeddings:
+        return []
+    if not DB:
+        init()
+    with span("chroma.search_batch"):
+        batches = query_collections(embeddings, top_k, filters, get_fetch_k(top_k))
+    if only_contents:
+        return [[doc.page_content for doc in docs] for docs in batches]
+    return batches
+
+
+def fuse_batches(
+    queries: list[str],
+    batches: list[list[Document]],
+    top_k: int,
+    filters: Optional[dict[str, Any]],
+    only_contents: bool,
+) -> list[list[str | Document]]:
+    """query별 vector 검색 결과를 lexical 검색 결과와 합칩니다. get_similar_docs와 같은 결과를 반환합니다."""
+    fused = []
+    for query, vector_docs in zip(queries, batches):
+        lexical_docs, confident = search_lexical(query, top_k, filters)
+        docs = lexical_docs[:top_k] if confident else fuse_results(vector_docs, lexical_docs, top_k)
+        fused.append([doc.page_content for doc in docs] if only_contents else docs)
+    return fused
+
+
+def search_batch(
+    queries: list[str],
+    embeddings: list[list[float]],
+    top_k: int,
+    filters: Optional[dict[str, Any]],
+) -> list[list[Document]]:
+    if not config.HYBRID_SEARCH_ENABLED:
+        batches = get_similar_docs_by_vectors(embeddings, top_k=top_k, filters=filters, only_contents=False)
+    else:
+        batches = get_similar_docs_by_vectors(
+            embeddings,
+            top_k=top_k * config.HYBRID_CANDIDATE_MULTIPLIER,
+            filters=filters,
+            only_contents=False,
+        )
+        batches = fuse_batches(queries, batches, top_k, filters, only_contents=False)
+    return [merge_passages(docs) for docs in batches]
+
+
+def get_similar_docs_batch(
+    queries: list[str],
+    top_k: int = 5,
+    filters: Optional[dict[str, Any]] = None,
+    only_contents: bool = True,
+) -> list[list[str | Document]]:
+    """
+    여러 query를 한 번에 검색합니다.
+    cache에 없는 query만 한 번의 embedding 요청으로 계산하고, chroma에도 한 번만 질의합니다.
+    """
+    if not queries:
+        return []
+    if not DB:
+        init()
+    version = get_corpus_version()
+    results = [get_cached_docs(query, top_k, filters) for query in queries]
+    missing = [i for i, docs in enumerate(results) if docs is None]
+    if missing:
+        missing_queries = [queries[i] for i in missing]
+        with span("embedding.batch"):
+            embeddings = get_embeddings().embed_documents(missing_queries)
+        for i, docs in zip(missing, search_batch(missing_queries, embeddings, top_k, filters)):
+            results[i] = docs
+            cache_docs(queries[i], top_k, filters, version, docs)
+    if only_contents:
+        return [[doc.page_content for doc in docs] for docs in results]
+    return results
+
+
+async def aget_similar_docs_batch(
+    queries: list[str],
+    top_k: int = 5,
+    filters: Optional[dict[str, Any]] = None,
+    only_contents: bool = True,
+) -> list[list[str | Document]]:
+    """get_similar_docs_batch의 async 버전"""
+    if not queries:
+        return []
+    if not DB:
+        await asyncio.to_thread(init)
+    version = get_corpus_version()
+    results = [get_cached_docs(query, top_k, filters) for query in queries]
+    missing = [i for i, docs in enumerate(results) if docs is None]
+    if missing:
+        missing_queries = [queries[i] for i in missing]
+        with span("embedding.batch"):
+            embeddings = await get_embeddings().aembed_documents(missing_queries)
+        batches = await asyncio.to_thread(search_batch, missing_queries, embeddings, top_k, filters)
+        for i, docs in zip(missing, batches):
+            results[i] = docs
+            cache_docs(queries[i], top_k, filters, version, docs)
+    if only_contents:
+        return [[doc.page_content for doc in docs] for docs in results]
+    return results
+
+
 def query_db(
     query: str,
     metadata: Optional[dict[str, Any]] = None,
     only_contents: bool = True
 ) -> list[str | Document]:
-    global RETRIEVER
     if not RETRIEVER:
-        raise Exception("CHROMA Retriever is not initialized")
-    docs = RETRIEVER.get_relevant_documents(query, metadata=metadata)
+        init()
+    retriever = RETRIEVER
+    if is_partitioned():
+        retriever = PartitionedRetriever(k=RETRIEVER.search_kwargs.get("k", 4))
+    # 두 경우 모두 retriever의 callback과 run metadata를 거쳐 같은 형식의 문서를 반환합니다.
+    docs = retriever.get_relevant_documents(query, metadata=metadata)
     if only_contents:
         return [doc.page_content for doc in docs]
     return docs
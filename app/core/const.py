@@ -3,8 +3,10 @@ from enum import Enum
 from rxconfig import PROJECT_DIR
 
 
+# 전처리한 data를 저장하는 디렉터리
+PRE_DIR = os.path.join(PROJECT_DIR, "data", "pre")
 # 전처리 후 성공 결과(summary 저장)
-SUCCESS_PATH = os.path.join(PROJECT_DIR, "data", "pre", "RESULT.json")
+SUCCESS_PATH = os.path.join(PRE_DIR, "RESULT.json")
 
 
 class DataSource(str, Enum):
@@ -14,13 +16,17 @@ class DataSource(str, Enum):
     social = "social"
     sync = "sync"
 
+    def __str__(self) -> str:
+        # python 3.11부터 str Enum의 format이 "DataSource.sync"로 바뀌어 값으로 고정합니다.
+        return self.value
+
     @property
     def source_path(self) -> str:
         return os.path.join(PROJECT_DIR, "data", f"data_{self}.txt")
 
     @property
     def dest_path(self) -> str:
-        return os.path.join(PROJECT_DIR, "data", "pre", f"{self}.txt")
+        return os.path.join(PRE_DIR, f"{self}.txt")
 
     def load(self) -> list[str]:
         with open(self.source_path, "r+", encoding="utf-8") as f:
@@ -0,0 +1,171 @@
+"""
+embedding 결과 cache.
+
+같은 model로 같은 text(공백과 unicode 정규화 후)를 다시 embedding 하지 않도록
+최근 결과는 memory의 LRU에, 모든 결과는 sqlite 파일에 저장합니다.
+질문 embedding뿐 아니라 적재할 때의 문서 embedding도 함께 저장됩니다.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from core.sqlite import get_connection
+
+_QUERY_BATCH_SIZE = 500
+
+SCHEMA = (
+    (
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        " key TEXT PRIMARY KEY,"
+        " vector BLOB NOT NULL"
+        ")"
+    ),
+)
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """embeddings를 감싸 memory LRU(max_size개)와 sqlite(path)에 결과를 저장합니다."""
+
+    def __init__(self, embeddings: Embeddings, path: str, max_size: int, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.path = path
+        self.max_size = max_size
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embeddings, name)
+
+    def get_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _lookup_memory(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+        self.hits += len(found)
+        return found
+
+    def _lookup_disk(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        # sqlite의 변수 개수 제한을 넘지 않도록 나눠서 조회합니다.
+        for start in range(0, len(keys), _QUERY_BATCH_SIZE):
+            batch = keys[start:start + _QUERY_BATCH_SIZE]
+            rows = get_connection(self.path, SCHEMA).execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, found[key])
+            self.disk_hits += len(rows)
+        return found
+
+    def _store(self, keys: list[str], vectors: list[list[float]]):
+        arrays = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        for key, array in zip(keys, arrays):
+            self._remember(key, array)
+        get_connection(self.path, SCHEMA).executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, array.tobytes()) for key, array in zip(keys, arrays)],
+        )
+
+    def _get_missing(self, keys: list[str], found: dict[str, np.ndarray]) -> list[int]:
+        # 같은 batch 안에서 반복되는 text는 한 번만 요청합니다.
+        missing, requested = [], set()
+        for i, key in enumerate(keys):
+            if key not in found and key not in requested:
+                requested.add(key)
+                missing.append(i)
+        self.misses += len(missing)
+        return missing
+
+    def _split(self, texts: list[str]) -> tuple[list[str], dict[str, np.ndarray], list[int]]:
+        keys = [self.get_key(text) for text in texts]
+        found = self._lookup_memory(keys)
+        found.update(self._lookup_disk([key for key in dict.fromkeys(keys) if key not in found]))
+        return keys, found, self._get_missing(keys, found)
+
+    async def _asplit(self, texts: list[str]) -> tuple[list[str], dict[str, np.ndarray], list[int]]:
+        """_split의 async 버전. memory에 없는 text만 thread pool에서 sqlite를 조회합니다."""
+        keys = [self.get_key(text) for text in texts]
+        found = self._lookup_memory(keys)
+        unknown = [key for key in dict.fromkeys(keys) if key not in found]
+        if unknown:
+            found.update(await asyncio.to_thread(self._lookup_disk, unknown))
+        return keys, found, self._get_missing(keys, found)
+
+    @staticmethod
+    def _merge(keys: list[str], found: dict[str, np.ndarray]) -> list[list[float]]:
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            self._store([keys[i] for i in missing], vectors)
+            found.update(zip([keys[i] for i in missing], map(np.asarray, vectors)))
+        return self._merge(keys, found)
+
+    def embed_query(self, text: str) -> list[float]:
+        keys, found, missing = self._split([text])
+        if missing:
+            vector = self.embeddings.embed_query(text)
+            self._store(keys, [vector])
+            return vector
+        return self._merge(keys, found)[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = await self._asplit(texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents([texts[i] for i in missing])
+            await asyncio.to_thread(self._store, [keys[i] for i in missing], vectors)
+            found.update(zip([keys[i] for i in missing], map(np.asarray, vectors)))
+        return self._merge(keys, found)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        keys, found, missing = await self._asplit([text])
+        if missing:
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._store, keys, [vector])
+            return vector
+        return self._merge(keys, found)[0]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        get_connection(self.path, SCHEMA).execute("DELETE FROM embeddings")
+
+    def stats(self) -> dict:
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,84 @@
+"""
+chroma where filter.
+
+chroma를 거치지 않는 검색(BM25 index, numpy brute-force index)도 chroma와 같은 조건으로 문서를 거르도록
+지원하는 연산자와 그 의미를 이 module 한 곳에 둡니다. 지원하지 않는 연산자는 chroma처럼 ValueError를 냅니다.
+"""
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_RANGE_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": lambda value, operand: value > operand,
+    "$gte": lambda value, operand: value >= operand,
+    "$lt": lambda value, operand: value < operand,
+    "$lte": lambda value, operand: value <= operand,
+}
+OPERATORS = ("$eq", "$ne", *_RANGE_OPERATORS, "$in", "$nin")
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def get_operators(condition: Any) -> dict[str, Any]:
+    """필드 조건을 {연산자: 값}으로 바꾸고 검사합니다. 값만 주면 $eq 조건입니다."""
+    if not isinstance(condition, dict):
+        return {"$eq": condition}
+    for operator, operand in condition.items():
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported where operator: {operator}")
+        if operator in _RANGE_OPERATORS and not is_number(operand):
+            raise ValueError(f"Expected a number for {operator}, got {operand!r}")
+        if operator in ("$in", "$nin") and not isinstance(operand, (list, tuple)):
+            raise ValueError(f"Expected a list for {operator}, got {operand!r}")
+    return condition
+
+
+def match_condition(value: Any, operator: str, operand: Any) -> bool:
+    """get_operators로 검사한 연산자 하나를 metadata 값에 적용합니다."""
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    # chroma처럼 숫자끼리만 비교하고, 값이 없거나 숫자가 아닌 metadata는 맞지 않는 것으로 봅니다.
+    return is_number(value) and _RANGE_OPERATORS[operator](value, operand)
+
+
+def match_operators(value: Any, operators: dict[str, Any]) -> bool:
+    return all(match_condition(value, operator, operand) for operator, operand in operators.items())
+
+
+def reduce_filter(
+    where: Optional[dict[str, Any]],
+    match_field: Callable[[str, dict[str, Any]], T],
+    all_of: Callable[[list[T]], T],
+    any_of: Callable[[list[T]], T],
+) -> T:
+    """
+    where filter의 $and/$or를 풀어 필드 조건마다 match_field(key, operators)를 호출하고,
+    결과를 all_of/any_of로 합칩니다. 문서 하나에도, 문서 전체의 boolean mask에도 같은 규칙을 적용합니다.
+    """
+    results = []
+    for key, condition in (where or {}).items():
+        if key == "$and":
+            results.append(all_of([reduce_filter(sub, match_field, all_of, any_of) for sub in condition]))
+        elif key == "$or":
+            results.append(any_of([reduce_filter(sub, match_field, all_of, any_of) for sub in condition]))
+        else:
+            results.append(match_field(key, get_operators(condition)))
+    return all_of(results)
+
+
+def match_filter(metadata: dict[str, Any], where: Optional[dict[str, Any]]) -> bool:
+    """where filter를 문서 하나의 metadata에 적용합니다."""
+    return reduce_filter(
+        where,
+        lambda key, operators: match_operators(metadata.get(key), operators),
+        all,
+        any,
+    )
@@ -0,0 +1,223 @@
+"""conversation history 저장소"""
+import glob
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Iterator, Optional
+
+from langchain.memory import FileChatMessageHistory
+from langchain.schema import BaseChatMessageHistory
+from langchain.schema.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from core.sqlite import get_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    (
+        "CREATE TABLE IF NOT EXISTS messages ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " conversation_id TEXT NOT NULL,"
+        " message TEXT NOT NULL,"
+        " created_at REAL NOT NULL"
+        ")"
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS messages_conversation_id"
+        " ON messages (conversation_id, id)"
+    ),
+    (
+        "CREATE TABLE IF NOT EXISTS summaries ("
+        " conversation_id TEXT PRIMARY KEY,"
+        " summary TEXT NOT NULL,"
+        " covered_id INTEGER NOT NULL"
+        ")"
+    ),
+)
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """
+    conversation의 message를 sqlite에 한 줄씩 append 합니다.
+    message 추가는 기존 대화를 다시 읽지 않고, 최근 message만 index로 조회할 수 있습니다.
+    여러 process가 동시에 써도 WAL 모드로 안전하게 기록됩니다.
+    """
+
+    def __init__(self, conversation_id: str, path: str):
+        self.conversation_id = conversation_id
+        self.path = path
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return get_connection(self.path, SCHEMA)
+
+    @property
+    def messages(self) -> list[BaseMessage]:  # type: ignore
+        rows = self.connection.execute(
+            "SELECT message FROM messages WHERE conversation_id = ? ORDER BY id",
+            (self.conversation_id,),
+        ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def last(self, n: int) -> list[BaseMessage]:
+        """최근 n개의 message를 오래된 순서로 반환합니다."""
+        rows = self.connection.execute(
+            "SELECT message FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+            (self.conversation_id, n),
+        ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def iter_recent(self, after_id: int = 0, page_size: int = 50) -> Iterator[tuple[int, BaseMessage]]:
+        """after_id 이후의 (id, message)를 최신 순으로 page 단위로 읽어 yield 합니다."""
+        before_id = None
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, message FROM messages"
+                " WHERE conversation_id = ? AND id > ? AND id < COALESCE(?, id + 1)"
+                " ORDER BY id DESC LIMIT ?",
+                (self.conversation_id, after_id, before_id, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            for message_id, message in rows:
+                yield message_id, messages_from_dict([json.loads(message)])[0]
+            before_id = rows[-1][0]
+
+    def get_summary(self) -> tuple[str, int]:
+        """(rolling summary, summary에 포함된 마지막 message id)"""
+        row = self.connection.execute(
+            "SELECT summary, covered_id FROM summaries WHERE conversation_id = ?",
+            (self.conversation_id,),
+        ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def set_summary(self, summary: str, covered_id: int):
+        # 다른 process가 이미 더 뒤까지 요약했다면 덮어쓰지 않습니다.
+        self.connection.execute(
+            "INSERT INTO summaries (conversation_id, summary, covered_id) VALUES (?, ?, ?)"
+            " ON CONFLICT (conversation_id) DO UPDATE"
+            " SET summary = excluded.summary, covered_id = excluded.covered_id"
+            " WHERE excluded.covered_id > summaries.covered_id",
+            (self.conversation_id, summary, covered_id),
+        )
+
+    def count(self) -> int:
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?",
+            (self.conversation_id,),
+        ).fetchone()[0]
+
+    def add_messages(self, messages: list[BaseMessage]):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO messages (conversation_id, message, created_at) VALUES (?, ?, ?)",
+                [
+                    (self.conversation_id, json.dumps(item, ensure_ascii=False), now)
+                    for item in messages_to_dict(messages)
+                ],
+            )
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM messages WHERE conversation_id = ?",
+                (self.conversation_id,),
+            )
+            self.connection.execute(
+                "DELETE FROM summaries WHERE conversation_id = ?",
+                (self.conversation_id,),
+            )
+
+
+class FileSummaryChatMessageHistory(FileChatMessageHistory):
+    """
+    HISTORY_BACKEND="file"에서 사용하는 FileChatMessageHistory.
+    message id는 json 파일 안의 순서(1부터)이고, rolling summary는 같은 이름의 *.summary 파일에 저장합니다.
+    """
+
+    @property
+    def summary_path(self) -> str:
+        return f"{os.path.splitext(self.file_path)[0]}.summary"
+
+    def iter_recent(self, after_id: int = 0) -> Iterator[tuple[int, BaseMessage]]:
+        """after_id 이후의 (id, message)를 최신 순으로 yield 합니다."""
+        messages = self.messages
+        for message_id in range(len(messages), after_id, -1):
+            yield message_id, messages[message_id - 1]
+
+    def get_summary(self) -> tuple[str, int]:
+        """(rolling summary, summary에 포함된 마지막 message id)"""
+        if not os.path.exists(self.summary_path):
+            return "", 0
+        with open(self.summary_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["summary"], data["covered_id"]
+
+    def set_summary(self, summary: str, covered_id: int):
+        # 이미 더 뒤까지 요약했다면 덮어쓰지 않습니다.
+        if covered_id <= self.get_summary()[1]:
+            return
+        temp_path = f"{self.summary_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "covered_id": covered_id}, f, ensure_ascii=False)
+        os.replace(temp_path, self.summary_path)
+
+    def clear(self) -> None:
+        super().clear()
+        if os.path.exists(self.summary_path):
+            os.remove(self.summary_path)
+
+
+# rolling summary를 저장할 수 있는 history
+SUMMARY_HISTORIES = (SQLiteChatMessageHistory, FileSummaryChatMessageHistory)
+
+
+def migrate_file_history(file_path: str, history: SQLiteChatMessageHistory) -> bool:
+    """
+    FileChatMessageHistory json 파일의 message를 sqlite로 옮기고 파일 이름을 *.migrated로 바꿉니다.
+    sqlite에 이미 message가 있으면 파일에만 있는 message를 뒤에 이어 붙이고,
+    옮기다 중단되어 이미 sqlite에 있는 message는 다시 넣지 않습니다.
+    """
+    if not os.path.exists(file_path):
+        return False
+    with open(file_path, "r", encoding="utf-8") as f:
+        messages = messages_from_dict(json.loads(f.read() or "[]"))
+    existing = history.messages if history.count() else []
+    if messages[:len(existing)] == existing:
+        messages = messages[len(existing):]
+    elif not messages or existing[-len(messages):] == messages:
+        messages = []
+    else:
+        # sqlite로 옮긴 뒤 file backend로 다시 쌓인 대화
+        logger.warning(
+            "merging %d messages of %s after %d messages already in sqlite",
+            len(messages), file_path, len(existing),
+        )
+    if messages:
+        history.add_messages(messages)
+    os.replace(file_path, f"{file_path}.migrated")
+    return True
+
+
+def migrate_file_histories(directory: str, path: str) -> int:
+    """directory 내의 모든 conversation json 파일을 sqlite로 옮기고 옮긴 파일 수를 반환합니다."""
+    migrated = 0
+    for file_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        conversation_id = os.path.splitext(os.path.basename(file_path))[0]
+        migrated += migrate_file_history(file_path, SQLiteChatMessageHistory(conversation_id, path))
+    return migrated
+
+
+def get_history_messages(history: BaseChatMessageHistory, n: Optional[int] = None) -> list[BaseMessage]:
+    """history의 최근 n개 message. 저장소가 지원하면 전체 대화를 읽지 않습니다."""
+    if not n:
+        return history.messages
+    if isinstance(history, SQLiteChatMessageHistory):
+        return history.last(n)
+    return history.messages[-n:]
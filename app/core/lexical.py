@@ -0,0 +1,149 @@
+"""
+문자 n-gram BM25 검색.
+
+한국어는 띄어쓰기가 일정하지 않아("카카오싱크" / "카카오 싱크") 공백과 기호를 지운 문자열의
+문자 n-gram을 token으로 사용합니다. 적재할 때 chroma와 같은 chunk로 index를 만들어 저장하고,
+vector 검색 결과와 reciprocal rank fusion으로 합치거나, 확실한 keyword 질문은 embedding 없이 바로 답합니다.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from langchain.schema.document import Document
+
+from core.filters import match_filter
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub("", text.lower())
+
+
+def tokenize(text: str, ngram_sizes: Iterable[int] = (2, 3)) -> list[str]:
+    text = normalize(text)
+    tokens = []
+    for n in ngram_sizes:
+        if len(text) < n:
+            continue
+        tokens.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    # n-gram보다 짧은 질문("앱")은 그 자체를 token으로 사용합니다.
+    if not tokens and text:
+        tokens.append(text)
+    return tokens
+
+
+class BM25Index:
+    """chunk 목록에 대한 BM25 inverted index"""
+
+    def __init__(self, ngram_sizes: Iterable[int] = (2, 3), k1: float = 1.5, b: float = 0.75):
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.k1 = k1
+        self.b = b
+        self.documents: list[Document] = []
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        self._average_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _build(self):
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for i, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc.page_content, self.ngram_sizes))
+            lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((i, count))
+        self._postings = postings
+        self._lengths = lengths
+        self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    def add_documents(self, documents: list[Document]) -> "BM25Index":
+        self.documents.extend(documents)
+        self._build()
+        return self
+
+    def replace_documents(self, key: str, value: Any, documents: list[Document]) -> "BM25Index":
+        """metadata[key]가 value인 문서를 documents로 바꿉니다. 같은 data source를 다시 적재할 때 사용합니다."""
+        self.documents = [doc for doc in self.documents if doc.metadata.get(key) != value]
+        return self.add_documents(documents)
+
+    def _idf(self, token: str) -> float:
+        frequency = len(self._postings.get(token, ()))
+        return math.log(1 + (len(self.documents) - frequency + 0.5) / (frequency + 0.5))
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[dict[str, Any]] = None,
+    ) -> list[tuple[Document, float, float]]:
+        """
+        (문서, BM25 점수, coverage)를 점수 순서로 반환합니다.
+        coverage는 질문의 n-gram 중 문서에 있는 n-gram의 비율입니다.
+        """
+        tokens = list(dict.fromkeys(tokenize(query, self.ngram_sizes)))
+        if not tokens or not self.documents:
+            return []
+
+        scores: dict[int, float] = {}
+        matched: Counter = Counter()
+        for token in tokens:
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(token)
+            for i, count in postings:
+                length_norm = 1 - self.b + self.b * self._lengths[i] / self._average_length
+                scores[i] = scores.get(i, 0.0) + idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+                matched[i] += 1
+
+        results = []
+        for i, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            doc = self.documents[i]
+            if not match_filter(doc.metadata, filters):
+                continue
+            results.append((doc, score, matched[i] / len(tokens)))
+            if len(results) >= top_k:
+                break
+        return results
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "ngram_sizes": self.ngram_sizes,
+            "k1": self.k1,
+            "b": self.b,
+            "documents": [
+                {"page_content": doc.page_content, "metadata": doc.metadata}
+                for doc in self.documents
+            ],
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """저장된 chunk로 index를 다시 만듭니다."""
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        index = cls(data["ngram_sizes"], data["k1"], data["b"])
+        return index.add_documents([Document(**doc) for doc in data["documents"]])
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int = 60) -> list[Document]:
+    """여러 검색 결과의 순위를 1 / (k + rank)의 합으로 합칩니다. 같은 내용의 chunk는 하나로 봅니다."""
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + 1 / (k + rank)
+            documents.setdefault(doc.page_content, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
@@ -1,13 +1,32 @@
+import asyncio
+import logging
 import os
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Generator, Iterator, Optional
 
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.chains import LLMChain
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory, FileChatMessageHistory
 from langchain.prompts import PromptTemplate
-from langchain.schema.messages import BaseMessage
-
-from core.chroma import get_similar_docs
+from langchain.schema import BaseChatMessageHistory
+
+from core import ainit, init
+from core.cache import ANSWER_CACHE, iter_cached_answer
+from core.chroma import aget_similar_docs, get_similar_docs, get_embeddings, get_corpus_version
+from core.llm_cache import CachedChatOpenAI, CachedRateLimitedChatOpenAI, get_llm_cache
+from core.history import (
+    FileSummaryChatMessageHistory,
+    SQLiteChatMessageHistory,
+    get_history_messages,
+    migrate_file_history,
+)
+from core.metrics import atraced, observe, span, trace, traced
+from core.memory import HistoryWindow, compact_history, load_history_window
+from core.prompt_builder import PromptBuilder
+from core.pipeline import Stage, StageGraph, run_sync
+from core.router import aroute
+from core.streaming import amerge_in_order, astream_chain, iterate_async, merge_in_order, stream_chain
 from core.prompts import (
     SAY_HELLO,
     BUG_REQUEST_CONTEXT,
@@ -16,13 +35,30 @@ from core.prompts import (
     PARSE_INTENT,
     DEFAULT_RESPONSE,
     SUMMARIZE,
+    SUMMARIZE_HISTORY,
     BRANCH
 )
 from rxconfig import config, PROJECT_DIR
 
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.join(PROJECT_DIR, "history")
+
 LLM_DICT: dict[str, ChatOpenAI] = {}
 CHAIN_DICT: dict[str, LLMChain] = {}
+PROMPT_BUILDER_DICT: dict[str, PromptBuilder] = {}
 _SUMMARY: dict = {}
+_SUMMARY_CONTEXT: Optional[tuple[tuple, dict]] = None
+# 요약 중인 conversation과, 요약 중에 다시 요청되었는지 여부
+_COMPACTING: dict[str, bool] = {}
+_COMPACTING_LOCK = threading.Lock()
+
+# intent별로 답변을 생성할 chain (그 외 intent는 default)
+INTENT_CHAINS: dict[str, list[str]] = {
+    "hello": ["hello"],
+    "bug": ["bug_request", "bug_sorry"],
+    "enhancement": ["enhancement"],
+}
 
 
 def get_or_create_llm(name: str = "default", streaming: bool = False) -> ChatOpenAI:
@@ -43,7 +79,16 @@ def get_or_create_llm(name: str = "default", streaming: bool = False) -> ChatOpe
         if streaming:
             options["streaming"] = True
             options["callbacks"] = [StreamingStdOutCallbackHandler()]
-        LLM_DICT[name] = ChatOpenAI(**options)
+        if config.RATE_LIMIT_ENABLED:
+            # 재시도는 rate limiter의 backoff가 담당합니다.
+            options["max_retries"] = 1
+            options["priority"] = config.RATE_LIMIT_PRIORITY.get(name)
+            LLM_DICT[name] = CachedRateLimitedChatOpenAI(**options)
+        else:
+            LLM_DICT[name] = CachedChatOpenAI(**options)
+        # streaming하지 않는 chain만 응답을 cache 합니다.
+        if not streaming:
+            LLM_DICT[name].llm_cache = get_llm_cache()
     return LLM_DICT[name]
 
 
@@ -60,6 +105,10 @@ def get_or_create_chain(
     if os.getenv("VERBOSE"):
         verbose = True
 
+    if not CHAIN_DICT.get(name) and not template:
+        # init_chains에 등록된 chain은 처음 사용할 때 만듭니다.
+        init_chains()
+
     if not CHAIN_DICT.get(name):
         if not template:
             raise ValueError("template must be provided if chain does not exist")
@@ -87,205 +136,581 @@ def init_chains():
         ("intent", PARSE_INTENT, False),
         ("summarize", SUMMARIZE, False),
         ("branch", BRANCH, False),
+        ("summarize_history", SUMMARIZE_HISTORY, False),
     ]:
         get_or_create_chain(name=name, template=template, streaming=streaming)
 
 
-def load_conversation_history(conversation_id: str) -> FileChatMessageHistory:
-    history_path = os.path.join(PROJECT_DIR, "history", f"{conversation_id}.json")
-    os.makedirs(os.path.dirname(history_path), exist_ok=True)
-    return FileChatMessageHistory(history_path)
-
+def stream_chain_output(name: str, context: dict) -> Iterator[str]:
+    """
+    chain의 결과를 token 단위로 yield 합니다.
+    LLM_STREAMING이 꺼져 있으면 생성이 끝난 결과를 글자 단위로 yield 합니다.
+    """
+    chain = get_or_create_chain(name)
+    context = get_chain_inputs(name, context)
+    if not config.LLM_STREAMING:
+        yield from chain.run(context)
+        return
+    yield from stream_chain(chain, context)
 
-def get_history(conversion_id: str) -> list[BaseMessage]:
-    history = load_conversation_history(conversation_id=conversion_id)
 
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        input_key="user_message",
-        chat_memory=history,
-    )
+def load_conversation_history(conversation_id: str) -> BaseChatMessageHistory:
+    history_path = os.path.join(HISTORY_DIR, f"{conversation_id}.json")
+    if config.HISTORY_BACKEND == "file":
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        return FileSummaryChatMessageHistory(history_path)
 
-    return memory.buffer
+    history = SQLiteChatMessageHistory(f"{conversation_id}", config.HISTORY_DB_PATH)
+    # 이전에 json 파일로 저장된 대화는 처음 열 때 sqlite로 옮깁니다.
+    migrate_file_history(history_path, history)
+    return history
 
 
-def clear_history(conversation_id: str):
-    history = load_conversation_history(conversation_id=conversation_id)
-    history.clear()
+def get_history_budget(name: str) -> Optional[int]:
+    """chain별 chat_history token 예산. 예산을 사용하지 않으면 None."""
+    if not config.HISTORY_TOKEN_BUDGET_ENABLED:
+        return None
+    return config.HISTORY_TOKEN_BUDGET.get(name, config.DEFAULT_HISTORY_TOKEN_BUDGET)
 
 
-def create_answer(user_message: str, conversation_id: str = None) -> dict:
-    """create answer by return"""
-    from .preprocess import SUMMARY
+def get_max_history_budget() -> int:
+    return max([config.DEFAULT_HISTORY_TOKEN_BUDGET, *config.HISTORY_TOKEN_BUDGET.values()])
 
-    history = load_conversation_history(conversation_id)
 
-    keys = ", ".join(list(SUMMARY.keys()))
-    summary = "\n".join([
-        f"{key}: {summary.replace('n', ' ')}"
-        for key, summary in SUMMARY.items()
-    ])
+def get_history_window(conversation_id: str) -> HistoryWindow:
+    with span("history.load"):
+        history = load_conversation_history(conversation_id=conversation_id)
+        if not config.HISTORY_TOKEN_BUDGET_ENABLED:
+            return HistoryWindow(messages=get_history_messages(history, config.HISTORY_MAX_MESSAGES))
+        return load_history_window(history, get_max_history_budget())
 
-    context = dict(
-        user_message=user_message,
-        keys=keys,
-        summary=summary
-    )
 
-    # determine which data_source_context
-    branch_chain = get_or_create_chain("branch")
-    branch = branch_chain.run(context)
-
-    def get_documents_str():
-        return "\n".join(
-            get_similar_docs(
-                user_message,
-                top_k=10,
-                filters={
-                    "$and": [
-                        # restrict to selected data source context
-                        {"data_source": branch},
-                        # not equal to Title
-                        {"category": {"$ne": "Title"}}
-                    ],
-                }
-            )
+def get_or_create_prompt_builder(name: str) -> PromptBuilder:
+    """chain의 prompt builder를 생성하거나 이미 생성된 builder를 반환합니다."""
+    if not PROMPT_BUILDER_DICT.get(name):
+        PROMPT_BUILDER_DICT[name] = PromptBuilder(
+            get_or_create_chain(name).prompt,
+            history_budget=get_history_budget(name),
         )
+    return PROMPT_BUILDER_DICT[name]
 
-    # create main context
-    context = dict(user_message=user_message)
-    context.update(
-        user_message=user_message,
-        chat_history=get_history(conversation_id),
-    )
 
-    # which intent
-    intent_chain = get_or_create_chain("intent")
-    intent = intent_chain.run(context)
+def get_chain_inputs(name: str, context: dict) -> dict:
+    """
+    context의 chat_history, related_documents 등을 context window에 맞춘 문자열로 바꿉니다.
+    prompt의 token 수는 context["prompt_tokens"][name]에 기록됩니다.
+    """
+    inputs, report = get_or_create_prompt_builder(name).build(context)
+    context.setdefault("prompt_tokens", {})[name] = report.total
+    logger.debug("prompt tokens for %s: %s (%s)", name, report.total, report)
+    return inputs
 
-    if intent == "hello":
-        context.update(related_documents=get_documents_str())
-        answer = get_or_create_chain("hello").run(context)
 
-    elif intent == "bug":
-        context.update(related_documents=get_documents_str())
+def compact_conversation_history(conversation_id: str):
+    """가장 큰 token 예산 밖으로 밀려난 대화를 rolling summary에 이어서 요약합니다."""
+    if not config.HISTORY_TOKEN_BUDGET_ENABLED:
+        return
 
-        answer = ""
-        for name in ["bug_request", "bug_sorry"]:
-            chain = get_or_create_chain(name)
-            context = chain(context)
-            answer += context[chain.output_key] + "\n\n"
+    def summarize(summary: str, new_lines: str) -> str:
+        chain = get_or_create_chain("summarize_history")
+        return chain.run(dict(summary=summary, new_lines=new_lines))
 
-    elif intent == "enhancement":
-        chain = get_or_create_chain("enhancement")
-        answer = chain.run(context)
+    history = load_conversation_history(conversation_id=conversation_id)
+    compact_history(history, get_max_history_budget(), summarize)
 
-    else:
-        context.update(related_documents=get_documents_str())
-        answer = get_or_create_chain("default").run(context)
 
-    history.add_user_message(user_message)
-    history.add_ai_message(answer)
-    return {
-        "conversation_id": conversation_id,
-        "user_message": user_message,
-        "branch": branch,
-        "intent": intent,
-        "answer": answer
-    }
+def run_compaction(conversation_id: str):
+    """요약 중에 다시 요청되었으면 끝난 뒤 한 번 더 요약합니다."""
+    while True:
+        try:
+            compact_conversation_history(conversation_id)
+        except Exception:
+            logger.exception("failed to compact history of %s", conversation_id)
+        with _COMPACTING_LOCK:
+            if not _COMPACTING[conversation_id]:
+                del _COMPACTING[conversation_id]
+                return
+            _COMPACTING[conversation_id] = False
+
+
+def schedule_compaction(conversation_id: str) -> bool:
+    """
+    conversation의 요약을 background thread에서 시작합니다.
+    같은 conversation의 요약이 이미 실행 중이면 새 thread를 만들지 않고, 끝난 뒤 다시 요약하도록 표시만 합니다.
+    같은 overflow를 두 번 요약하지 않도록 conversation마다 요약은 하나씩만 실행됩니다.
+    """
+    with _COMPACTING_LOCK:
+        if conversation_id in _COMPACTING:
+            _COMPACTING[conversation_id] = True
+            return False
+        _COMPACTING[conversation_id] = False
+    threading.Thread(target=run_compaction, args=(conversation_id,), daemon=True).start()
+    return True
 
 
-def generate_answer(user_message: str, conversation_id: str = None):
-    """generate answer by yield"""
+def save_history(conversation_id: str, user_message: str, answer: str):
+    with span("history.save"):
+        history = load_conversation_history(conversation_id)
+        history.add_user_message(user_message)
+        history.add_ai_message(answer)
+    # 요약은 다음 대화 전까지만 끝나면 되므로 답변을 막지 않도록 background에서 실행합니다.
+    schedule_compaction(conversation_id)
+
+
+def clear_history(conversation_id: str):
+    history = load_conversation_history(conversation_id=conversation_id)
+    history.clear()
+
+
+def get_summary_context() -> dict:
+    """
+    branch 선택에 사용하는 data source 요약을 context로 반환합니다.
+    SUMMARY가 바뀌지 않았다면 이전에 만든 문자열을 재사용합니다.
+    """
+    global _SUMMARY_CONTEXT
     from .preprocess import SUMMARY
 
-    history = load_conversation_history(conversation_id)
+    key = tuple(SUMMARY.items())
+    if _SUMMARY_CONTEXT is None or _SUMMARY_CONTEXT[0] != key:
+        keys = ", ".join(list(SUMMARY.keys()))
+        summary = "\n".join([
+            f"{key}: {summary.replace('n', ' ')}"
+            for key, summary in SUMMARY.items()
+        ])
+        _SUMMARY_CONTEXT = (key, dict(keys=keys, summary=summary))
+    return dict(_SUMMARY_CONTEXT[1])
 
-    keys = ", ".join(list(SUMMARY.keys()))
-    summary = "\n".join([
-        f"{key}: {summary.replace('n', ' ')}"
-        for key, summary in SUMMARY.items()
-    ])
 
-    context = dict(
-        user_message=user_message,
-        keys=keys,
-        summary=summary
-    )
+def get_documents_filter(branch: str) -> dict:
+    return {
+        "$and": [
+            # restrict to selected data source context
+            {"data_source": branch},
+            # not equal to Title
+            {"category": {"$ne": "Title"}}
+        ],
+    }
 
-    # determine which data_source_context
-    branch_chain = get_or_create_chain("branch")
-    branch = branch_chain.run(context)
-
-    def get_documents_str():
-        return "\n".join(
-            get_similar_docs(
-                user_message,
-                top_k=10,
-                filters={
-                    "$and": [
-                        # restrict to selected data source context
-                        {"data_source": branch},
-                        # not equal to Title
-                        {"category": {"$ne": "Title"}}
-                    ],
-                }
-            )
-        )
 
-    # create main context
-    context = dict(user_message=user_message)
-    context.update(
-        user_message=user_message,
-        chat_history=get_history(conversation_id),
+def get_documents(user_message: str, branch: str) -> list[str]:
+    """검색 순위 순서의 관련 문서. prompt 조립 시 context window에 맞게 잘립니다."""
+    return get_similar_docs(
+        user_message,
+        top_k=10,
+        filters=get_documents_filter(branch),
     )
 
-    # which intent
-    intent_chain = get_or_create_chain("intent")
-    intent = intent_chain.run(context)
 
-    answer = ""
+async def aget_documents(
+    user_message: str,
+    branch: str,
+    embedding: Optional[list[float] | Callable[[], Awaitable[list[float]]]] = None,
+) -> list[str]:
+    return await aget_similar_docs(
+        user_message,
+        top_k=10,
+        filters=get_documents_filter(branch),
+        embedding=embedding,
+    )
 
-    if intent == "hello":
-        context.update(related_documents=get_documents_str())
-        for response in get_or_create_chain("hello").run(context):
-            answer += response
-            yield response
 
-    elif intent == "bug":
-        context.update(related_documents=get_documents_str())
+def get_intent_chains(intent: str) -> list[str]:
+    """intent에 따라 답변을 생성할 chain 이름들을 순서대로 반환합니다."""
+    return INTENT_CHAINS.get(intent, ["default"])
 
-        for response in get_or_create_chain("bug_request").run(context):
-            answer += response
-            yield response
 
-        answer += "\n\n"
-        yield "\n\n"
+async def aclassify(
+    name: str,
+    embedding: Callable[[], Awaitable[list[float]]],
+    fallback: Callable[[], Awaitable[str]],
+) -> str:
+    """
+    router로 label을 정하고, 확신하지 못하면 fallback(LLM chain)의 결과를 반환합니다.
+    query embedding을 기다리느라 router가 ROUTER_FALLBACK_DELAY_SECONDS 안에 답하지 못하면
+    fallback을 함께 시작해 두고, router가 확신하면 취소합니다.
+    """
+    async def route_label() -> Optional[str]:
+        vector = await embedding()
+        with span(f"router.{name}"):
+            return await aroute(name, vector)
+
+    routing = asyncio.ensure_future(route_label())
+    fallback_task = None
+    try:
+        done, _ = await asyncio.wait({routing}, timeout=config.ROUTER_FALLBACK_DELAY_SECONDS)
+        if not done:
+            fallback_task = asyncio.ensure_future(fallback())
+        label = await routing
+        if label:
+            return label
+        if fallback_task is None:
+            fallback_task = asyncio.ensure_future(fallback())
+        return await fallback_task
+    finally:
+        for task in (routing, fallback_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def build_answer_graph(
+    user_message: str,
+    conversation_id: str = None,
+    embedding: Optional[list[float]] = None,
+    prompt_tokens: Optional[dict[str, int]] = None,
+) -> StageGraph:
+    """
+    답변에 필요한 context를 만드는 stage graph를 생성합니다.
+    branch/intent chain의 prompt token 수는 prompt_tokens에 기록됩니다.
 
-        for response in get_or_create_chain("bug_sorry").run(context):
-            answer += response
-            yield response
+    branch ─> related_documents (+ query_embedding, lexical 검색으로 부족할 때)
+    chat_history ─> intent
 
-    elif intent == "enhancement":
-        for response in get_or_create_chain("enhancement").run(context):
-            answer += response
-            yield response
+    ROUTER_ENABLED이면 branch/intent는 query embedding으로 먼저 판단하고,
+    확신하지 못할 때만 LLM chain의 결과를 사용합니다(aclassify). intent는 대화 기록이 없을 때만 router를 사용합니다.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = {}
+
+    async def query_embedding() -> list[float]:
+        if embedding is not None:
+            return embedding
+        return await get_embeddings().aembed_query(user_message)
+
+    async def branch() -> str:
+        async def fallback() -> str:
+            context = dict(user_message=user_message, prompt_tokens=prompt_tokens, **get_summary_context())
+            with span("llm.branch"):
+                return await get_or_create_chain("branch").arun(get_chain_inputs("branch", context))
+
+        if not config.ROUTER_ENABLED:
+            return await fallback()
+        return await aclassify("branch", lambda: graph.get("query_embedding"), fallback)
+
+    async def chat_history() -> HistoryWindow:
+        return await asyncio.to_thread(get_history_window, conversation_id)
+
+    async def intent(chat_history: HistoryWindow) -> str:
+        async def fallback() -> str:
+            context = dict(user_message=user_message, chat_history=chat_history, prompt_tokens=prompt_tokens)
+            with span("llm.intent"):
+                return await get_or_create_chain("intent").arun(get_chain_inputs("intent", context))
+
+        # router는 질문만 보므로, 이전 대화에 따라 의미가 달라질 수 있으면 LLM이 판단합니다.
+        if not config.ROUTER_ENABLED or not chat_history.is_empty():
+            return await fallback()
+        return await aclassify("intent", lambda: graph.get("query_embedding"), fallback)
+
+    async def related_documents(branch: str) -> list[str]:
+        # keyword 질문이 lexical 검색만으로 답해지면 query embedding을 기다리지 않습니다.
+        return await aget_documents(user_message, branch, embedding=lambda: graph.get("query_embedding"))
+
+    graph = StageGraph([
+        Stage("query_embedding", query_embedding),
+        Stage("branch", branch),
+        Stage("chat_history", chat_history),
+        Stage("intent", intent, deps=("chat_history",)),
+        Stage("related_documents", related_documents, deps=("branch",)),
+    ])
+    return graph
 
-    else:
-        context.update(related_documents=get_documents_str())
-        for response in get_or_create_chain("default").run(context):
-            answer += response
-            yield response
 
-    history.add_user_message(user_message)
-    history.add_ai_message(answer)
+async def aprepare_context(
+    user_message: str,
+    conversation_id: str = None,
+    embedding: Optional[list[float]] = None,
+) -> dict:
+    """
+    intent를 판단하고, 선택된 chain들의 prompt가 실제로 사용하는 stage만 실행해 context를 만듭니다.
+    config.PIPELINE_PREFETCH_STAGES에 있는 stage는 intent와 동시에 미리 실행됩니다.
+    config.SPECULATIVE_RETRIEVAL이면 branch가 정해지는 즉시 문서 검색을 시작하고,
+    intent가 문서를 사용하지 않으면 그 결과는 버려집니다.
+    """
+    prefetch = list(config.PIPELINE_PREFETCH_STAGES)
+    if config.SPECULATIVE_RETRIEVAL:
+        prefetch.append("related_documents")
+
+    context = dict(user_message=user_message, prompt_tokens={})
+    graph = build_answer_graph(user_message, conversation_id, embedding=embedding, prompt_tokens=context["prompt_tokens"])
+    graph.start(*prefetch)
+    try:
+        context.update(await graph.gather("chat_history", "intent"))
+
+        variables = {
+            variable
+            for name in get_intent_chains(context["intent"])
+            for variable in get_or_create_chain(name).prompt.input_variables
+        }
+
+        # 대화 맥락에 의존하지 않는 답변이면 비슷한 질문의 답변을 재사용합니다.
+        if config.ANSWER_CACHE_ENABLED and (
+            "chat_history" not in variables or context["chat_history"].is_empty()
+        ):
+            uses_documents = "related_documents" in variables
+            context.update(await graph.gather("query_embedding", *(["branch"] if uses_documents else [])))
+            context["answer_cache_key"] = (
+                context.get("branch"),
+                context["intent"],
+                get_corpus_version(),
+            )
+            cached_answer = ANSWER_CACHE.get(context["query_embedding"], context["answer_cache_key"])
+            if cached_answer is not None:
+                context["cached_answer"] = cached_answer
+                context.setdefault("branch", graph.result("branch"))
+                return context
+
+        # 선택된 chain들의 prompt가 요구하는 stage만 기다립니다.
+        required = {
+            variable
+            for variable in variables
+            if variable in graph.stages and variable not in context
+        }
+        context.update(await graph.gather(*required))
+        context.setdefault("branch", graph.result("branch"))
+    finally:
+        await graph.aclose()
+    return context
+
+
+def save_answer(context: dict, answer: str):
+    """cache 가능한 답변이면 answer cache에 저장합니다."""
+    if "answer_cache_key" in context and "cached_answer" not in context:
+        ANSWER_CACHE.put(context["query_embedding"], context["answer_cache_key"], answer)
+
+
+def get_answer_result(context: dict, conversation_id: str, answer: str) -> dict:
     return {
         "conversation_id": conversation_id,
-        "user_message": user_message,
-        "branch": branch,
-        "intent": intent,
-        "answer": answer
+        "user_message": context["user_message"],
+        "branch": context["branch"],
+        "intent": context["intent"],
+        "answer": answer,
+        "cached": "cached_answer" in context,
+        "prompt_tokens": context.get("prompt_tokens", {}),
     }
 
 
-init_chains()
+async def astream_chain_output(name: str, context: dict) -> AsyncIterator[str]:
+    """stream_chain_output의 async 버전"""
+    chain = get_or_create_chain(name)
+    context = get_chain_inputs(name, context)
+    if not config.LLM_STREAMING:
+        for response in await chain.arun(context):
+            yield response
+        return
+    async for response in astream_chain(chain, context):
+        yield response
+
+
+def stream_chains_output(names: list[str], context: dict) -> Iterator[tuple[int, str]]:
+    """
+    여러 chain의 결과를 (chain index, token)으로 chain 순서대로 yield 합니다.
+    CONCURRENT_GENERATION이 켜져 있으면 모든 chain을 동시에 생성하고,
+    첫 chain은 바로 streaming 하면서 나머지는 앞 chain이 끝날 때까지 모아 둡니다.
+    """
+    def generate(name: str) -> Iterator[str]:
+        with span(f"generation.{name}"):
+            yield from stream_chain_output(name, context)
+
+    if config.CONCURRENT_GENERATION and len(names) > 1:
+        yield from merge_in_order([generate(name) for name in names])
+        return
+    for i, name in enumerate(names):
+        for response in generate(name):
+            yield i, response
+
+
+async def astream_chains_output(names: list[str], context: dict) -> AsyncIterator[tuple[int, str]]:
+    """stream_chains_output의 async 버전"""
+    async def generate(name: str) -> AsyncIterator[str]:
+        with span(f"generation.{name}"):
+            async for response in astream_chain_output(name, context):
+                yield response
+
+    if config.CONCURRENT_GENERATION and len(names) > 1:
+        async for item in amerge_in_order([generate(name) for name in names]):
+            yield item
+        return
+    for i, name in enumerate(names):
+        async for response in generate(name):
+            yield i, response
+
+
+async def acreate_answer(
+    user_message: str,
+    conversation_id: str = None,
+    embedding: Optional[list[float]] = None,
+) -> dict:
+    """create answer by return, without blocking the event loop"""
+    await ainit()
+    with trace(conversation_id), span("answer.total"):
+        context = await aprepare_context(user_message, conversation_id, embedding=embedding)
+
+        if "cached_answer" in context:
+            answer = context["cached_answer"]
+        else:
+            async def generate(name: str) -> str:
+                with span(f"generation.{name}"):
+                    return await get_or_create_chain(name).arun(get_chain_inputs(name, context))
+
+            names = get_intent_chains(context["intent"])
+            if config.CONCURRENT_GENERATION:
+                # chain들의 입력이 서로의 결과에 의존하지 않아 동시에 생성합니다.
+                answers = await asyncio.gather(*(generate(name) for name in names))
+            else:
+                answers = [await generate(name) for name in names]
+            answer = "\n\n".join(answers)
+            save_answer(context, answer)
+
+        await asyncio.to_thread(save_history, conversation_id, user_message, answer)
+        return get_answer_result(context, conversation_id, answer)
+
+
+async def agenerate_answer(
+    user_message: str,
+    conversation_id: str = None,
+    result: Optional[dict] = None,
+) -> AsyncIterator[str]:
+    """
+    generate answer by yield, without blocking the event loop
+    result를 주면 생성이 끝난 뒤 acreate_answer의 반환값(prompt_tokens 포함)으로 채웁니다.
+    """
+    await ainit()
+
+    async def generate() -> AsyncIterator[str]:
+        with span("answer.total"):
+            started = time.perf_counter()
+            context = await aprepare_context(user_message, conversation_id)
+
+            answer = ""
+            if "cached_answer" in context:
+                for response in iter_cached_answer(context["cached_answer"]):
+                    if not answer:
+                        observe("answer.first_token", time.perf_counter() - started)
+                    answer += response
+                    yield response
+            else:
+                current = 0
+                async for i, response in astream_chains_output(get_intent_chains(context["intent"]), context):
+                    if i != current:
+                        current = i
+                        answer += "\n\n"
+                        yield "\n\n"
+                    if not answer:
+                        observe("answer.first_token", time.perf_counter() - started)
+                    answer += response
+                    yield response
+                save_answer(context, answer)
+
+            await asyncio.to_thread(save_history, conversation_id, user_message, answer)
+            if result is not None:
+                result.update(get_answer_result(context, conversation_id, answer))
+
+    async for response in atraced(conversation_id, generate()):
+        yield response
+
+
+async def acreate_answers(
+    batch: list[tuple[str, str]],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """
+    여러 (conversation_id, user_message)의 답변을 동시에 만들고, 끝나는 순서대로 yield 합니다.
+    같은 conversation의 message는 주어진 순서대로 하나씩 처리되고,
+    동시에 처리되는 message 수는 concurrency(기본 config.BATCH_CONCURRENCY)로 제한됩니다.
+    모든 message의 query embedding은 한 번의 요청으로 계산하고,
+    그 요청이 실패하면 message마다 필요할 때 따로 계산합니다.
+    """
+    semaphore = asyncio.Semaphore(concurrency or config.BATCH_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+
+    try:
+        embeddings = await get_embeddings().aembed_documents([user_message for _, user_message in batch])
+    except Exception:
+        # batch 전체를 중단하지 않습니다. 그래도 실패하는 message만 error 결과가 됩니다.
+        logger.exception("failed to embed %d messages at once", len(batch))
+        embeddings = [None] * len(batch)
+
+    conversations: dict[str, list[tuple[str, Optional[list[float]]]]] = {}
+    for (conversation_id, user_message), embedding in zip(batch, embeddings):
+        conversations.setdefault(conversation_id, []).append((user_message, embedding))
+
+    async def run_conversation(conversation_id: str, messages: list[tuple[str, Optional[list[float]]]]):
+        for user_message, embedding in messages:
+            async with semaphore:
+                try:
+                    result = await acreate_answer(user_message, conversation_id, embedding=embedding)
+                except Exception as e:
+                    logger.exception("failed to create answer for %s", conversation_id)
+                    result = {
+                        "conversation_id": conversation_id,
+                        "user_message": user_message,
+                        "error": repr(e),
+                    }
+            await results.put(result)
+
+    tasks = [
+        asyncio.ensure_future(run_conversation(conversation_id, messages))
+        for conversation_id, messages in conversations.items()
+    ]
+    try:
+        for _ in range(len(batch)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def create_answers(
+    batch: list[tuple[str, str]],
+    concurrency: Optional[int] = None,
+) -> Iterator[dict]:
+    """acreate_answers의 동기 버전. 끝나는 순서대로 결과를 yield 합니다."""
+    yield from iterate_async(acreate_answers(batch, concurrency))
+
+
+def create_answer(user_message: str, conversation_id: str = None) -> dict:
+    """create answer by return"""
+    return run_sync(acreate_answer(user_message, conversation_id))
+
+
+def generate_answer(user_message: str, conversation_id: str = None, result: Optional[dict] = None):
+    """
+    generate answer by yield
+    result를 주면 생성이 끝난 뒤 create_answer의 반환값(prompt_tokens 포함)으로 채웁니다.
+    """
+    init()
+
+    def generate() -> Generator[str, None, dict]:
+        with span("answer.total"):
+            started = time.perf_counter()
+            context = run_sync(aprepare_context(user_message, conversation_id))
+
+            answer = ""
+            if "cached_answer" in context:
+                for response in iter_cached_answer(context["cached_answer"]):
+                    if not answer:
+                        observe("answer.first_token", time.perf_counter() - started)
+                    answer += response
+                    yield response
+            else:
+                current = 0
+                for i, response in stream_chains_output(get_intent_chains(context["intent"]), context):
+                    if i != current:
+                        current = i
+                        answer += "\n\n"
+                        yield "\n\n"
+                    if not answer:
+                        observe("answer.first_token", time.perf_counter() - started)
+                    answer += response
+                    yield response
+                save_answer(context, answer)
+
+            save_history(conversation_id, user_message, answer)
+            answer_result = get_answer_result(context, conversation_id, answer)
+            if result is not None:
+                result.update(answer_result)
+            return answer_result
+
+    return (yield from traced(conversation_id, generate()))
+
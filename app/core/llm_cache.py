@@ -0,0 +1,198 @@
+"""
+결과가 거의 정해져 있는 chain(intent, branch, summarize 등)의 LLM 응답을 sqlite에 저장해 재사용합니다.
+
+process 전역의 langchain.llm_cache에는 등록하지 않고, get_or_create_llm이 만든 streaming하지 않는 chat model의
+llm_cache에만 지정합니다. 그 밖의 LangChain model은 이 cache를 읽거나 쓰지 않습니다.
+key는 렌더링된 prompt와 model 설정(model 이름, temperature 등)의 hash이고,
+WAL 모드 sqlite 파일 하나를 여러 Reflex worker process가 함께 사용합니다.
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from langchain.cache import RETURN_VAL_TYPE, BaseCache
+from langchain.chat_models import ChatOpenAI
+from langchain.load.dump import dumps
+from langchain.schema import ChatGeneration, ChatResult, Generation
+from langchain.schema.messages import AIMessage, BaseMessage
+from pydantic import BaseModel
+
+from core.ratelimit import RateLimitedChatOpenAI
+from core.sqlite import get_connection
+from rxconfig import config
+
+logger = logging.getLogger(__name__)
+
+_LLM_CACHE: Optional["SQLiteLLMCache"] = None
+_LOCK = threading.Lock()
+
+SCHEMA = (
+    (
+        "CREATE TABLE IF NOT EXISTS llm_cache ("
+        " key TEXT PRIMARY KEY,"
+        " response TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " accessed_at REAL NOT NULL"
+        ")"
+    ),
+    "CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)",
+)
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    ttl이 지난 응답은 사용하지 않고,
+    max_size를 넘으면 가장 오래 사용되지 않은 응답부터 제거합니다.
+    config.LLM_CACHE_ENABLED를 끄면 즉시 조회와 저장을 모두 건너뜁니다.
+    """
+
+    def __init__(self, path: str, ttl: float, max_size: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return get_connection(self.path, SCHEMA)
+
+    @staticmethod
+    def get_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if not config.LLM_CACHE_ENABLED:
+            return None
+
+        key = self.get_key(prompt, llm_string)
+        row = self.connection.execute(
+            "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return [ChatGeneration(message=AIMessage(content=row[0]))]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if not config.LLM_CACHE_ENABLED or not return_val:
+            return
+
+        generation: Generation = return_val[0]
+        now = time.time()
+        connection = self.connection
+        connection.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (self.get_key(prompt, llm_string), generation.text, now, now),
+        )
+        self.evict(now)
+
+    def evict(self, now: Optional[float] = None):
+        """ttl이 지난 응답과 max_size를 넘는 오래된 응답을 지웁니다."""
+        now = time.time() if now is None else now
+        connection = self.connection
+        connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        connection.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?"
+            ")",
+            (self.max_size,),
+        )
+
+    def clear(self, **kwargs: Any) -> None:
+        self.connection.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self.connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def get_llm_cache() -> Optional[SQLiteLLMCache]:
+    """
+    process에서 함께 사용하는 SQLiteLLMCache를 반환합니다.
+    config.LLM_CACHE_ENABLED가 꺼져 있으면 None.
+    """
+    global _LLM_CACHE
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    with _LOCK:
+        if _LLM_CACHE is None:
+            _LLM_CACHE = SQLiteLLMCache(
+                path=config.LLM_CACHE_PATH,
+                ttl=config.LLM_CACHE_TTL_SECONDS,
+                max_size=config.LLM_CACHE_MAX_SIZE,
+            )
+    return _LLM_CACHE
+
+
+class LLMCacheMixin(BaseModel):
+    """
+    langchain.llm_cache 대신 model의 llm_cache로 응답을 조회하고 저장합니다.
+    llm_cache가 없으면 LangChain 기본 동작과 같습니다.
+    llm_string에 들어가지 않도록 llm_cache는 생성한 뒤에 지정합니다.
+    """
+
+    llm_cache: Optional[BaseCache] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _generate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.llm_cache is None:
+            return super()._generate_with_cache(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        prompt = dumps(messages)
+        cached = self.llm_cache.lookup(prompt, llm_string)
+        if isinstance(cached, list):
+            return ChatResult(generations=cached)
+        result = self._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.llm_cache.update(prompt, llm_string, result.generations)
+        return result
+
+    async def _agenerate_with_cache(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.llm_cache is None:
+            return await super()._agenerate_with_cache(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        prompt = dumps(messages)
+        # sqlite 조회와 저장은 event loop를 막지 않도록 thread에서 실행합니다.
+        cached = await asyncio.to_thread(self.llm_cache.lookup, prompt, llm_string)
+        if isinstance(cached, list):
+            return ChatResult(generations=cached)
+        result = await self._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        await asyncio.to_thread(self.llm_cache.update, prompt, llm_string, result.generations)
+        return result
+
+
+class CachedChatOpenAI(LLMCacheMixin, ChatOpenAI):
+    """llm_cache를 사용하는 ChatOpenAI"""
+
+
+class CachedRateLimitedChatOpenAI(LLMCacheMixin, RateLimitedChatOpenAI):
+    """llm_cache를 사용하는 RateLimitedChatOpenAI"""
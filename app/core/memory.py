@@ -0,0 +1,107 @@
+"""token 예산 안에서 최근 대화와 이전 대화의 요약을 prompt에 넣는 memory"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+import tiktoken
+from langchain.schema import BaseChatMessageHistory
+from langchain.schema.messages import BaseMessage, get_buffer_string
+
+from core.history import SUMMARY_HISTORIES
+from rxconfig import config
+
+
+@lru_cache(maxsize=None)
+def get_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(config.DEFAULT_OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text)) if text else 0
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    # buffer string으로 합칠 때의 줄바꿈 1 token을 포함합니다.
+    return count_tokens(get_buffer_string([message])) + 1
+
+
+@dataclass
+class HistoryWindow:
+    """아직 요약되지 않은 최근 message와 그 이전 대화의 rolling summary"""
+
+    summary: str = ""
+    messages: list[BaseMessage] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not self.summary and not self.messages
+
+    def render(self, budget: Optional[int] = None) -> str:
+        """
+        summary와, budget(token) 안에 들어가는 최근 message들을 prompt용 문자열로 만듭니다.
+        budget이 없으면 모든 message를 넣습니다.
+        """
+        summary = f"Summary of earlier conversation:\n{self.summary}" if self.summary else ""
+
+        messages = self.messages
+        if budget is not None:
+            remaining = budget - count_tokens(summary)
+            selected = []
+            for message in reversed(self.messages):
+                tokens = count_message_tokens(message)
+                if tokens > remaining:
+                    break
+                selected.append(message)
+                remaining -= tokens
+            messages = list(reversed(selected))
+
+        return "\n".join(text for text in [summary, get_buffer_string(messages)] if text)
+
+
+def load_history_window(history: BaseChatMessageHistory, max_tokens: int) -> HistoryWindow:
+    """
+    summary 이후의 message를 최신 순으로 max_tokens까지만 읽습니다.
+    summary를 저장할 수 없는 history는 전체 message를 사용합니다.
+    """
+    if not isinstance(history, SUMMARY_HISTORIES):
+        return HistoryWindow(messages=history.messages)
+
+    summary, covered_id = history.get_summary()
+    messages, total = [], 0
+    for _, message in history.iter_recent(after_id=covered_id):
+        total += count_message_tokens(message)
+        if total > max_tokens:
+            break
+        messages.append(message)
+    return HistoryWindow(summary=summary, messages=list(reversed(messages)))
+
+
+def compact_history(
+    history: BaseChatMessageHistory,
+    max_tokens: int,
+    summarize: Callable[[str, str], str],
+) -> bool:
+    """
+    최근 max_tokens 밖으로 밀려난 message들만 기존 summary에 이어서 요약하고 저장합니다.
+    summarize(summary, new_lines)는 새 summary를 반환해야 합니다.
+    """
+    if not isinstance(history, SUMMARY_HISTORIES):
+        return False
+
+    summary, covered_id = history.get_summary()
+    recent = list(history.iter_recent(after_id=covered_id))
+
+    total, overflow = 0, []
+    for i, (_, message) in enumerate(recent):
+        total += count_message_tokens(message)
+        if total > max_tokens:
+            overflow = list(reversed(recent[i:]))
+            break
+    if not overflow:
+        return False
+
+    new_lines = get_buffer_string([message for _, message in overflow])
+    history.set_summary(summarize(summary, new_lines), overflow[-1][0])
+    return True
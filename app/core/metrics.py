@@ -0,0 +1,248 @@
+"""
+answer pipeline 단계별 지연 측정.
+
+    with trace(conversation_id):
+        with span("branch"):
+            ...
+
+span은 단계별 histogram(p50/p95/p99)에 기록되고, config.METRICS_JSONL_PATH가 있으면
+trace id와 함께 JSON lines로도 남습니다. config.METRICS_ENABLED가 꺼져 있으면 아무것도 하지 않습니다.
+JSON lines는 background thread가 모아서 쓰므로 span을 닫을 때 파일을 열지 않습니다.
+generator는 with trace() 대신 traced()/atraced()로 감싸서 yield 사이에 trace가 호출한 쪽에 남지 않게 합니다.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Generator, Iterator, Optional, TypeVar
+
+import numpy as np
+
+from rxconfig import config
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_TRACE: contextvars.ContextVar[Optional[tuple[str, str]]] = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    """최근 window_size개의 측정값으로 분위수를 계산합니다. count/sum은 전체 누적값입니다."""
+
+    def __init__(self, window_size: int):
+        self.samples: deque[float] = deque(maxlen=window_size)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self) -> dict[float, float]:
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        values = np.quantile(np.fromiter(self.samples, dtype=np.float64), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+HISTOGRAMS: dict[str, Histogram] = {}
+_LOCK = threading.Lock()
+
+# 파일에 쓰기를 기다리는 (path, record). _LOCK으로 보호합니다.
+_RECORDS: list[tuple[str, dict]] = []
+_WRITE_LOCK = threading.Lock()
+_WRITER: Optional[threading.Thread] = None
+
+
+def get_trace_id() -> Optional[str]:
+    current = _TRACE.get()
+    return current[0] if current else None
+
+
+def new_trace(conversation_id: Optional[str] = None) -> Optional[tuple[str, str]]:
+    if not config.METRICS_ENABLED:
+        return None
+    return f"{conversation_id}-{uuid.uuid4().hex[:12]}", f"{conversation_id}"
+
+
+@contextlib.contextmanager
+def use_trace(current: Optional[tuple[str, str]]) -> Iterator[Optional[str]]:
+    """new_trace()로 만든 trace를 with 블록 동안 현재 context에 설정합니다."""
+    if current is None:
+        yield None
+        return
+    token = _TRACE.set(current)
+    try:
+        yield current[0]
+    finally:
+        _TRACE.reset(token)
+
+
+def trace(conversation_id: Optional[str] = None) -> contextlib.AbstractContextManager[Optional[str]]:
+    """요청 하나의 trace id를 정합니다. 안에서 기록되는 span은 모두 같은 trace id를 가집니다."""
+    return use_trace(new_trace(conversation_id))
+
+
+def traced(conversation_id: Optional[str], generator: Generator[T, None, R]) -> Generator[T, None, R]:
+    """generator를 하나의 trace로 실행합니다. trace는 generator가 실행되는 동안에만 설정됩니다."""
+    current = new_trace(conversation_id)
+    try:
+        while True:
+            with use_trace(current):
+                try:
+                    item = next(generator)
+                except StopIteration as e:
+                    return e.value
+            yield item
+    finally:
+        with use_trace(current):
+            generator.close()
+
+
+async def atraced(conversation_id: Optional[str], iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+    """traced의 async generator 버전"""
+    current = new_trace(conversation_id)
+    try:
+        while True:
+            with use_trace(current):
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield item
+    finally:
+        with use_trace(current):
+            await iterator.aclose()
+
+
+def observe(name: str, seconds: float):
+    """측정한 시간을 histogram에 기록합니다. JSON lines 기록은 buffer에 넣고 background thread가 씁니다."""
+    if not config.METRICS_ENABLED:
+        return
+    with _LOCK:
+        histogram = HISTOGRAMS.get(name)
+        if histogram is None:
+            histogram = HISTOGRAMS[name] = Histogram(config.METRICS_WINDOW_SIZE)
+        histogram.observe(seconds)
+
+        if config.METRICS_JSONL_PATH:
+            current = _TRACE.get()
+            record = {
+                "ts": time.time(),
+                "trace_id": current[0] if current else None,
+                "conversation_id": current[1] if current else None,
+                "stage": name,
+                "seconds": seconds,
+            }
+            _RECORDS.append((config.METRICS_JSONL_PATH, record))
+            start_writer()
+
+
+def start_writer():
+    """처음 기록할 때 JSON lines를 주기적으로 쓰는 daemon thread를 시작합니다. _LOCK 안에서 호출합니다."""
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = threading.Thread(target=run_writer, name="metrics-writer", daemon=True)
+        _WRITER.start()
+        # 종료할 때 남은 기록을 씁니다.
+        atexit.register(flush)
+
+
+def run_writer():
+    while True:
+        time.sleep(config.METRICS_FLUSH_INTERVAL_SECONDS)
+        try:
+            flush()
+        except Exception:
+            logger.exception("failed to write metrics")
+
+
+def flush():
+    """buffer에 모인 JSON lines 기록을 파일에 씁니다."""
+    with _WRITE_LOCK:
+        with _LOCK:
+            records = _RECORDS[:]
+            _RECORDS.clear()
+        lines: dict[str, list[str]] = {}
+        for path, record in records:
+            lines.setdefault(path, []).append(json.dumps(record, ensure_ascii=False) + "\n")
+        for path, texts in lines.items():
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(texts)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        observe(self.name, time.perf_counter() - self.started)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str) -> _Span | _NoopSpan:
+    """with 블록의 실행 시간을 name 단계로 기록합니다. async 코드 안에서도 사용할 수 있습니다."""
+    if not config.METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def reset():
+    with _LOCK:
+        HISTOGRAMS.clear()
+
+
+def export_json() -> dict[str, dict]:
+    with _LOCK:
+        return {
+            name: {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                **{f"p{int(q * 100)}": value for q, value in histogram.quantiles().items()},
+            }
+            for name, histogram in sorted(HISTOGRAMS.items())
+        }
+
+
+def export_prometheus(metric: str = "answer_stage_seconds") -> str:
+    """Prometheus text exposition format(summary)으로 내보냅니다."""
+    lines = [
+        f"# HELP {metric} Latency of each answer pipeline stage in seconds.",
+        f"# TYPE {metric} summary",
+    ]
+    with _LOCK:
+        for name, histogram in sorted(HISTOGRAMS.items()):
+            for q, value in histogram.quantiles().items():
+                lines.append(f'{metric}{{stage="{name}",quantile="{q}"}} {value}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.sum}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,178 @@
+"""
+검색 결과의 중복 줄이기.
+
+chunk는 300자 단위로 조금씩 겹치게 나뉘어 있어, 같은 절의 이웃 chunk가 함께 검색되면 prompt에 같은 내용이 여러 번 들어갑니다.
+후보를 넉넉히 가져와 같은 element에서 나뉜 이웃 chunk를 먼저 하나의 passage로 합치고,
+합친 passage 중에서 maximal marginal relevance로 서로 다른 passage를 고릅니다.
+이웃 chunk는 서로 비슷해서, 먼저 고르면 합치기도 전에 대부분 빠지기 때문입니다.
+"""
+from collections import Counter
+from typing import Any, Optional
+
+import numpy as np
+from langchain.schema.document import Document
+
+from core.lexical import tokenize
+from core.vectorstore import normalize_rows
+
+# 이보다 짧게 겹치는 부분은 우연히 같은 글자로 보고 지우지 않습니다.
+MIN_OVERLAP = 5
+
+
+def select_mmr(relevance: np.ndarray, similarity: np.ndarray, k: int, lambda_mult: float = 0.5) -> list[int]:
+    """
+    relevance(후보별 질문과의 관련도)와 이미 고른 후보와의 최대 similarity를 lambda_mult로 섞어
+    k개를 차례로 고르고, 고른 순서대로 index를 반환합니다. lambda_mult가 1이면 relevance 순서와 같습니다.
+    """
+    if not len(relevance) or k <= 0:
+        return []
+    redundancy = np.full(len(relevance), -np.inf, dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+
+    selected: list[int] = []
+    for _ in range(min(k, len(relevance))):
+        scores = relevance if not selected else lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores = np.where(available, scores, -np.inf)
+        i = int(np.argmax(scores))
+        selected.append(i)
+        available[i] = False
+        # 새로 고른 후보와의 유사도로 나머지 후보의 중복 정도를 갱신합니다.
+        redundancy = np.maximum(redundancy, similarity[i])
+    return selected
+
+
+def maximal_marginal_relevance(
+    query_embedding: list[float] | np.ndarray,
+    embeddings: list[list[float]] | np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> list[int]:
+    """embedding의 cosine 유사도로 select_mmr를 적용합니다."""
+    if not len(embeddings):
+        return []
+    candidates = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    query = normalize_rows(np.asarray([query_embedding], dtype=np.float32))[0]
+    return select_mmr(candidates @ query, candidates @ candidates.T, k, lambda_mult)
+
+
+def text_similarity(texts: list[str]) -> np.ndarray:
+    """embedding이 없을 때 사용하는 문자 n-gram 빈도의 cosine 유사도 행렬"""
+    counts = [Counter(tokenize(text)) for text in texts]
+    vocabulary = {token: i for i, token in enumerate(dict.fromkeys(token for count in counts for token in count))}
+    matrix = np.zeros((len(texts), max(len(vocabulary), 1)), dtype=np.float32)
+    for row, count in enumerate(counts):
+        for token, value in count.items():
+            matrix[row, vocabulary[token]] = value
+    matrix = normalize_rows(matrix)
+    return matrix @ matrix.T
+
+
+def join_text(a: str, b: str) -> str:
+    """a의 끝과 b의 앞이 겹치면 한 번만 남기고, 겹치지 않으면 문단으로 이어 붙입니다."""
+    for size in range(min(len(a), len(b)), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:size]):
+            return a + b[size:]
+    return f"{a}\n\n{b}"
+
+
+def get_chunk_range(doc: Document) -> Optional[tuple[Any, int, int]]:
+    """(element key, 첫 chunk_index, 마지막 chunk_index). 합친 passage는 chunk_count개의 chunk를 포함합니다."""
+    metadata = doc.metadata
+    if "element_index" not in metadata or "chunk_index" not in metadata:
+        return None
+    start = metadata["chunk_index"]
+    return (metadata.get("data_source"), metadata["element_index"]), start, start + metadata.get("chunk_count", 1) - 1
+
+
+def group_adjacent_chunks(documents: list[Document]) -> list[list[int]]:
+    """
+    같은 element에서 chunk 범위가 겹치거나 이어지는 문서의 index를 chunk 순서로 묶습니다.
+    묶음은 그중 가장 높은 순위의 자리에 두고, 나머지 순서는 그대로 유지합니다.
+    element_index가 없는 chunk(이전에 적재된 data)는 혼자 한 묶음입니다.
+    """
+    elements: dict[Any, list[int]] = {}
+    heads: dict[int, list[int]] = {}
+    for rank, doc in enumerate(documents):
+        chunk_range = get_chunk_range(doc)
+        if chunk_range is None:
+            heads[rank] = [rank]
+        else:
+            elements.setdefault(chunk_range[0], []).append(rank)
+
+    for ranks in elements.values():
+        ranks = sorted(ranks, key=lambda rank: get_chunk_range(documents[rank])[1:])
+        groups, end = [], None
+        for rank in ranks:
+            _, start, stop = get_chunk_range(documents[rank])
+            if end is not None and start <= end + 1:
+                groups[-1].append(rank)
+                end = max(end, stop)
+            else:
+                groups.append([rank])
+                end = stop
+        for group in groups:
+            heads[min(group)] = group
+    return [heads[rank] for rank in sorted(heads)]
+
+
+def merge_group(documents: list[Document], group: list[int]) -> Document:
+    """chunk 순서로 묶인 문서를 겹치는 부분을 지워 하나의 passage로 합칩니다."""
+    if len(group) == 1:
+        return documents[group[0]]
+    first = documents[group[0]]
+    _, start, end = get_chunk_range(first)
+    text = first.page_content
+    for rank in group[1:]:
+        _, chunk_start, chunk_end = get_chunk_range(documents[rank])
+        if chunk_end <= end:
+            # 이미 합친 passage에 포함된 chunk입니다.
+            continue
+        text = join_text(text, documents[rank].page_content)
+        end = chunk_end
+    return Document(page_content=text, metadata={**first.metadata, "chunk_index": start, "chunk_count": end - start + 1})
+
+
+def merge_adjacent_chunks(documents: list[Document]) -> list[Document]:
+    """같은 element에서 이어지는 chunk를 하나의 passage로 합칩니다. 이미 합친 passage를 다시 넣어도 같은 결과입니다."""
+    return [merge_group(documents, group) for group in group_adjacent_chunks(documents)]
+
+
+def diversify(
+    query_embedding: list[float],
+    documents: list[Document],
+    embeddings: list[list[float]] | np.ndarray,
+    k: int,
+    lambda_mult: float,
+    merge: bool = True,
+) -> list[Document]:
+    """
+    vector 검색 후보에서 이웃 chunk를 먼저 합치고, 합친 passage 중 k개를 MMR로 고릅니다.
+    합친 passage의 embedding은 포함된 chunk embedding의 평균입니다.
+    """
+    groups = group_adjacent_chunks(documents) if merge else [[rank] for rank in range(len(documents))]
+    if not groups:
+        return []
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    passages = np.stack([vectors[group].mean(axis=0) for group in groups])
+    return [merge_group(documents, groups[i]) for i in maximal_marginal_relevance(query_embedding, passages, k, lambda_mult)]
+
+
+def diversify_by_text(
+    documents: list[Document],
+    scores: list[float],
+    k: int,
+    lambda_mult: float,
+    merge: bool = True,
+) -> list[Document]:
+    """
+    embedding 없이 검색한 후보(BM25)에 diversify와 같은 처리를 합니다.
+    관련도는 passage에 포함된 chunk의 가장 높은 점수이고, 중복 정도는 문자 n-gram 유사도입니다.
+    """
+    groups = group_adjacent_chunks(documents) if merge else [[rank] for rank in range(len(documents))]
+    if not groups:
+        return []
+    passages = [merge_group(documents, group) for group in groups]
+    relevance = np.asarray([max(scores[rank] for rank in group) for group in groups], dtype=np.float32)
+    relevance /= relevance.max() or 1.0
+    similarity = text_similarity([passage.page_content for passage in passages])
+    return [passages[i] for i in select_mmr(relevance, similarity, k, lambda_mult)]
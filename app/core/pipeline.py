@@ -0,0 +1,121 @@
+"""answer pipeline을 stage 단위의 의존 그래프로 실행합니다."""
+import asyncio
+import contextvars
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, Optional
+
+from core.metrics import span
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    pipeline의 한 단계.
+    func는 deps에 나열된 stage의 결과를 같은 이름의 keyword 인자로 받습니다.
+    """
+
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    deps: tuple[str, ...] = ()
+
+
+class StageGraph:
+    """
+    stage 간 의존 관계를 따라 요청된 stage만 실행합니다.
+    서로 의존하지 않는 stage는 asyncio로 동시에 실행되고,
+    아무도 결과를 요청하지 않은 stage는 실행되지 않습니다.
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: dict[str, Stage] = {stage.name: stage for stage in stages}
+        self._tasks: dict[str, asyncio.Future] = {}
+        self._validate()
+
+    def _validate(self):
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"cycle detected at stage '{name}'")
+            if name not in self.stages:
+                raise ValueError(f"unknown stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _task(self, name: str) -> asyncio.Future:
+        if name not in self.stages:
+            raise ValueError(f"unknown stage '{name}'")
+        if name not in self._tasks:
+            self._tasks[name] = asyncio.ensure_future(self._run(self.stages[name]))
+        return self._tasks[name]
+
+    async def _run(self, stage: Stage) -> Any:
+        values = await asyncio.gather(*(self._task(dep) for dep in stage.deps))
+        with span(f"stage.{stage.name}"):
+            return await stage.func(**dict(zip(stage.deps, values)))
+
+    def start(self, *names: str):
+        """결과를 기다리지 않고 stage를 미리 실행합니다."""
+        for name in names:
+            self._task(name)
+
+    async def get(self, name: str) -> Any:
+        return await self._task(name)
+
+    async def gather(self, *names: str) -> dict[str, Any]:
+        values = await asyncio.gather(*(self._task(name) for name in names))
+        return dict(zip(names, values))
+
+    def result(self, name: str, default: Any = None) -> Any:
+        """이미 끝난 stage의 결과를 반환합니다. 실행되지 않았거나 실패했다면 default."""
+        task = self._tasks.get(name)
+        if task is None or not task.done() or task.cancelled() or task.exception():
+            return default
+        return task.result()
+
+    async def aclose(self):
+        """아직 끝나지 않은 stage를 취소합니다."""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        # 취소/실패한 task의 예외를 회수해 경고가 남지 않도록 합니다.
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    coroutine을 동기적으로 실행합니다.
+    이미 event loop가 실행 중이면 별도 thread의 새 loop에서 실행합니다.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result: dict[str, Any] = {}
+    # trace id, rate limit priority 같은 contextvar를 새 thread로 전달합니다.
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            result["value"] = context.run(asyncio.run, coro)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join()
+
+    error: Optional[BaseException] = result.get("error")
+    if error:
+        raise error
+    return result.get("value")
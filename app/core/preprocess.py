@@ -2,19 +2,22 @@ import json
 import os
 import re
 
-from langchain.document_loaders import UnstructuredMarkdownLoader
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import Chroma
 
+from core.cache import ANSWER_CACHE
+from core.chroma import bump_corpus_version, reset_vector_store, update_lexical_index, upload_documents
 from core.const import DataSource, SUCCESS_PATH
 from core.llm import get_or_create_chain
-from rxconfig import config
+from core.ratelimit import BATCH, priority
+from core.router import reset_router
 
 SUMMARY: dict = {}
 
 
 def preprocessing(data_source: str | DataSource):
+    # unstructured는 전처리할 때만 import 합니다.
+    from langchain.document_loaders import UnstructuredMarkdownLoader
+
     if isinstance(data_source, str):
         data_source = DataSource(data_source)
 
@@ -97,7 +100,17 @@ def preprocessing(data_source: str | DataSource):
         strategy="fast",
     )
     splitter = CharacterTextSplitter(chunk_size=300, chunk_overlap=20)
-    docs = loader.load_and_split(splitter)
+    elements = loader.load()
+    for element_index, element in enumerate(elements):
+        element.metadata["element_index"] = element_index
+    docs = splitter.split_documents(elements)
+
+    # 같은 element에서 나뉜 chunk의 순서. 검색 결과에서 이웃 chunk를 합칠 때 사용합니다.
+    chunk_counts: dict[int, int] = {}
+    for doc in docs:
+        element_index = doc.metadata["element_index"]
+        doc.metadata["chunk_index"] = chunk_counts.get(element_index, 0)
+        chunk_counts[element_index] = doc.metadata["chunk_index"] + 1
 
     # add metadata & pop unnecessary metadata
     for doc in docs:
@@ -109,12 +122,18 @@ def preprocessing(data_source: str | DataSource):
         doc.metadata.pop("page_number", None)
 
     # upload
-    Chroma.from_documents(
-        docs,
-        OpenAIEmbeddings(),
-        persist_directory=config.CHROMA_PERSIST_DIRECTORY,
-        collection_name=config.CHROMA_COLLECTION_NAME,
-    )
+    upload_documents(f"{data_source}", docs)
+
+    # 같은 chunk로 lexical 검색 index를 만들어 chroma 옆에 저장합니다.
+    update_lexical_index(f"{data_source}", docs)
+    # brute-force 검색 index는 다음 검색에서 전체 chunk로 다시 만듭니다.
+    reset_vector_store()
+
+    # 이전 corpus로 만든 검색 결과와 답변은 더 이상 사용하지 않습니다.
+    bump_corpus_version()
+    ANSWER_CACHE.clear()
+    # branch router는 data source 요약을 예시로 사용하므로 다시 계산합니다.
+    reset_router("branch")
 
     return full_text, len(docs)
 
@@ -125,6 +144,7 @@ def load_data_and_upload_chroma():
     if os.path.exists(SUCCESS_PATH):
         with open(SUCCESS_PATH, "r+", encoding="utf-8") as file:
             SUMMARY = json.load(file)
+        reset_router("branch")
         return
 
     summarize_chain = get_or_create_chain("summarize")
@@ -134,13 +154,16 @@ def load_data_and_upload_chroma():
         if isinstance(data_source, str):
             data_source = DataSource(data_source)
 
-        # preprocessing
-        full_text, count = preprocessing(data_source)
+        # 적재와 요약은 사용자 요청보다 늦게 처리되어도 됩니다.
+        with priority(BATCH):
+            # preprocessing
+            full_text, count = preprocessing(data_source)
 
-        # get keywords for each data source
-        summarized_text = summarize_chain.run({"text": full_text})
+            # get keywords for each data source
+            summarized_text = summarize_chain.run({"text": full_text})
 
         SUMMARY[f"{data_source}"] = summarized_text.replace("\n", "")
+        reset_router("branch")
     print(SUMMARY)
 
     with open(SUCCESS_PATH, "w+", encoding="utf-8") as file:
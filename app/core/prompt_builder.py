@@ -0,0 +1,92 @@
+"""
+prompt 조립기.
+
+template의 고정 부분은 chain마다 한 번만 token을 세고,
+요청마다 각 section(user_message, chat_history, related_documents 등)의 token을 세어
+model의 context window 안에 들어가도록 우선순위대로 채웁니다.
+"""
+import logging
+from dataclasses import dataclass, field
+from string import Formatter
+from typing import Any, Optional
+
+from langchain.prompts import PromptTemplate
+
+from core.memory import HistoryWindow, count_tokens
+from rxconfig import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PromptReport:
+    """prompt section별 token 수"""
+
+    static: int = 0
+    sections: dict[str, int] = field(default_factory=dict)
+    dropped_documents: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.static + sum(self.sections.values())
+
+
+class PromptBuilder:
+
+    def __init__(self, prompt: PromptTemplate, history_budget: Optional[int] = None):
+        self.prompt = prompt
+        self.history_budget = history_budget
+        self.variables = list(prompt.input_variables)
+        # 변수를 모두 비운 template = 요청마다 변하지 않는 고정 부분
+        static_text = "".join(
+            literal for literal, *_ in Formatter().parse(prompt.template)
+        )
+        self.static_tokens = count_tokens(static_text)
+
+    def get_available_tokens(self) -> int:
+        return (
+            config.DEFAULT_OPENAI_CONTEXT_WINDOW
+            - config.DEFAULT_OPENAI_MAX_TOKENS
+            - self.static_tokens
+        )
+
+    def _priority(self, variable: str) -> int:
+        priority = config.PROMPT_SECTION_PRIORITY
+        # 우선순위가 정해지지 않은 section(user_message 등)은 항상 먼저 넣습니다.
+        return priority.index(variable) if variable in priority else -1
+
+    def build(self, context: dict[str, Any]) -> tuple[dict[str, Any], PromptReport]:
+        """context의 section들을 context window에 맞춘 문자열로 바꾼 chain inputs와 report를 반환합니다."""
+        inputs = dict(context)
+        report = PromptReport(static=self.static_tokens)
+        available = self.get_available_tokens()
+
+        for variable in sorted(self.variables, key=self._priority):
+            value = context.get(variable, "")
+
+            if isinstance(value, HistoryWindow):
+                budget = available if self.history_budget is None else min(available, self.history_budget)
+                text = value.render(max(budget, 0))
+            elif isinstance(value, (list, tuple)):
+                # 검색 순위가 높은 문서부터 들어가는 만큼만 넣습니다.
+                chunks = []
+                remaining = available
+                for chunk in value:
+                    tokens = count_tokens(chunk) + 1
+                    if tokens > remaining:
+                        break
+                    chunks.append(chunk)
+                    remaining -= tokens
+                report.dropped_documents += len(value) - len(chunks)
+                text = "\n".join(chunks)
+            else:
+                text = f"{value}"
+
+            tokens = count_tokens(text)
+            inputs[variable] = text
+            report.sections[variable] = tokens
+            available -= tokens
+
+        if available < 0:
+            logger.warning("prompt exceeds context window by %d tokens", -available)
+        return inputs, report
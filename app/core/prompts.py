@@ -17,6 +17,23 @@ The language of answer must be korean.
 Answer:\
 """
 
+# SUMMARIZE_HISTORY: 이전 summary에 새 대화를 이어서 요약합니다.
+SUMMARIZE_HISTORY = """\
+Progressively summarize the lines of conversation provided, \
+adding onto the previous summary and returning a new summary. \
+The language of answer must be korean.
+
+<summary>
+{summary}
+</summary>
+
+<new_lines>
+{new_lines}
+</new_lines>
+
+New summary:\
+"""
+
 BRANCH = COMMON_CONTEXT + """\
 Your job is to select one context from the <context_list>. \
 need to select only key of context.
@@ -0,0 +1,298 @@
+"""
+OpenAI 요청을 process 전체에서 함께 제한하는 rate limiter.
+
+모든 chat model과 embedding 요청은 같은 token bucket(분당 요청 수, 분당 token 수)을 사용합니다.
+대기 중인 요청은 priority가 낮은 값부터 처리되어, 사용자 답변 생성이 요약 같은 batch 작업보다 먼저 나갑니다.
+429 등 일시적인 오류는 jitter가 섞인 exponential backoff로 재시도합니다.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+import numpy as np
+import openai
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings.base import Embeddings
+from langchain.schema import ChatResult
+from langchain.schema.messages import BaseMessage, get_buffer_string
+
+from core.memory import count_tokens
+from rxconfig import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INTERACTIVE = 0
+BATCH = 10
+
+# 현재 실행 흐름의 priority. asyncio task와 asyncio.to_thread로 전파됩니다.
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+)
+
+
+@contextlib.contextmanager
+def priority(level: int) -> Iterator[None]:
+    """with 블록 안에서 발생하는 OpenAI 요청의 priority를 지정합니다."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def get_priority() -> int:
+    return _PRIORITY.get()
+
+
+class RateLimiter:
+    """분당 요청 수와 token 수를 함께 제한하는 priority token bucket"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, poll_seconds: float = 0.05):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.poll_seconds = poll_seconds
+
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+        self.waits: deque[float] = deque(maxlen=1000)
+        self.acquired = 0
+        self.retries = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _try_acquire(self, waiter: tuple[int, int], tokens: int) -> float:
+        """획득하면 0, 아니면 다시 시도하기까지 기다릴 시간을 반환합니다."""
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._waiters[0] != waiter:
+                return self.poll_seconds
+
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                heapq.heappop(self._waiters)
+                self.acquired += 1
+                return 0.0
+
+            request_wait = max(0.0, 1 - self._requests) * 60 / self.requests_per_minute
+            token_wait = max(0.0, tokens - self._tokens) * 60 / self.tokens_per_minute
+            return max(request_wait, token_wait, 0.001)
+
+    def _enter(self, priority_level: int) -> tuple[int, int]:
+        waiter = (priority_level, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _leave(self, waiter: tuple[int, int]):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+
+    def acquire(self, tokens: int, priority_level: Optional[int] = None):
+        started = time.monotonic()
+        waiter = self._enter(get_priority() if priority_level is None else priority_level)
+        try:
+            while wait := self._try_acquire(waiter, tokens):
+                time.sleep(min(wait, self.poll_seconds))
+        except BaseException:
+            self._leave(waiter)
+            raise
+        self.waits.append(time.monotonic() - started)
+
+    async def aacquire(self, tokens: int, priority_level: Optional[int] = None):
+        started = time.monotonic()
+        waiter = self._enter(get_priority() if priority_level is None else priority_level)
+        try:
+            while wait := self._try_acquire(waiter, tokens):
+                await asyncio.sleep(min(wait, self.poll_seconds))
+        except BaseException:
+            self._leave(waiter)
+            raise
+        self.waits.append(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        waits_ms = np.array(self.waits or [0.0]) * 1000
+        return {
+            "acquired": self.acquired,
+            "retries": self.retries,
+            "waiting": len(self._waiters),
+            "wait_ms_p50": float(np.percentile(waits_ms, 50)),
+            "wait_ms_p95": float(np.percentile(waits_ms, 95)),
+            "wait_ms_max": float(waits_ms.max()),
+        }
+
+
+LIMITER = RateLimiter(
+    requests_per_minute=config.RATE_LIMIT_REQUESTS_PER_MINUTE,
+    tokens_per_minute=config.RATE_LIMIT_TOKENS_PER_MINUTE,
+)
+
+
+def get_backoff_seconds(attempt: int) -> float:
+    """full jitter exponential backoff"""
+    ceiling = min(
+        config.RATE_LIMIT_BACKOFF_MAX_SECONDS,
+        config.RATE_LIMIT_BACKOFF_BASE_SECONDS * 2 ** attempt,
+    )
+    return random.uniform(0, ceiling)
+
+
+def call_with_backoff(
+    func: Callable[[], T],
+    tokens: int,
+    priority_level: Optional[int] = None,
+    can_retry: Optional[Callable[[], bool]] = None,
+) -> T:
+    """
+    rate limiter를 통과한 뒤 func를 호출하고, 일시적인 오류는 backoff 후 재시도합니다.
+    can_retry가 False를 반환하면 재시도하지 않고 오류를 그대로 냅니다.
+    """
+    for attempt in itertools.count():
+        if config.RATE_LIMIT_ENABLED:
+            LIMITER.acquire(tokens, priority_level)
+        try:
+            return func()
+        except RETRYABLE_ERRORS as e:
+            if attempt >= config.RATE_LIMIT_MAX_RETRIES or (can_retry and not can_retry()):
+                raise
+            LIMITER.retries += 1
+            wait = get_backoff_seconds(attempt)
+            logger.warning("retrying OpenAI request in %.2fs: %r", wait, e)
+            time.sleep(wait)
+
+
+async def acall_with_backoff(
+    func: Callable[[], Awaitable[T]],
+    tokens: int,
+    priority_level: Optional[int] = None,
+    can_retry: Optional[Callable[[], bool]] = None,
+) -> T:
+    for attempt in itertools.count():
+        if config.RATE_LIMIT_ENABLED:
+            await LIMITER.aacquire(tokens, priority_level)
+        try:
+            return await func()
+        except RETRYABLE_ERRORS as e:
+            if attempt >= config.RATE_LIMIT_MAX_RETRIES or (can_retry and not can_retry()):
+                raise
+            LIMITER.retries += 1
+            wait = get_backoff_seconds(attempt)
+            logger.warning("retrying OpenAI request in %.2fs: %r", wait, e)
+            await asyncio.sleep(wait)
+
+
+class TokenTracker:
+    """run_manager를 감싸 streaming token을 하나라도 보냈는지 기록합니다."""
+
+    def __init__(self, run_manager: Any):
+        self.run_manager = run_manager
+        self.sent = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.run_manager, name)
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        # role만 담긴 첫 chunk는 빈 token입니다.
+        self.sent = self.sent or bool(token)
+        # async run_manager는 coroutine을 반환하고, 호출한 쪽에서 await 합니다.
+        return self.run_manager.on_llm_new_token(token, **kwargs)
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """LIMITER를 통과해서 요청하는 ChatOpenAI"""
+
+    priority: Optional[int] = None
+
+    def _estimate_tokens(self, messages: list[BaseMessage]) -> int:
+        # OpenAI는 max_tokens까지 포함해 분당 token 한도를 계산합니다.
+        return count_tokens(get_buffer_string(messages)) + (self.max_tokens or 0)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # 이미 사용자에게 보낸 token이 있으면 다시 요청할 때 같은 token이 또 나가므로 재시도하지 않습니다.
+        tracker = TokenTracker(run_manager) if run_manager else None
+        return call_with_backoff(
+            lambda: super(RateLimitedChatOpenAI, self)._generate(messages, stop, tracker, **kwargs),
+            tokens=self._estimate_tokens(messages),
+            priority_level=self.priority,
+            can_retry=lambda: not (tracker and tracker.sent),
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tracker = TokenTracker(run_manager) if run_manager else None
+        return await acall_with_backoff(
+            lambda: super(RateLimitedChatOpenAI, self)._agenerate(messages, stop, tracker, **kwargs),
+            tokens=self._estimate_tokens(messages),
+            priority_level=self.priority,
+            can_retry=lambda: not (tracker and tracker.sent),
+        )
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """LIMITER를 통과해서 요청하는 embedding 함수"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embeddings, name)
+
+    @staticmethod
+    def _estimate_tokens(texts: list[str]) -> int:
+        return sum(count_tokens(text) for text in texts)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return call_with_backoff(lambda: self.embeddings.embed_documents(texts), self._estimate_tokens(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return call_with_backoff(lambda: self.embeddings.embed_query(text), self._estimate_tokens([text]))
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await acall_with_backoff(
+            lambda: self.embeddings.aembed_documents(texts),
+            self._estimate_tokens(texts),
+        )
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await acall_with_backoff(
+            lambda: self.embeddings.aembed_query(text),
+            self._estimate_tokens([text]),
+        )
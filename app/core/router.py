@@ -0,0 +1,263 @@
+"""
+embedding 기반 intent / branch router.
+
+label별 예시 문장의 embedding 중심(centroid)과 질문 embedding의 cosine 유사도로 label을 고릅니다.
+확신도가 config.ROUTER_CONFIDENCE_THRESHOLD 이상일 때만 답하고,
+그렇지 않으면 None을 반환해 기존 LLM chain이 판단하도록 합니다.
+질문 embedding만 보므로 "그거 버그 같아"처럼 대화 맥락이 필요한 intent는
+대화 기록이 있으면 router를 사용하지 않고 LLM chain이 판단합니다.
+
+offline 정확도/지연 report:
+    python -m core.router
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from core.chroma import get_embeddings
+from core.const import DataSource
+from rxconfig import config
+
+INTENT_EXAMPLES: dict[str, list[str]] = {
+    "hello": [
+        "안녕하세요",
+        "안녕",
+        "하이",
+        "반가워요",
+        "처음 왔어요",
+        "너의 이름은 뭐야?",
+        "너는 누구야?",
+        "자기소개 해줘",
+        "너는 무엇으로 구성되어 있니?",
+        "무엇을 도와줄 수 있어?",
+    ],
+    "bug": [
+        "그거 버그 같아",
+        "오류가 발생해요",
+        "에러가 나요",
+        "로그인이 안 돼요",
+        "API 호출하면 500 에러가 떠요",
+        "메시지 전송이 실패합니다",
+        "설정했는데 동작하지 않아요",
+        "앱이 갑자기 종료돼요",
+        "동의 화면이 안 떠요",
+        "토큰 발급이 계속 실패해요",
+    ],
+    "enhancement": [
+        "이런 기능이 추가되면 좋겠어요",
+        "새로운 기능을 제안하고 싶어요",
+        "다른 서비스와 연동 기능을 만들어 주세요",
+        "대량 발송 기능이 있으면 좋겠어요",
+        "통계 대시보드를 추가해 주세요",
+        "SDK를 새 언어로도 지원해 주세요",
+        "이 기능을 개선해 주면 좋겠어요",
+        "웹훅 기능을 지원해 주세요",
+    ],
+    "question": [
+        "카카오 싱크가 뭐야",
+        "카카오 소셜이 뭐야",
+        "카카오 채널에 대해 설명해줘",
+        "카카오톡 채널을 추가하려면 어떻게 해?",
+        "간편가입은 어떻게 사용해?",
+        "친구 목록은 어떻게 가져와?",
+        "도입하려면 어떤 검수가 필요해?",
+        "사용자 정보는 어떤 항목을 받을 수 있어?",
+        "메시지 비용은 얼마야?",
+        "그럼 그걸 사용하면 싱크할 수 있어??",
+    ],
+}
+
+BRANCH_EXAMPLES: dict[str, list[str]] = {
+    DataSource.channel.value: [
+        "카카오 채널에 대해 설명해줘",
+        "카카오톡 채널을 추가하려면 어떻게 해?",
+        "채널 메시지는 어떻게 보내?",
+        "플러스친구가 뭐야?",
+        "채널 친구에게 마케팅 메시지를 보내고 싶어",
+        "채널 관계 확인 API",
+    ],
+    DataSource.social.value: [
+        "카카오 소셜이 뭐야",
+        "카카오톡 친구 목록은 어떻게 가져와?",
+        "카카오톡 프로필 정보를 가져오고 싶어",
+        "친구에게 메시지 보내기",
+        "소셜 API 사용 방법",
+        "친구 피커는 어떻게 써?",
+    ],
+    DataSource.sync.value: [
+        "카카오 싱크가 뭐야",
+        "카카오싱크 도입 방법",
+        "간편가입은 어떻게 사용해?",
+        "카카오로 시작하기 버튼",
+        "서비스 약관 동의를 한 번에 받고 싶어",
+        "배송지 정보를 제공받을 수 있어?",
+    ],
+}
+
+
+class EmbeddingRouter:
+    """label별 예시 embedding의 중심에 가장 가까운 label을 고르는 분류기"""
+
+    def __init__(self, examples: dict[str, list[str]], embeddings: Embeddings):
+        self.examples = {label: texts for label, texts in examples.items() if texts}
+        self.embeddings = embeddings
+        self.labels: list[str] = []
+        self.centroids: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def fit(self, vectors: Optional[dict[str, np.ndarray]] = None) -> "EmbeddingRouter":
+        """예시 문장을 한 번의 요청으로 embedding 하고 label별 centroid를 계산합니다."""
+        if vectors is None:
+            texts = [text for label_texts in self.examples.values() for text in label_texts]
+            embedded = self._normalize(np.array(self.embeddings.embed_documents(texts), dtype=np.float32))
+            vectors, offset = {}, 0
+            for label, label_texts in self.examples.items():
+                vectors[label] = embedded[offset:offset + len(label_texts)]
+                offset += len(label_texts)
+
+        self.labels = list(vectors.keys())
+        self.centroids = self._normalize(
+            np.stack([vectors[label].mean(axis=0) for label in self.labels])
+        )
+        return self
+
+    def predict_vector(self, vector: list[float] | np.ndarray) -> tuple[str, float]:
+        """(label, 확신도)를 반환합니다."""
+        if self.centroids is None:
+            raise Exception("router is not fitted")
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        scores = self.centroids @ query * config.ROUTER_SOFTMAX_SCALE
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def predict(self, text: str) -> tuple[str, float]:
+        return self.predict_vector(self.embeddings.embed_query(text))
+
+
+ROUTERS: dict[str, EmbeddingRouter] = {}
+_LOCK = threading.Lock()
+
+
+def get_examples(name: str) -> dict[str, list[str]]:
+    """router별 학습 예시. branch는 전처리에서 만든 data source 요약도 함께 사용합니다."""
+    if name == "intent":
+        return INTENT_EXAMPLES
+    if name == "branch":
+        from .preprocess import SUMMARY
+
+        return {
+            label: texts + ([SUMMARY[label]] if SUMMARY.get(label) else [])
+            for label, texts in BRANCH_EXAMPLES.items()
+        }
+    raise ValueError(f"unknown router '{name}'")
+
+
+def get_or_create_router(name: str) -> EmbeddingRouter:
+    with _LOCK:
+        if not ROUTERS.get(name):
+            ROUTERS[name] = EmbeddingRouter(get_examples(name), get_embeddings()).fit()
+    return ROUTERS[name]
+
+
+def init_routers():
+    """ROUTER_ENABLED이면 intent/branch router의 예시를 미리 embedding 합니다."""
+    if config.ROUTER_ENABLED:
+        for name in ["intent", "branch"]:
+            get_or_create_router(name)
+
+
+def reset_router(name: str):
+    """예시가 바뀌면(branch는 data source 요약) 다음 호출에서 centroid를 다시 계산합니다."""
+    with _LOCK:
+        ROUTERS.pop(name, None)
+
+
+def route(name: str, vector: list[float]) -> Optional[str]:
+    """확신할 수 있을 때만 label을 반환하고, 아니면 None을 반환합니다."""
+    label, confidence = get_or_create_router(name).predict_vector(vector)
+    if confidence >= config.ROUTER_CONFIDENCE_THRESHOLD:
+        return label
+    return None
+
+
+async def aroute(name: str, vector: list[float]) -> Optional[str]:
+    # 첫 호출에서 예시 embedding(fit)이 일어날 수 있으므로 thread에서 실행합니다.
+    return await asyncio.to_thread(route, name, vector)
+
+
+def evaluate_router(
+    name: str,
+    threshold: Optional[float] = None,
+    embeddings: Optional[Embeddings] = None,
+) -> dict:
+    """
+    leave-one-out 방식으로 router의 정확도와 분류 지연을 측정합니다.
+    embedding은 한 번만 요청하고, 매 예시마다 그 예시를 뺀 centroid로 분류합니다.
+    embeddings를 주지 않으면 서비스와 같은 embedding(get_embeddings)을 사용합니다.
+    """
+    if threshold is None:
+        threshold = config.ROUTER_CONFIDENCE_THRESHOLD
+    if embeddings is None:
+        embeddings = get_embeddings()
+
+    examples = get_examples(name)
+
+    started = time.perf_counter()
+    texts = [text for label_texts in examples.values() for text in label_texts]
+    embedded = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - started
+
+    vectors, offset = {}, 0
+    for label, label_texts in examples.items():
+        vectors[label] = EmbeddingRouter._normalize(embedded[offset:offset + len(label_texts)])
+        offset += len(label_texts)
+
+    total = correct = confident = confident_correct = 0
+    latencies = []
+    for label, label_vectors in vectors.items():
+        for i in range(len(label_vectors)):
+            held_out = dict(vectors)
+            held_out[label] = np.delete(label_vectors, i, axis=0)
+            if not len(held_out[label]):
+                continue
+            router = EmbeddingRouter(examples, embeddings).fit(held_out)
+
+            started = time.perf_counter()
+            predicted, confidence = router.predict_vector(label_vectors[i])
+            latencies.append(time.perf_counter() - started)
+
+            total += 1
+            correct += predicted == label
+            if confidence >= threshold:
+                confident += 1
+                confident_correct += predicted == label
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "router": name,
+        "threshold": threshold,
+        "examples": total,
+        "accuracy": correct / total if total else 0.0,
+        "coverage": confident / total if total else 0.0,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "classify_ms_p50": float(np.percentile(latencies_ms, 50)) if total else 0.0,
+        "classify_ms_p95": float(np.percentile(latencies_ms, 95)) if total else 0.0,
+        "embed_ms_per_text": embed_seconds * 1000 / len(texts) if texts else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    from pprint import pprint
+
+    for router_name in ["intent", "branch"]:
+        pprint(evaluate_router(router_name))
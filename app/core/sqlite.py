@@ -0,0 +1,26 @@
+"""여러 thread와 Reflex worker process가 함께 사용하는 sqlite 파일의 connection"""
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+_LOCAL = threading.local()
+
+
+def get_connection(path: str, schema: Iterable[str] = ()) -> sqlite3.Connection:
+    """
+    thread별로 WAL 모드 sqlite connection을 재사용합니다.
+    path를 이 thread에서 처음 열 때 schema의 문장(CREATE TABLE IF NOT EXISTS ...)을 실행합니다.
+    """
+    connections: dict[str, sqlite3.Connection] = getattr(_LOCAL, "connections", None) or {}
+    _LOCAL.connections = connections
+
+    if path not in connections:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in schema:
+            connection.execute(statement)
+        connections[path] = connection
+    return connections[path]
@@ -0,0 +1,187 @@
+"""LLM token streaming helpers"""
+import asyncio
+import contextvars
+import queue
+import threading
+from typing import Any, AsyncIterator, Iterator, TypeVar
+
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from langchain.chains import LLMChain
+
+T = TypeVar("T")
+
+# queue 종료 표시
+_DONE = object()
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """llm이 생성하는 token을 도착하는 즉시 queue로 전달합니다."""
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.queue.put(token)
+
+
+def stream_chain(chain: LLMChain, context: dict) -> Iterator[str]:
+    """
+    chain을 별도 thread에서 실행하고, 생성되는 token을 바로 yield 합니다.
+    streaming을 지원하지 않는 llm이면 완성된 결과를 한 번에 yield 합니다.
+    """
+    handler = QueueCallbackHandler()
+    result: dict[str, Any] = {}
+    variables = contextvars.copy_context()
+
+    def run():
+        try:
+            result["output"] = variables.run(chain.run, context, callbacks=[handler])
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            handler.queue.put(_DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    streamed = False
+    while True:
+        token = handler.queue.get()
+        if token is _DONE:
+            break
+        streamed = True
+        yield token
+    thread.join()
+
+    if "error" in result:
+        raise result["error"]
+    if not streamed and result.get("output"):
+        yield result["output"]
+
+
+class AsyncQueueCallbackHandler(AsyncCallbackHandler):
+    """llm이 생성하는 token을 도착하는 즉시 asyncio queue로 전달합니다."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.queue.put_nowait(token)
+
+
+async def astream_chain(chain: LLMChain, context: dict) -> AsyncIterator[str]:
+    """stream_chain의 async 버전. event loop를 막지 않고 chain.arun의 token을 yield 합니다."""
+    handler = AsyncQueueCallbackHandler()
+
+    async def run() -> str:
+        try:
+            return await chain.arun(context, callbacks=[handler])
+        finally:
+            handler.queue.put_nowait(_DONE)
+
+    task = asyncio.ensure_future(run())
+    try:
+        streamed = False
+        while True:
+            token = await handler.queue.get()
+            if token is _DONE:
+                break
+            streamed = True
+            yield token
+        output = await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+    if not streamed and output:
+        yield output
+
+
+def iterate_async(iterator: AsyncIterator[Any]) -> Iterator[Any]:
+    """async iterator를 별도 thread의 event loop에서 실행하며 동기적으로 yield 합니다."""
+    items: queue.Queue = queue.Queue()
+    result: dict[str, Any] = {}
+    variables = contextvars.copy_context()
+
+    async def consume():
+        async for item in iterator:
+            items.put(item)
+
+    def run():
+        try:
+            variables.run(asyncio.run, consume())
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            items.put(_DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        item = items.get()
+        if item is _DONE:
+            break
+        yield item
+    thread.join()
+
+    if "error" in result:
+        raise result["error"]
+
+
+def merge_in_order(iterators: list[Iterator[T]]) -> Iterator[tuple[int, T]]:
+    """
+    iterator들을 각자의 thread에서 동시에 소비하면서, (index, item)을 iterator 순서대로 yield 합니다.
+    첫 iterator는 도착하는 즉시 yield 하고, 뒤의 iterator는 앞 iterator가 끝날 때까지 모아 두었다가 이어서 yield 합니다.
+    """
+    queues: list[queue.Queue] = [queue.Queue() for _ in iterators]
+    errors: dict[int, BaseException] = {}
+
+    def consume(index: int, iterator: Iterator[T]):
+        try:
+            for item in iterator:
+                queues[index].put(item)
+        except BaseException as e:
+            errors[index] = e
+        finally:
+            queues[index].put(_DONE)
+
+    for index, iterator in enumerate(iterators):
+        # 같은 context를 여러 thread에서 동시에 실행할 수 없어 thread마다 복사합니다.
+        variables = contextvars.copy_context()
+        threading.Thread(target=variables.run, args=(consume, index, iterator), daemon=True).start()
+
+    for index, items in enumerate(queues):
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            yield index, item
+        if index in errors:
+            raise errors[index]
+
+
+async def amerge_in_order(iterators: list[AsyncIterator[T]]) -> AsyncIterator[tuple[int, T]]:
+    """merge_in_order의 async 버전. iterator들을 asyncio task로 동시에 소비합니다."""
+    queues: list[asyncio.Queue] = [asyncio.Queue() for _ in iterators]
+
+    async def consume(index: int, iterator: AsyncIterator[T]):
+        try:
+            async for item in iterator:
+                queues[index].put_nowait(item)
+        finally:
+            queues[index].put_nowait(_DONE)
+
+    tasks = [asyncio.ensure_future(consume(index, iterator)) for index, iterator in enumerate(iterators)]
+    try:
+        for index, items in enumerate(queues):
+            while True:
+                item = await items.get()
+                if item is _DONE:
+                    break
+                yield index, item
+            # 실패한 iterator의 예외를 전달합니다.
+            await tasks[index]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,236 @@
+"""
+작은 corpus를 위한 numpy brute-force vector 검색.
+
+chunk가 수천 개 이하이면 HNSW와 sqlite metadata 조회보다 연속된 float32 행렬 하나와의 행렬 곱이 빠르고,
+근사 검색이 아니므로 recall도 항상 1입니다.
+정규화한 embedding은 memory-mapped `.npy`로, 문서와 metadata는 key별 column으로 `.json`에 저장하고,
+metadata filter는 core.filters의 조건을 column의 값 종류마다 계산해 category code로 한 번에 적용합니다.
+
+quantization을 "float16"이나 "int8"로 주면 1차 검색은 memory에 둔 양자화 행렬로 하고,
+상위 후보만 memory-mapped float32 행렬에서 읽어 정확한 거리로 다시 정렬합니다.
+"""
+import json
+import os
+from typing import Any, Iterable, Optional
+
+import numpy as np
+from langchain.schema.document import Document
+
+from core.filters import match_operators, reduce_filter
+
+QUANTIZATIONS = ("none", "float16", "int8")
+# 양자화 행렬을 float32로 바꿔 곱할 때 한 번에 처리하는 행 수
+_BLOCK_SIZE = 4096
+
+
+class Column:
+    """metadata 값 하나의 column. 값은 categories의 index(codes)로 저장합니다."""
+
+    def __init__(self, values: Iterable[Any]):
+        self.categories: list[Any] = []
+        index: dict[Any, int] = {}
+        codes = []
+        for value in values:
+            if value not in index:
+                index[value] = len(self.categories)
+                self.categories.append(value)
+            codes.append(index[value])
+        self._index = index
+        self.codes = np.asarray(codes, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def code(self, value: Any) -> int:
+        # 없는 값은 어떤 code와도 같지 않은 -1로 비교합니다.
+        return self._index.get(value, -1)
+
+    def __getitem__(self, i: int) -> Any:
+        return self.categories[self.codes[i]]
+
+
+class NumpyVectorStore:
+    """정규화한 embedding 행렬과 columnar metadata로 cosine 거리 top-k를 정확하게 계산합니다."""
+
+    def __init__(
+        self,
+        contents: list[str],
+        columns: dict[str, Column],
+        vectors: np.ndarray,
+        quantization: str = "none",
+        rerank_multiplier: int = 4,
+    ):
+        self.contents = contents
+        self.columns = columns
+        self.vectors = vectors
+        self.quantization = quantization
+        self.rerank_multiplier = rerank_multiplier
+        self.quantized, self.scales = quantize(vectors, quantization)
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    @property
+    def nbytes(self) -> int:
+        """검색할 때 memory에 있어야 하는 행렬의 크기. 양자화하면 float32 행렬은 re-ranking할 후보만 읽습니다."""
+        if self.quantized is None:
+            return self.vectors.nbytes
+        return self.quantized.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def from_documents(cls, documents: list[Document], embeddings: list[list[float]], **kwargs) -> "NumpyVectorStore":
+        keys = list(dict.fromkeys(key for doc in documents for key in doc.metadata))
+        columns = {key: Column(doc.metadata.get(key) for doc in documents) for key in keys}
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+        return cls([doc.page_content for doc in documents], columns, normalize_rows(vectors), **kwargs)
+
+    def get_document(self, i: int) -> Document:
+        metadata = {key: column[i] for key, column in self.columns.items() if column[i] is not None}
+        return Document(page_content=self.contents[i], metadata=metadata)
+
+    def mask(self, where: Optional[dict[str, Any]]) -> np.ndarray:
+        """where filter를 적용한 boolean mask. 조건은 column의 값 종류마다 한 번씩만 계산합니다."""
+        def match_field(key: str, operators: dict[str, Any]) -> np.ndarray:
+            column = self.columns[key] if key in self.columns else Column([None] * len(self))
+            matches = np.asarray([match_operators(value, operators) for value in column.categories], dtype=bool)
+            return matches[column.codes] if len(column.categories) else np.zeros(len(self), dtype=bool)
+
+        return reduce_filter(
+            where,
+            match_field,
+            lambda masks: np.logical_and.reduce([np.ones(len(self), dtype=bool), *masks]),
+            lambda masks: np.logical_or.reduce([np.zeros(len(self), dtype=bool), *masks]),
+        )
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        if self.quantized is None:
+            return queries @ self.vectors.T
+        # numpy는 int8/float16 행렬 곱에 BLAS를 쓰지 않으므로 block 단위로 float32로 바꿔 곱합니다.
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), _BLOCK_SIZE):
+            block = self.quantized[start:start + _BLOCK_SIZE].astype(np.float32)
+            scores[:, start:start + _BLOCK_SIZE] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search_indices(
+        self,
+        embeddings: list[list[float]],
+        top_k: int,
+        filters: Optional[dict[str, Any]] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """query별 상위 top_k개 문서의 index와 cosine 유사도를 유사도 순서로 반환합니다."""
+        mask = self.mask(filters)
+        k = min(top_k, int(mask.sum()))
+        if k <= 0 or not len(embeddings):
+            empty = np.empty((len(embeddings), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        scores = self._scores(queries)
+        if not mask.all():
+            scores[:, ~mask] = -np.inf
+        if self.quantized is None:
+            return top_indices(scores, k)
+
+        # 양자화한 점수로 후보를 넉넉히 고르고, 후보만 float32로 다시 계산합니다.
+        candidates, _ = top_indices(scores, min(k * self.rerank_multiplier, int(mask.sum())))
+        rows = np.asarray(self.vectors[candidates.ravel()], dtype=np.float32).reshape(*candidates.shape, -1)
+        exact = np.einsum("qd,qcd->qc", queries, rows)
+        order, exact_scores = top_indices(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), exact_scores
+
+    def search(
+        self,
+        embeddings: list[list[float]],
+        top_k: int,
+        filters: Optional[dict[str, Any]] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """query별로 (문서, cosine 거리)를 거리 순서로 top_k개 반환합니다."""
+        if not len(embeddings):
+            return []
+        top, top_scores = self.search_indices(embeddings, top_k, filters)
+        return [
+            [(self.get_document(i), float(1 - score)) for i, score in zip(indices, row_scores)]
+            for indices, row_scores in zip(top.tolist(), top_scores.tolist())
+        ]
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")
+
+    @staticmethod
+    def remove(path: str):
+        for suffix in [".npy", ".json"]:
+            if os.path.exists(f"{path}{suffix}"):
+                os.remove(f"{path}{suffix}")
+
+    def save(self, path: str):
+        """path.npy에 embedding 행렬을, path.json에 문서와 metadata column을 저장합니다."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.npy.tmp", "wb") as file:
+            np.save(file, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        data = {
+            "contents": self.contents,
+            "columns": {
+                key: {"categories": column.categories, "codes": column.codes.tolist()}
+                for key, column in self.columns.items()
+            },
+        }
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "NumpyVectorStore":
+        """embedding 행렬은 memory-map으로 열어 필요한 page만 읽습니다."""
+        with open(f"{path}.json", "r", encoding="utf-8") as file:
+            data = json.load(file)
+        columns = {
+            key: Column(column["categories"][code] for code in column["codes"])
+            for key, column in data["columns"].items()
+        }
+        vectors = np.load(f"{path}.npy", mmap_mode="r")
+        return cls(data["contents"], columns, vectors, **kwargs)
+
+
+def top_indices(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """행별로 점수가 높은 k개의 index와 점수를 내림차순으로 반환합니다. 전체를 정렬하지 않고 k개만 고릅니다."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    정규화한 행렬을 양자화합니다. "none"이면 (None, None)을 반환합니다.
+    int8은 행마다 최댓값을 127에 맞추는 scale을 함께 반환합니다.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    if quantization == "none":
+        return None, None
+
+    dtype = np.float16 if quantization == "float16" else np.int8
+    quantized = np.empty(vectors.shape, dtype=dtype)
+    scales = np.ones(len(vectors), dtype=np.float32) if quantization == "int8" else None
+    # memory-mapped 행렬 전체를 한 번에 memory로 읽지 않도록 block 단위로 변환합니다.
+    for start in range(0, len(vectors), _BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + _BLOCK_SIZE], dtype=np.float32)
+        if scales is None:
+            quantized[start:start + _BLOCK_SIZE] = block
+            continue
+        block_scales = np.abs(block).max(axis=1) / 127
+        block_scales[block_scales == 0] = 1.0
+        quantized[start:start + _BLOCK_SIZE] = np.round(block / block_scales[:, None])
+        scales[start:start + _BLOCK_SIZE] = block_scales
+    return quantized, scales
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
@@ -1,4 +1,6 @@
 import os
+import warnings
+
 import reflex as rx
 from dotenv import load_dotenv
 
@@ -6,24 +8,146 @@ from dotenv import load_dotenv
 PROJECT_DIR = os.path.abspath(os.path.dirname(__file__))
 ENV_PATH = os.path.join(PROJECT_DIR, ".env")
 
-if not os.path.exists(ENV_PATH):
-    raise FileNotFoundError(
+if os.path.exists(ENV_PATH):
+    load_dotenv(ENV_PATH)
+else:
+    # import만으로 실패하지 않도록 경고만 남기고, OPENAI_API_KEY는 OpenAI client를 만들 때 확인합니다.
+    warnings.warn(
         f"{ENV_PATH}를 찾을 수 없습니다. "
-        f"OPENAI_API_KEY가 정의된 env 파일이 먼저 정의되어야 정상 작동됩니다."
+        f"OPENAI_API_KEY가 정의된 env 파일이나 환경 변수가 있어야 정상 작동됩니다."
     )
 
-load_dotenv(ENV_PATH)
-
 
 class AppConfig(rx.Config):
     # default
     DEFAULT_OPENAI_MAX_TOKENS: int = 2000
     DEFAULT_OPENAI_TEMPERATURE: float = 0.9
     DEFAULT_OPENAI_MODEL: str = "gpt-3.5-turbo-16k"
+    DEFAULT_OPENAI_CONTEXT_WINDOW: int = 16384
+
+    # context window가 부족할 때 먼저 채울 prompt section 순서
+    PROMPT_SECTION_PRIORITY: list[str] = ["related_documents", "chat_history"]
+
+    # True면 생성되는 token을 도착하는 즉시 전달합니다.
+    LLM_STREAMING: bool = True
+
+    # 한 intent에 답변 chain이 여러 개(bug_request, bug_sorry)면 동시에 생성하고 순서대로 streaming 합니다.
+    CONCURRENT_GENERATION: bool = True
+
+    # intent 판단과 동시에 미리 실행할 pipeline stage. 기본값은 비어 있어,
+    # branch와 문서 검색은 intent가 정해진 뒤 그 intent의 chain이 필요로 할 때만 실행됩니다.
+    # ["branch"]로 지정하면 첫 token이 빨라지는 대신, 문서가 필요 없는 intent(hello, enhancement)에서도
+    # branch 판단(router가 확신하지 못하면 LLM 1회)이 실행되고 결과는 버려집니다.
+    PIPELINE_PREFETCH_STAGES: list[str] = []
+    # True면 문서 검색(embedding + chroma)을 intent 판단과 겹쳐서 미리 실행합니다(branch 판단도 함께 실행됩니다).
+    # intent가 문서를 쓰지 않으면 끝나지 않은 검색은 취소되고 끝난 결과는 버려집니다.
+    SPECULATIVE_RETRIEVAL: bool = False
+
+    # embedding router: 확신도가 threshold 이상이면 intent/branch LLM 호출을 생략합니다.
+    ROUTER_ENABLED: bool = True
+    ROUTER_CONFIDENCE_THRESHOLD: float = 0.8
+    # label별 cosine 유사도는 좁은 범위(예: 0.80 ~ 0.86)에 모여 그대로 softmax 하면 확신도가 거의 균등해집니다.
+    # 유사도에 곱하는 값으로, 클수록 확신도가 벌어져 router가 더 많이 답합니다.
+    # 바꾸면 python -m core.router로 coverage/confident_accuracy를 확인한 뒤 threshold와 함께 조정합니다.
+    ROUTER_SOFTMAX_SCALE: float = 30.0
+    # router가 이 시간(초) 안에 답하지 못하면(대부분 query embedding 대기) LLM chain을 함께 시작하고,
+    # router가 확신하면 LLM 요청을 취소합니다. router가 확신하지 못할 때 embedding 대기가 LLM 호출 앞에 더해지는 시간의 상한입니다.
+    ROUTER_FALLBACK_DELAY_SECONDS: float = 0.3
+
+    # 비슷한 질문(embedding cosine 유사도)의 답변을 재사용하는 cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.97
+    ANSWER_CACHE_TTL_SECONDS: int = 60 * 60
+    ANSWER_CACHE_MAX_SIZE: int = 1000
+
+    # 같은 (질문, filter, top_k)의 검색 결과를 재사용하는 cache. 문서가 다시 적재되면 비워집니다.
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_SIZE: int = 1000
+
+    # conversation history: "sqlite" 또는 "file"(json 파일, rolling summary는 *.summary 파일)
+    HISTORY_BACKEND: str = "sqlite"
+    HISTORY_DB_PATH: str = f"{PROJECT_DIR}/history/history.db"
+    # token 예산을 사용하지 않을 때 prompt에 넣을 최근 message 수 (0이면 전체)
+    HISTORY_MAX_MESSAGES: int = 0
+
+    # create_answers에서 동시에 처리할 message 수
+    BATCH_CONCURRENCY: int = 8
+
+    # 모든 chat model / embedding 요청이 함께 사용하는 rate limit
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REQUESTS_PER_MINUTE: int = 3500
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = 180000
+    RATE_LIMIT_MAX_RETRIES: int = 6
+    RATE_LIMIT_BACKOFF_BASE_SECONDS: float = 1.0
+    RATE_LIMIT_BACKOFF_MAX_SECONDS: float = 60.0
+    # chain별 priority (낮을수록 먼저). 지정하지 않은 chain은 호출한 곳의 priority를 따릅니다.
+    RATE_LIMIT_PRIORITY: dict[str, int] = {
+        "summarize": 10,
+        "summarize_history": 10,
+    }
+
+    # streaming하지 않는 chain(intent, branch, summarize 등)의 응답 cache. 여러 worker process가 함께 사용합니다.
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = f"{PROJECT_DIR}/cache/llm_cache.db"
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_SIZE: int = 10000
+
+    # answer pipeline 단계별 지연 측정 (core.metrics)
+    METRICS_ENABLED: bool = True
+    # 분위수 계산에 사용할 단계별 최근 측정값 수
+    METRICS_WINDOW_SIZE: int = 1000
+    # 지정하면 span마다 trace id와 함께 JSON lines로 기록합니다.
+    METRICS_JSONL_PATH: str = ""
+    # JSON lines 기록은 memory에 모아 두었다가 background thread가 이 간격으로 파일에 씁니다.
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 1.0
+
+    # 질문/문서 embedding cache. 최근 결과는 memory LRU, 전체는 sqlite 파일에 저장합니다.
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = f"{PROJECT_DIR}/cache/embeddings.db"
+    EMBEDDING_CACHE_MAX_SIZE: int = 10000
+
+    # 문자 n-gram BM25와 vector 검색을 reciprocal rank fusion으로 합칩니다.
+    HYBRID_SEARCH_ENABLED: bool = True
+    LEXICAL_NGRAM_SIZES: list[int] = [2, 3]
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    # 각 검색에서 top_k의 몇 배까지 후보로 가져와 합칠지
+    HYBRID_CANDIDATE_MULTIPLIER: int = 2
+    RRF_K: int = 60
+    # 공백/기호를 뺀 길이가 이 이하인 keyword 질문은, 상위 문서가 모두 질문을 그대로 포함하면 embedding 없이 답합니다.
+    LEXICAL_FAST_PATH_ENABLED: bool = True
+    LEXICAL_FAST_PATH_MAX_QUERY_LENGTH: int = 12
 
     # chroma
     CHROMA_PERSIST_DIRECTORY: str = f"{PROJECT_DIR}/chroma"
     CHROMA_COLLECTION_NAME: str = "project"
+    # HNSW index 설정(기본값은 chroma와 같습니다). collection을 만들 때 적용되므로 바꾼 뒤에는 다시 적재해야 합니다.
+    # python -m benchmarks.hnsw로 recall/지연/index 크기를 비교해 정합니다.
+    CHROMA_HNSW_M: int = 16
+    CHROMA_HNSW_CONSTRUCTION_EF: int = 100
+    CHROMA_HNSW_SEARCH_EF: int = 10
+    # data source마다 collection을 따로 만들고 Title element는 `_title` collection에 저장합니다.
+    # 검색은 data_source/category filter 대신 해당 collection만 질의합니다.
+    CHROMA_PARTITION_BY_SOURCE: bool = True
+    # 검색 backend. "auto"(기본값)이면 chunk 수가 VECTOR_STORE_MAX_SIZE 이하일 때 numpy 행렬 곱으로 정확한 top-k를 구하고,
+    # 그보다 많아지면 위의 data source별 collection과 HNSW 설정으로 chroma에서 검색합니다.
+    # data_source/category filter는 numpy에서도 같은 조건의 mask로 적용합니다.
+    # "numpy"와 "chroma"는 chunk 수와 관계없이 해당 backend를 사용합니다(python -m benchmarks --vector-store로 비교).
+    VECTOR_STORE_BACKEND: str = "auto"
+    VECTOR_STORE_MAX_SIZE: int = 10000
+    # brute-force 1차 검색에 사용할 형식: "none"(float32), "float16", "int8".
+    # 양자화하면 memory에는 양자화한 행렬만 두고, 상위 top_k * VECTOR_STORE_RERANK_MULTIPLIER개를 float32로 다시 정렬합니다.
+    # numpy는 float16을 float32로 바꾸는 비용이 커서, 검색 지연은 int8이 float16보다 작습니다.
+    VECTOR_STORE_QUANTIZATION: str = "none"
+    VECTOR_STORE_RERANK_MULTIPLIER: int = 4
+    # vector/lexical 검색에서 top_k * MMR_FETCH_MULTIPLIER개를 가져와 이웃 chunk를 합친 뒤 maximal marginal relevance로 top_k개를 고릅니다.
+    # MMR_LAMBDA가 1에 가까울수록 유사도를, 0에 가까울수록 서로 다른 passage를 우선합니다.
+    MMR_ENABLED: bool = True
+    MMR_FETCH_MULTIPLIER: int = 3
+    MMR_LAMBDA: float = 0.7
+    # 같은 element에서 나뉜 이웃 chunk가 함께 검색되면 겹치는 부분을 지워 하나의 passage로 합칩니다.
+    # element_index/chunk_index metadata가 필요하므로 기존 data는 다시 적재해야 적용됩니다.
+    MERGE_ADJACENT_CHUNKS: bool = True
 
     # llm temparature
     LLM_TEMPERATURE: dict[str, float] = {
@@ -35,6 +159,17 @@ class AppConfig(rx.Config):
         "default": 0.9,
         "summarize": 0.1,
         "branch": 0.5,
+        "summarize_history": 0.1,
+    }
+
+    # chain별 chat_history token 예산. 예산 밖의 이전 대화는 rolling summary로 접어 넣습니다.
+    HISTORY_TOKEN_BUDGET_ENABLED: bool = True
+    DEFAULT_HISTORY_TOKEN_BUDGET: int = 2000
+    HISTORY_TOKEN_BUDGET: dict[str, int] = {
+        "intent": 500,
+        "bug_request": 2000,
+        "bug_sorry": 2000,
+        "default": 4000,
     }
 
 
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from core import chroma, metrics
+from rxconfig import config
+
+
+def run(coro, timeout: float = 2):
+    return asyncio.run(asyncio.wait_for(coro, timeout=timeout))
+
+
+class TestSpeculativeRetrieval:
+
+    @pytest.fixture
+    def speculative(self, monkeypatch):
+        monkeypatch.setattr(config, "PIPELINE_PREFETCH_STAGES", ["branch"])
+        monkeypatch.setattr(config, "SPECULATIVE_RETRIEVAL", True)
+
+    @pytest.fixture
+    def retrieval(self, fake_llm, monkeypatch):
+        """끝나지 않는 문서 검색. 시작/취소된 branch를 기록합니다."""
+        state = {"started": [], "cancelled": [], "delay": 10.0}
+
+        async def aget_documents(user_message: str, branch: str, embedding=None) -> list[str]:
+            state["started"].append(branch)
+            try:
+                await asyncio.sleep(state["delay"])
+            except asyncio.CancelledError:
+                state["cancelled"].append(branch)
+                raise
+            return [f"{branch} 문서"]
+
+        monkeypatch.setattr(fake_llm, "aget_documents", aget_documents)
+        return state
+
+    @pytest.mark.usefixtures("speculative")
+    def test_cancelled_when_documents_not_needed(self, fake_llm, retrieval):
+        fake_llm.CHAIN_DICT["intent"].llm.response = "enhancement"
+
+        context = run(fake_llm.aprepare_context("기능을 추가해주세요", "test"))
+        assert context["intent"] == "enhancement"
+        assert "related_documents" not in context
+        # branch가 정해지자마자 시작된 검색은 intent가 문서를 쓰지 않으면 기다리지 않고 취소됩니다.
+        assert retrieval["started"] == ["sync"]
+        assert retrieval["cancelled"] == ["sync"]
+
+    @pytest.mark.usefixtures("speculative")
+    def test_result_ignored_when_documents_not_needed(self, fake_llm, retrieval):
+        retrieval["delay"] = 0
+        fake_llm.CHAIN_DICT["intent"].llm.response = "hello"
+        fake_llm.CHAIN_DICT["intent"].llm.first_token_latency = 0.05
+
+        context = run(fake_llm.aprepare_context("안녕하세요", "test"))
+        assert retrieval["started"] == ["sync"] and not retrieval["cancelled"]
+        assert "related_documents" not in context
+
+    @pytest.mark.usefixtures("speculative")
+    def test_reused_when_documents_needed(self, fake_llm, retrieval):
+        retrieval["delay"] = 0.05
+
+        context = run(fake_llm.aprepare_context("카카오싱크가 뭐야", "test"))
+        assert context["intent"] == "question"
+        assert context["related_documents"] == ["sync 문서"]
+        # 미리 시작한 검색 결과를 그대로 사용합니다.
+        assert retrieval["started"] == ["sync"]
+
+    def test_lazy_by_default(self, fake_llm, retrieval):
+        fake_llm.CHAIN_DICT["intent"].llm.response = "enhancement"
+
+        context = run(fake_llm.aprepare_context("기능을 추가해주세요", "test"))
+        assert context["branch"] is None
+        assert not retrieval["started"]
+        assert fake_llm.CHAIN_DICT["branch"].llm.calls == 0
+
+    def test_lazy_retrieval_when_documents_needed(self, fake_llm, retrieval):
+        retrieval["delay"] = 0
+
+        context = run(fake_llm.aprepare_context("카카오싱크가 뭐야", "test"))
+        assert context["related_documents"] == ["sync 문서"]
+        assert retrieval["started"] == ["sync"]
+
+
+class TestAsyncAnswer:
+
+    def test_concurrent_answers(self, fake_llm):
+        barrier = asyncio.Barrier(2)
+        default = fake_llm.CHAIN_DICT["default"].llm
+
+        class GatedChatModel(type(default)):
+            async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+                # 두 답변이 동시에 생성 중이어야 통과합니다.
+                await barrier.wait()
+                return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        fake_llm.CHAIN_DICT["default"].llm = GatedChatModel(response=default.response)
+
+        async def answer_both():
+            return await asyncio.gather(
+                fake_llm.acreate_answer("카카오싱크가 뭐야", "first"),
+                fake_llm.acreate_answer("카카오 채널이 뭐야", "second"),
+            )
+
+        first, second = run(answer_both())
+        assert first["answer"] == second["answer"] == default.response
+        assert [first["conversation_id"], second["conversation_id"]] == ["first", "second"]
+
+    def test_same_as_sync(self, fake_llm):
+        expected = fake_llm.create_answer("카카오싱크가 뭐야", "sync")
+        result = run(fake_llm.acreate_answer("카카오싱크가 뭐야", "async"))
+        assert {**result, "conversation_id": "sync"} == expected
+
+        async def collect() -> str:
+            return "".join([token async for token in fake_llm.agenerate_answer("카카오싱크가 뭐야", "agenerate")])
+
+        assert run(collect()) == "".join(fake_llm.generate_answer("카카오싱크가 뭐야", "generate")) == expected["answer"]
+
+    def test_bug_answers_joined_in_order(self, fake_llm):
+        fake_llm.CHAIN_DICT["intent"].llm.response = "bug"
+        fake_llm.CHAIN_DICT["bug_request"].llm.response = "재현 방법을 알려주세요."
+        fake_llm.CHAIN_DICT["bug_sorry"].llm.response = "불편을 드려 죄송합니다."
+
+        result = run(fake_llm.acreate_answer("버그 같아요", "bug"))
+        assert result["answer"] == "재현 방법을 알려주세요.\n\n불편을 드려 죄송합니다."
+        assert fake_llm.create_answer("버그 같아요", "bug-sync")["answer"] == result["answer"]
+
+    def test_batch_embedding_failure(self, fake_llm, monkeypatch):
+        class FailingEmbeddings(FakeEmbeddings):
+            async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+                raise ConnectionError("embedding failed")
+
+        monkeypatch.setattr(chroma, "EMBEDDINGS", FailingEmbeddings())
+
+        async def collect() -> list[dict]:
+            return [result async for result in fake_llm.acreate_answers([("first", "카카오싱크가 뭐야"), ("second", "카카오 채널이 뭐야")])]
+
+        results = run(collect())
+        # 한 번에 embedding하지 못해도 batch 전체가 실패하지 않고 message마다 답변합니다.
+        assert sorted(result["conversation_id"] for result in results) == ["first", "second"]
+        assert all("error" not in result for result in results)
+
+    def test_stream_trace_not_leaked(self, fake_llm):
+        async def collect() -> list:
+            # 호출한 쪽 context에는 yield 사이에도 답변의 trace가 설정되지 않습니다.
+            return [metrics.get_trace_id() async for _ in fake_llm.agenerate_answer("카카오싱크가 뭐야", "trace")]
+
+        trace_ids = run(collect())
+        assert trace_ids and set(trace_ids) == {None}
+        assert [metrics.get_trace_id() for _ in fake_llm.generate_answer("카카오싱크가 뭐야", "trace")] == [None] * len(trace_ids)
+
+    def test_stream_result_has_prompt_tokens(self, fake_llm):
+        expected = run(fake_llm.acreate_answer("카카오싱크가 뭐야", "stream"))
+        # branch/intent 판단에 쓴 prompt도 PromptBuilder로 조립되어 함께 집계됩니다.
+        assert set(expected["prompt_tokens"]) == {"branch", "intent", "default"}
+        assert all(tokens > 0 for tokens in expected["prompt_tokens"].values())
+
+        result = {}
+
+        async def collect() -> str:
+            return "".join([token async for token in fake_llm.agenerate_answer("카카오싱크가 뭐야", "agenerate", result=result)])
+
+        assert run(collect()) == expected["answer"]
+        assert {**result, "conversation_id": "stream"} == expected
+
+        sync_result = {}
+        assert "".join(fake_llm.generate_answer("카카오싱크가 뭐야", "generate", result=sync_result)) == expected["answer"]
+        assert {**sync_result, "conversation_id": "stream"} == expected
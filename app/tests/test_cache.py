@@ -0,0 +1,80 @@
+import time
+
+from langchain.schema.document import Document
+
+from core.cache import RetrievalCache, SemanticAnswerCache, iter_cached_answer
+
+
+class TestSemanticAnswerCache:
+
+    def test_similar_query_hits(self):
+        cache = SemanticAnswerCache(threshold=0.95, ttl=60, max_size=10)
+        cache.put([1.0, 0.0, 0.0], ("sync", "question", 0), "카카오싱크는 ...")
+
+        assert cache.get([0.99, 0.05, 0.0], ("sync", "question", 0)) == "카카오싱크는 ..."
+        assert cache.get([0.0, 1.0, 0.0], ("sync", "question", 0)) is None
+        # 다른 branch / corpus version 의 답변은 재사용하지 않습니다.
+        assert cache.get([1.0, 0.0, 0.0], ("social", "question", 0)) is None
+        assert cache.get([1.0, 0.0, 0.0], ("sync", "question", 1)) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 3
+
+    def test_lru_eviction(self):
+        cache = SemanticAnswerCache(threshold=0.99, ttl=60, max_size=2)
+        cache.put([1.0, 0.0], "key", "a")
+        cache.put([0.0, 1.0], "key", "b")
+        assert cache.get([1.0, 0.0], "key") == "a"
+        cache.put([-1.0, 0.0], "key", "c")
+
+        assert cache.get([0.0, 1.0], "key") is None
+        assert cache.get([1.0, 0.0], "key") == "a"
+
+    def test_ttl(self):
+        cache = SemanticAnswerCache(threshold=0.99, ttl=0.01, max_size=10)
+        cache.put([1.0, 0.0], "key", "a")
+        time.sleep(0.02)
+        assert cache.get([1.0, 0.0], "key") is None
+        assert cache.stats()["size"] == 0
+
+    def test_iter_cached_answer(self):
+        answer = "안녕하세요. 무엇을\n도와드릴까요?"
+        assert "".join(iter_cached_answer(answer)) == answer
+
+
+class TestRetrievalCache:
+
+    FILTERS = {"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]}
+    DOCS = [Document(page_content="카카오싱크는 간편가입 기능입니다.", metadata={"data_source": "sync"})]
+
+    def test_normalized_key_hits(self):
+        cache = RetrievalCache(max_size=10)
+        cache.put("카카오싱크가 뭐야", 5, self.FILTERS, 0, self.DOCS)
+
+        reordered = {"$and": list(reversed(self.FILTERS["$and"]))}
+        assert cache.get("  카카오싱크가   뭐야 ", 5, reordered, 0) == self.DOCS
+        assert cache.get("카카오싱크가 뭐야", 3, self.FILTERS, 0) is None
+        assert cache.get("카카오싱크가 뭐야", 5, {"data_source": "social"}, 0) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+        assert cache.stats()["memory_bytes"] > 0
+
+    def test_version_invalidates(self):
+        cache = RetrievalCache(max_size=10)
+        cache.put("카카오싱크", 5, None, 0, self.DOCS)
+        assert cache.get("카카오싱크", 5, None, 1) is None
+        assert cache.stats()["size"] == 0
+
+        # 검색 중에 다시 적재되었으면 이전 version의 결과는 저장하지 않습니다.
+        cache.put("카카오싱크", 5, None, 0, self.DOCS)
+        assert cache.get("카카오싱크", 5, None, 1) is None
+
+    def test_lru_eviction(self):
+        cache = RetrievalCache(max_size=2)
+        for query in ["a", "b"]:
+            cache.put(query, 5, None, 0, self.DOCS)
+        assert cache.get("a", 5, None, 0) == self.DOCS
+        cache.put("c", 5, None, 0, self.DOCS)
+
+        assert cache.get("b", 5, None, 0) is None
+        assert cache.get("a", 5, None, 0) == self.DOCS
+        assert cache.stats()["size"] == 2
@@ -1,4 +1,4 @@
-from core import get_similar_docs
+from core import get_similar_docs, get_similar_docs_batch
 
 
 class TestChroma:
@@ -52,3 +52,25 @@ class TestChroma:
         )
         for doc in docs:
             print(doc)
+
+    def test_chroma_query_batch(self):
+        queries = [
+            "카카오 싱크가 뭐야",
+            "카카오톡 채널을 추가하려면 어떻게 해?",
+        ]
+        batches = get_similar_docs_batch(
+            queries,
+            filters={"category": {"$ne": "Title"}},
+            only_contents=False,
+            top_k=5
+        )
+        assert len(batches) == len(queries)
+        for query, docs in zip(queries, batches):
+            assert docs == get_similar_docs(
+                query,
+                filters={"category": {"$ne": "Title"}},
+                only_contents=False,
+                top_k=5
+            )
+            for doc in docs:
+                assert doc.metadata["category"] != "Title"
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+
+import chromadb
+import pytest
+from langchain.embeddings.base import Embeddings
+from langchain.schema.document import Document
+from langchain.vectorstores import Chroma
+
+from core import chroma
+from core.lexical import BM25Index
+from rxconfig import config
+
+DOCUMENTS = [
+    Document(page_content="카카오싱크", metadata={"data_source": "sync", "category": "Title"}),
+    Document(page_content="카카오싱크는 간편가입 기능입니다.", metadata={"data_source": "sync", "category": "NarrativeText"}),
+    Document(page_content="- 동의 항목 설정", metadata={"data_source": "sync", "category": "ListItem"}),
+    Document(page_content="카카오톡 채널 추가 방법을 안내합니다.", metadata={"data_source": "channel", "category": "NarrativeText"}),
+]
+
+
+class LengthEmbeddings(Embeddings):
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    monkeypatch.setattr(config, "CHROMA_PARTITION_BY_SOURCE", True)
+    monkeypatch.setattr(config, "VECTOR_STORE_BACKEND", "chroma")
+    monkeypatch.setattr(config, "CHROMA_COLLECTION_NAME", "test_partition")
+    monkeypatch.setattr(chroma, "CLIENT", chromadb.EphemeralClient())
+    monkeypatch.setattr(chroma, "DB", object())
+    monkeypatch.setattr(chroma, "EMBEDDINGS", LengthEmbeddings())
+    monkeypatch.setattr(chroma, "COLLECTIONS", {})
+    monkeypatch.setattr(chroma, "COLLECTION_COUNTS", {})
+    monkeypatch.setattr(chroma, "_PARTITIONED", None)
+
+    for data_source in ["sync", "channel"]:
+        chroma.upload_documents(data_source, [doc for doc in DOCUMENTS if doc.metadata["data_source"] == data_source])
+    chroma.bump_corpus_version()
+    return chroma
+
+
+class TestChromaPartition:
+
+    def test_split_conditions(self):
+        filters = {"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]}
+        assert chroma.split_conditions(filters) == filters["$and"]
+        assert chroma.join_conditions(filters["$and"][1:]) == {"category": {"$ne": "Title"}}
+        assert chroma.join_conditions([]) is None
+
+    def test_collection_metadata(self, partitioned, monkeypatch):
+        monkeypatch.setattr(config, "CHROMA_HNSW_M", 32)
+        metadata = partitioned.get_collection_metadata()
+        assert metadata["hnsw:space"] == "cosine"
+        assert metadata["hnsw:M"] == 32
+        assert metadata["hnsw:search_ef"] == config.CHROMA_HNSW_SEARCH_EF
+
+        collection = partitioned.get_collection(partitioned.get_collection_name("sync"))
+        assert collection.metadata["hnsw:construction_ef"] == config.CHROMA_HNSW_CONSTRUCTION_EF
+
+    def test_resolve_collections(self, partitioned):
+        targets = partitioned.resolve_collections({"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]})
+        assert [(collection.name, where) for collection, where in targets] == [("test_partition_sync", None)]
+
+        targets = partitioned.resolve_collections({"$and": [{"data_source": "sync"}, {"category": "Title"}]})
+        assert [(collection.name, where) for collection, where in targets] == [("test_partition_sync_title", None)]
+
+        targets = partitioned.resolve_collections({"data_source": {"$in": ["sync", "channel"]}})
+        assert len(targets) == 4
+
+        targets = partitioned.resolve_collections({"$and": [{"data_source": "sync"}, {"category": {"$eq": "ListItem"}}]})
+        assert [(collection.name, where) for collection, where in targets] == [
+            ("test_partition_sync", {"category": {"$eq": "ListItem"}})
+        ]
+
+    def test_query_collections(self, partitioned):
+        assert partitioned.is_partitioned()
+        assert partitioned.count_documents() == len(DOCUMENTS)
+
+        docs, = partitioned.query_collections(
+            [partitioned.get_embeddings().embed_query("카카오싱크")],
+            top_k=5,
+            filters={"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]},
+        )
+        assert [doc.page_content for doc in docs] == [DOCUMENTS[2].page_content, DOCUMENTS[1].page_content]
+
+        docs, = partitioned.query_collections([[5.0, 1.0]], top_k=1)
+        assert docs[0].page_content == "카카오싱크"
+
+    def test_auto_vector_store(self, partitioned, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, "CHROMA_PERSIST_DIRECTORY", f"{tmp_path}")
+        monkeypatch.setattr(partitioned, "VECTOR_STORE", None)
+        monkeypatch.setattr(partitioned, "_VECTOR_STORE_LOADED", False)
+        queries = [[5.0, 1.0], [20.0, 1.0]]
+        filters = {"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]}
+        expected = [partitioned.query_collections(queries, top_k=2, filters=filters), partitioned.query_collections(queries, top_k=4)]
+
+        monkeypatch.setattr(config, "VECTOR_STORE_BACKEND", "auto")
+        assert partitioned.get_vector_store() is not None
+        # chunk 수가 VECTOR_STORE_MAX_SIZE 이하이면 numpy로 검색하고, 결과는 chroma와 같습니다.
+        assert [partitioned.query_collections(queries, top_k=2, filters=filters), partitioned.query_collections(queries, top_k=4)] == expected
+
+        monkeypatch.setattr(config, "VECTOR_STORE_MAX_SIZE", len(DOCUMENTS) - 1)
+        partitioned.reset_vector_store()
+        # 더 많아지면 collection 분할과 HNSW 설정을 사용하는 chroma로 돌아갑니다.
+        assert partitioned.get_vector_store() is None
+        assert partitioned.query_collections(queries, top_k=4) == expected[1]
+
+    def test_async_lexical_search_off_event_loop(self, partitioned, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", True)
+        monkeypatch.setattr(config, "RETRIEVAL_CACHE_ENABLED", False)
+        monkeypatch.setattr(config, "CHROMA_PERSIST_DIRECTORY", f"{tmp_path}")
+        monkeypatch.setattr(partitioned, "LEXICAL_INDEX", None)
+        threads = []
+        search_lexical = partitioned.search_lexical
+
+        def record(*args):
+            threads.append(threading.current_thread())
+            return search_lexical(*args)
+
+        monkeypatch.setattr(partitioned, "search_lexical", record)
+        docs = asyncio.run(partitioned.aget_similar_docs("카카오싱크", top_k=2, embedding=[5.0, 1.0]))
+        assert "카카오싱크" in docs
+        # 처음 검색할 때 chroma에서 chunk를 읽어 BM25 index를 만드는 일도 event loop 밖에서 실행됩니다.
+        assert threads and threading.main_thread() not in threads
+
+    def test_lexical_fast_path_merges_neighbours(self, monkeypatch):
+        monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", True)
+        monkeypatch.setattr(config, "RETRIEVAL_CACHE_ENABLED", False)
+        monkeypatch.setattr(chroma, "DB", object())
+        chunks = [
+            Document(page_content=content, metadata={"data_source": "sync", "element_index": 1, "chunk_index": i})
+            for i, content in enumerate(["카카오싱크는 간편가입 기능입니다.", "간편가입 기능입니다. 설정 방법"])
+        ]
+        other = Document(page_content="카카오톡 채널 간편가입", metadata={"data_source": "channel"})
+        monkeypatch.setattr(chroma, "LEXICAL_INDEX", BM25Index().add_documents([*chunks, other]))
+
+        docs, confident = chroma.search_lexical("간편가입", top_k=2)
+        assert confident
+        passages = {"카카오싱크는 간편가입 기능입니다. 설정 방법", "카카오톡 채널 간편가입"}
+        assert {doc.page_content for doc in docs} == passages
+        # fast path는 embedding 없이 같은 후처리를 거친 결과를 반환합니다.
+        monkeypatch.setattr(chroma, "EMBEDDINGS", None)
+        assert set(chroma.get_similar_docs("간편가입", top_k=2)) == passages
+
+    def test_legacy_store_not_partitioned(self, monkeypatch):
+        monkeypatch.setattr(config, "CHROMA_PARTITION_BY_SOURCE", True)
+        monkeypatch.setattr(config, "CHROMA_COLLECTION_NAME", "test_legacy")
+        monkeypatch.setattr(chroma, "CLIENT", chromadb.EphemeralClient())
+        monkeypatch.setattr(chroma, "COLLECTIONS", {})
+        monkeypatch.setattr(chroma, "_PARTITIONED", None)
+        chroma.CLIENT.create_collection("test_legacy").add(ids=["0"], embeddings=[[1.0, 1.0]], documents=["카카오싱크"])
+
+        before = sorted(collection.name for collection in chroma.CLIENT.list_collections())
+        assert not chroma.is_partitioned()
+        # 확인하는 동안 빈 data source별 collection을 만들지 않습니다.
+        assert sorted(collection.name for collection in chroma.CLIENT.list_collections()) == before
+
+    def test_query_db_matches_single_collection(self, partitioned, monkeypatch):
+        legacy = Chroma.from_documents(
+            DOCUMENTS,
+            partitioned.get_embeddings(),
+            client=chromadb.EphemeralClient(),
+            collection_name="test_query_db",
+            collection_metadata=partitioned.get_collection_metadata(),
+        )
+        monkeypatch.setattr(partitioned, "RETRIEVER", legacy.as_retriever())
+
+        docs = partitioned.query_db("카카오싱크", metadata={"conversation_id": "test"}, only_contents=False)
+        monkeypatch.setattr(partitioned, "_PARTITIONED", False)
+        expected = partitioned.query_db("카카오싱크", metadata={"conversation_id": "test"}, only_contents=False)
+        assert [(doc.page_content, doc.metadata) for doc in docs] == [(doc.page_content, doc.metadata) for doc in expected]
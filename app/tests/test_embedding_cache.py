@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import pytest
+from langchain.embeddings.base import Embeddings
+
+import core.embedding_cache
+from core.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    model = "counting"
+
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return f"{tmp_path / 'embeddings.db'}"
+
+
+class TestCachedEmbeddings:
+
+    def test_query_hits(self, cache_path):
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, cache_path, max_size=10)
+
+        assert cached.embed_query("카카오싱크가 뭐야") == [9.0, 1.0]
+        # 공백만 다른 질문도 같은 embedding을 사용합니다.
+        assert cached.embed_query(" 카카오싱크가   뭐야 ") == [9.0, 1.0]
+        assert asyncio.run(cached.aembed_query("카카오싱크가 뭐야")) == [9.0, 1.0]
+        assert embeddings.texts == ["카카오싱크가 뭐야"]
+        assert cached.stats()["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_documents_batch(self, cache_path):
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, cache_path, max_size=10)
+        cached.embed_query("a")
+
+        vectors = cached.embed_documents(["a", "bb", "bb", "ccc"])
+        assert vectors == [[1.0, 1.0], [2.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+        # 이미 있는 text와 batch 안의 중복은 요청하지 않습니다.
+        assert embeddings.texts == ["a", "bb", "ccc"]
+
+    def test_persistent_and_lru(self, cache_path):
+        cached = CachedEmbeddings(CountingEmbeddings(), cache_path, max_size=2)
+        cached.embed_documents(["a", "bb", "ccc"])
+        assert cached.stats()["size"] == 2
+
+        embeddings = CountingEmbeddings()
+        reopened = CachedEmbeddings(embeddings, cache_path, max_size=2)
+        assert reopened.embed_documents(["a", "ccc"]) == [[1.0, 1.0], [3.0, 1.0]]
+        assert embeddings.texts == []
+        assert reopened.stats()["disk_hits"] == 2
+
+        # model이 다르면 다시 요청합니다.
+        other = CachedEmbeddings(embeddings, cache_path, max_size=2, model="other")
+        other.embed_query("a")
+        assert embeddings.texts == ["a"]
+
+    def test_async_sqlite_off_event_loop(self, cache_path, monkeypatch):
+        CachedEmbeddings(CountingEmbeddings(), cache_path, max_size=10).embed_documents(["a"])
+        threads = []
+        get_connection = core.embedding_cache.get_connection
+
+        def record(*args):
+            threads.append(threading.current_thread())
+            return get_connection(*args)
+
+        monkeypatch.setattr(core.embedding_cache, "get_connection", record)
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, cache_path, max_size=10)
+
+        async def main():
+            # disk에서 찾은 text, 새로 요청한 text, memory에서 찾은 text
+            return [await cached.aembed_query("a"), await cached.aembed_query("bb"), await cached.aembed_query("bb")]
+
+        assert asyncio.run(main()) == [[1.0, 1.0], [2.0, 1.0], [2.0, 1.0]]
+        assert embeddings.texts == ["bb"]
+        assert cached.stats()["disk_hits"] == 1
+        # 조회 두 번과 저장 한 번 모두 event loop thread가 아닌 곳에서 실행되었습니다.
+        assert len(threads) == 3
+        assert threading.main_thread() not in threads
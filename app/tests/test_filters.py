@@ -0,0 +1,67 @@
+import pytest
+from langchain.schema.document import Document
+
+from core.filters import match_filter
+from core.lexical import BM25Index
+from core.vectorstore import NumpyVectorStore
+
+DOCUMENTS = [
+    Document(page_content="카카오싱크", metadata={"data_source": "sync", "category": "Title", "element_index": 0}),
+    Document(page_content="카카오싱크 설정", metadata={"data_source": "sync", "category": "NarrativeText", "element_index": 1}),
+    Document(page_content="카카오싱크 채널", metadata={"data_source": "channel", "category": "NarrativeText", "element_index": 7}),
+    Document(page_content="카카오싱크 로그인", metadata={"data_source": "social"}),
+]
+FILTERS = [
+    {"data_source": "sync"},
+    {"category": {"$ne": "Title"}},
+    {"category": {"$in": ["Title", "없는 값"]}},
+    {"data_source": {"$nin": ["sync", "channel"]}},
+    {"element_index": {"$gt": 0}},
+    {"element_index": {"$gte": 1, "$lt": 7}},
+    {"element_index": {"$lte": 0}},
+    {"$or": [{"data_source": "social"}, {"category": "Title"}]},
+    {"$and": [{"data_source": "sync"}, {"element_index": {"$gt": 0}}]},
+]
+
+
+class TestFilters:
+
+    def test_match_filter(self):
+        metadata = {"data_source": "sync", "category": "Title"}
+        assert match_filter(metadata, {"data_source": "sync"})
+        assert not match_filter(metadata, {"category": {"$ne": "Title"}})
+        assert match_filter(metadata, {"$or": [{"data_source": "social"}, {"category": {"$in": ["Title"]}}]})
+
+    def test_match_filter_range(self):
+        metadata = {"data_source": "sync", "element_index": 1}
+        assert not match_filter(metadata, {"element_index": {"$gt": 5}})
+        assert match_filter(metadata, {"element_index": {"$gte": 1, "$lt": 5}})
+        assert not match_filter(metadata, {"element_index": {"$lte": 0}})
+        # 값이 없거나 숫자가 아니면 범위 조건에 맞지 않습니다.
+        assert not match_filter(metadata, {"chunk_index": {"$gte": 0}})
+        assert not match_filter(metadata, {"data_source": {"$gt": 0}})
+
+    @pytest.mark.parametrize("where", FILTERS)
+    def test_backends_agree(self, where):
+        expected = [match_filter(doc.metadata, where) for doc in DOCUMENTS]
+
+        store = NumpyVectorStore.from_documents(DOCUMENTS, [[1.0, 0.0]] * len(DOCUMENTS))
+        assert store.mask(where).tolist() == expected
+
+        results = BM25Index().add_documents(DOCUMENTS).search("카카오싱크", top_k=10, filters=where)
+        assert sorted(DOCUMENTS.index(doc) for doc, _, _ in results) == [i for i, match in enumerate(expected) if match]
+
+    @pytest.mark.parametrize("where", [
+        {"element_index": {"$regex": "1"}},
+        {"element_index": {"$gt": "5"}},
+        {"data_source": {"$in": "sync"}},
+        {"$and": [{"data_source": "sync"}, {"category": {"$contains": "Title"}}]},
+    ])
+    def test_invalid_filters_raise(self, where):
+        store = NumpyVectorStore.from_documents(DOCUMENTS, [[1.0, 0.0]] * len(DOCUMENTS))
+        with pytest.raises(ValueError):
+            match_filter(DOCUMENTS[0].metadata, where)
+        with pytest.raises(ValueError):
+            store.mask(where)
+        with pytest.raises(ValueError):
+            BM25Index().add_documents(DOCUMENTS).search("카카오싱크", filters=where)
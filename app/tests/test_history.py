@@ -0,0 +1,59 @@
+import json
+import os
+
+from langchain.memory import FileChatMessageHistory
+
+from core.history import SQLiteChatMessageHistory, migrate_file_histories
+
+
+class TestSQLiteChatMessageHistory:
+
+    def test_append_and_last(self, tmp_path):
+        history = SQLiteChatMessageHistory("test", str(tmp_path / "history.db"))
+        for i in range(5):
+            history.add_user_message(f"question {i}")
+            history.add_ai_message(f"answer {i}")
+
+        assert history.count() == 10
+        assert [message.content for message in history.last(2)] == ["question 4", "answer 4"]
+        assert history.messages[0].content == "question 0"
+
+        # 다른 conversation과 섞이지 않습니다.
+        assert not SQLiteChatMessageHistory("other", str(tmp_path / "history.db")).messages
+
+        history.clear()
+        assert history.count() == 0
+
+    def test_migrate_file_histories(self, tmp_path):
+        file_history = FileChatMessageHistory(str(tmp_path / "legacy.json"))
+        file_history.add_user_message("안녕하세요")
+        file_history.add_ai_message("무엇을 도와드릴까요?")
+
+        db_path = str(tmp_path / "history.db")
+        assert migrate_file_histories(str(tmp_path), db_path) == 1
+        assert os.path.exists(tmp_path / "legacy.json.migrated")
+
+        messages = SQLiteChatMessageHistory("legacy", db_path).messages
+        assert [message.content for message in messages] == ["안녕하세요", "무엇을 도와드릴까요?"]
+        assert json.loads((tmp_path / "legacy.json.migrated").read_text())
+
+    def test_migrate_file_history_into_existing(self, tmp_path):
+        db_path = str(tmp_path / "history.db")
+        history = SQLiteChatMessageHistory("legacy", db_path)
+        history.add_user_message("카카오싱크가 뭐야")
+        history.add_ai_message("간편가입 기능입니다.")
+
+        # sqlite로 옮긴 뒤 file backend에만 저장된 대화
+        file_history = FileChatMessageHistory(str(tmp_path / "legacy.json"))
+        file_history.add_user_message("안녕하세요")
+        file_history.add_ai_message("무엇을 도와드릴까요?")
+
+        assert migrate_file_histories(str(tmp_path), db_path) == 1
+        assert [message.content for message in history.messages] == [
+            "카카오싱크가 뭐야", "간편가입 기능입니다.", "안녕하세요", "무엇을 도와드릴까요?",
+        ]
+
+        # 옮기다 중단되어 파일이 남아 있으면 이미 옮긴 message는 다시 넣지 않습니다.
+        os.replace(tmp_path / "legacy.json.migrated", tmp_path / "legacy.json")
+        assert migrate_file_histories(str(tmp_path), db_path) == 1
+        assert history.count() == 4
@@ -0,0 +1,53 @@
+from langchain.schema.document import Document
+
+from core.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = [
+    Document(page_content="카카오싱크는 간편가입 기능입니다.", metadata={"data_source": "sync", "category": "NarrativeText"}),
+    Document(page_content="카카오톡 채널 추가 방법을 안내합니다.", metadata={"data_source": "channel", "category": "NarrativeText"}),
+    Document(page_content="카카오톡 채널", metadata={"data_source": "channel", "category": "Title"}),
+    Document(page_content="카카오 로그인 설정", metadata={"data_source": "social", "category": "NarrativeText"}),
+]
+
+
+class TestLexical:
+
+    def test_tokenize_ignores_spacing(self):
+        assert tokenize("카카오 싱크") == tokenize("카카오싱크!")
+        assert tokenize("앱") == ["앱"]
+
+    def test_bm25_search(self):
+        index = BM25Index().add_documents(DOCUMENTS)
+
+        doc, score, coverage = index.search("카카오 싱크", top_k=1)[0]
+        assert doc.metadata["data_source"] == "sync"
+        assert coverage == 1.0
+
+        results = index.search(
+            "채널 추가",
+            top_k=5,
+            filters={"$and": [{"data_source": "channel"}, {"category": {"$ne": "Title"}}]},
+        )
+        assert [doc.page_content for doc, _, _ in results] == [DOCUMENTS[1].page_content]
+
+    def test_replace_and_persist(self, tmp_path):
+        index = BM25Index().add_documents(DOCUMENTS)
+        index.replace_documents("data_source", "channel", [Document(page_content="채널 개설", metadata={"data_source": "channel"})])
+        assert len(index) == 3
+
+        path = f"{tmp_path / 'index.json'}"
+        index.save(path)
+        loaded = BM25Index.load(path)
+        assert loaded.search("채널 개설", top_k=1)[0][0].page_content == "채널 개설"
+
+    def test_search_range_filter(self):
+        documents = [
+            Document(page_content="카카오싱크 설정", metadata={"data_source": "sync", "element_index": i})
+            for i in range(10)
+        ]
+        results = BM25Index().add_documents(documents).search("카카오싱크", top_k=10, filters={"element_index": {"$gt": 5}})
+        assert sorted(doc.metadata["element_index"] for doc, _, _ in results) == [6, 7, 8, 9]
+
+    def test_reciprocal_rank_fusion(self):
+        a, b, c = DOCUMENTS[:3]
+        assert reciprocal_rank_fusion([[a, b], [b, c]]) == [b, a, c]
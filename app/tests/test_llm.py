@@ -1,7 +1,7 @@
 import uuid
 from pprint import pprint
 import pytest
-from core.llm import create_answer, generate_answer, clear_history
+from core.llm import create_answer, create_answers, generate_answer, clear_history
 
 
 @pytest.fixture(scope="class")
@@ -50,3 +50,23 @@ class TestLLM:
     def test_generate_answer(self, user_message: str, conversation_id: str):
         for res in generate_answer(user_message, conversation_id=conversation_id):
             print(res)
+
+    def test_create_answers(self, conversation_id: str):
+        batch = [
+            (f"{conversation_id}-{i % 2}", user_message)
+            for i, user_message in enumerate(self.test_args)
+        ]
+        results = list(create_answers(batch, concurrency=4))
+        for i in range(2):
+            clear_history(f"{conversation_id}-{i}")
+
+        assert len(results) == len(batch)
+        # 같은 conversation의 message는 순서대로 처리됩니다.
+        for i in range(2):
+            messages = [
+                result["user_message"]
+                for result in results
+                if result["conversation_id"] == f"{conversation_id}-{i}"
+            ]
+            assert messages == self.test_args[i::2]
+        pprint(results)
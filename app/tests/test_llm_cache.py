@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import langchain
+import pytest
+from langchain.schema import ChatGeneration
+from langchain.schema.messages import AIMessage
+
+from benchmarks.fakes import FakeChatModel
+from core import llm, llm_cache
+from core.llm_cache import SQLiteLLMCache
+from rxconfig import config
+
+
+def generations(text: str) -> list[ChatGeneration]:
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", True)
+    return f"{tmp_path / 'llm_cache.db'}"
+
+
+class TestSQLiteLLMCache:
+
+    def test_lookup_and_update(self, cache_path):
+        cache = SQLiteLLMCache(cache_path, ttl=60, max_size=10)
+        assert cache.lookup("Intent: 안녕하세요", "gpt-3.5-turbo-0.0") is None
+
+        cache.update("Intent: 안녕하세요", "gpt-3.5-turbo-0.0", generations("hello"))
+        assert cache.lookup("Intent: 안녕하세요", "gpt-3.5-turbo-0.0")[0].text == "hello"
+        # model 설정이 다르면 다른 응답입니다.
+        assert cache.lookup("Intent: 안녕하세요", "gpt-4-0.0") is None
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+    def test_shared_between_instances(self, cache_path):
+        SQLiteLLMCache(cache_path, ttl=60, max_size=10).update("prompt", "llm", generations("sync"))
+        assert SQLiteLLMCache(cache_path, ttl=60, max_size=10).lookup("prompt", "llm")[0].text == "sync"
+
+    def test_ttl(self, cache_path):
+        cache = SQLiteLLMCache(cache_path, ttl=0.01, max_size=10)
+        cache.update("prompt", "llm", generations("sync"))
+        time.sleep(0.02)
+        assert cache.lookup("prompt", "llm") is None
+
+    def test_eviction(self, cache_path):
+        cache = SQLiteLLMCache(cache_path, ttl=60, max_size=2)
+        cache.update("a", "llm", generations("a"))
+        cache.update("b", "llm", generations("b"))
+        assert cache.lookup("a", "llm")
+        cache.update("c", "llm", generations("c"))
+
+        assert cache.lookup("b", "llm") is None
+        assert cache.lookup("a", "llm") and cache.lookup("c", "llm")
+        assert cache.stats()["size"] == 2
+
+    def test_kill_switch(self, cache_path, monkeypatch):
+        cache = SQLiteLLMCache(cache_path, ttl=60, max_size=10)
+        cache.update("prompt", "llm", generations("sync"))
+
+        monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+        assert cache.lookup("prompt", "llm") is None
+        cache.update("other", "llm", generations("social"))
+        assert cache.stats()["size"] == 1
+
+
+class TestLLMCacheScope:
+
+    def test_only_non_streaming_chains(self, cache_path, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(config, "LLM_CACHE_PATH", cache_path)
+        monkeypatch.setattr(llm_cache, "_LLM_CACHE", None)
+        monkeypatch.setattr(llm, "LLM_DICT", {})
+
+        assert llm.get_or_create_llm("intent").llm_cache is llm_cache.get_llm_cache()
+        assert llm.get_or_create_llm("default", streaming=True).llm_cache is None
+        # process 전역 cache에는 등록하지 않습니다.
+        assert langchain.llm_cache is None
+
+    def test_other_models_not_cached(self, cache_path):
+        cached, other = FakeChatModel(response="hello"), FakeChatModel(response="hello")
+        cached.llm_cache = SQLiteLLMCache(cache_path, ttl=60, max_size=10)
+
+        for model in [cached, other]:
+            assert model.predict("안녕하세요") == "hello"
+            assert asyncio.run(model.apredict("안녕하세요")) == "hello"
+        assert cached.calls == 1
+        assert other.calls == 2
+        assert cached.llm_cache.stats()["size"] == 1
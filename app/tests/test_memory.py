@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from core import llm
+from core.history import FileSummaryChatMessageHistory, SQLiteChatMessageHistory
+from core.memory import compact_history, count_tokens, load_history_window
+
+
+@pytest.mark.usefixtures("fake_encoding")
+class TestTokenBudgetMemory:
+
+    @staticmethod
+    def create_history(tmp_path, turns: int = 10, backend: str = "sqlite") -> SQLiteChatMessageHistory | FileSummaryChatMessageHistory:
+        if backend == "file":
+            history = FileSummaryChatMessageHistory(str(tmp_path / "test.json"))
+        else:
+            history = SQLiteChatMessageHistory("test", str(tmp_path / "history.db"))
+        for i in range(turns):
+            history.add_user_message(f"카카오 싱크 질문 {i}")
+            history.add_ai_message(f"카카오 싱크 답변 {i}")
+        return history
+
+    def test_render_within_budget(self, tmp_path):
+        window = load_history_window(self.create_history(tmp_path), max_tokens=10_000)
+        assert len(window.messages) == 20
+
+        rendered = window.render(budget=50)
+        assert count_tokens(rendered) <= 50
+        assert rendered.endswith("AI: 카카오 싱크 답변 9")
+
+    @pytest.mark.parametrize(argnames="backend", argvalues=["sqlite", "file"])
+    def test_compact_history(self, tmp_path, backend: str):
+        history = self.create_history(tmp_path, backend=backend)
+        summarized = []
+
+        def summarize(summary: str, new_lines: str) -> str:
+            summarized.append(new_lines)
+            return "이전 대화 요약"
+
+        assert compact_history(history, max_tokens=60, summarize=summarize)
+        # 이미 요약된 대화는 다시 요약하지 않습니다.
+        assert not compact_history(history, max_tokens=60, summarize=summarize)
+        assert len(summarized) == 1
+        assert "질문 0" in summarized[0]
+
+        window = load_history_window(history, max_tokens=60)
+        assert window.summary == "이전 대화 요약"
+        assert "질문 0" not in window.render()
+        assert "답변 9" in window.render()
+
+        history.clear()
+        assert history.get_summary() == ("", 0)
+
+
+def wait_for_compaction(timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while llm._COMPACTING and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not llm._COMPACTING
+
+
+class TestCompactionScheduling:
+
+    def test_serialized_per_conversation(self, monkeypatch):
+        lock = threading.Lock()
+        started, release = threading.Event(), threading.Event()
+        calls, active, overlaps = [], {}, []
+
+        def compact(conversation_id: str):
+            with lock:
+                calls.append(conversation_id)
+                active[conversation_id] = active.get(conversation_id, 0) + 1
+                overlaps.append(active[conversation_id] > 1)
+            started.set()
+            release.wait(1)
+            with lock:
+                active[conversation_id] -= 1
+
+        monkeypatch.setattr(llm, "compact_conversation_history", compact)
+        assert llm.schedule_compaction("a")
+        assert started.wait(1)
+        # 요약 중에 들어온 요청은 thread를 새로 만들지 않고, 끝난 뒤 한 번만 다시 요약합니다.
+        assert not llm.schedule_compaction("a")
+        assert not llm.schedule_compaction("a")
+        assert llm.schedule_compaction("b")
+        release.set()
+
+        wait_for_compaction()
+        assert sorted(calls) == ["a", "a", "b"]
+        assert not any(overlaps)
+
+    def test_error_releases_conversation(self, monkeypatch):
+        done = threading.Event()
+
+        def fail(conversation_id: str):
+            done.set()
+            raise RuntimeError("summarize failed")
+
+        monkeypatch.setattr(llm, "compact_conversation_history", fail)
+        assert llm.schedule_compaction("c")
+        assert done.wait(1)
+        wait_for_compaction()
+        # 실패한 요약이 conversation을 막지 않습니다.
+        assert llm.schedule_compaction("c")
+        wait_for_compaction()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from core import metrics
+from rxconfig import config
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics(monkeypatch):
+    monkeypatch.setattr(config, "METRICS_ENABLED", True)
+    monkeypatch.setattr(config, "METRICS_JSONL_PATH", "")
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestMetrics:
+
+    def test_histogram_quantiles(self):
+        histogram = metrics.Histogram(window_size=100)
+        for i in range(1, 201):
+            histogram.observe(i / 1000)
+
+        quantiles = histogram.quantiles()
+        # 분위수는 최근 100개, count/sum은 전체 누적값
+        assert quantiles[0.5] == pytest.approx(0.1505)
+        assert quantiles[0.99] == pytest.approx(0.19901)
+        assert histogram.count == 200
+        assert histogram.sum == pytest.approx(20.1)
+
+    def test_span_and_export(self):
+        with metrics.span("stage.branch"):
+            pass
+        metrics.observe("stage.branch", 0.5)
+
+        exported = metrics.export_json()
+        assert exported["stage.branch"]["count"] == 2
+        assert exported["stage.branch"]["p99"] <= 0.5
+
+        text = metrics.export_prometheus()
+        assert "# TYPE answer_stage_seconds summary" in text
+        assert 'answer_stage_seconds_count{stage="stage.branch"} 2' in text
+        assert 'answer_stage_seconds{stage="stage.branch",quantile="0.95"}' in text
+
+    def test_trace_jsonl(self, tmp_path, monkeypatch):
+        path = tmp_path / "metrics.jsonl"
+        monkeypatch.setattr(config, "METRICS_JSONL_PATH", f"{path}")
+
+        with metrics.trace("conversation") as trace_id:
+            assert metrics.get_trace_id() == trace_id
+            metrics.observe("history.load", 0.1)
+        assert metrics.get_trace_id() is None
+
+        metrics.flush()
+        record = json.loads(path.read_text(encoding="utf-8"))
+        assert record["trace_id"] == trace_id
+        assert record["conversation_id"] == "conversation"
+        assert record["stage"] == "history.load"
+
+    def test_jsonl_written_in_background(self, tmp_path, monkeypatch):
+        path = tmp_path / "metrics.jsonl"
+        monkeypatch.setattr(config, "METRICS_JSONL_PATH", f"{path}")
+        monkeypatch.setattr(config, "METRICS_FLUSH_INTERVAL_SECONDS", 0.01)
+        with metrics._WRITE_LOCK:
+            for _ in range(3):
+                metrics.observe("history.load", 0.1)
+            # span을 닫을 때는 파일을 열지 않고, background thread가 모아서 씁니다.
+            assert not path.exists()
+
+        deadline = time.monotonic() + 2
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        metrics.flush()
+        assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+    def test_traced_generator(self):
+        def generate():
+            yield metrics.get_trace_id()
+            yield metrics.get_trace_id()
+            return "done"
+
+        async def agenerate():
+            yield metrics.get_trace_id()
+            yield metrics.get_trace_id()
+
+        def consume():
+            generator = metrics.traced("conversation", generate())
+            trace_ids = []
+            for trace_id in generator:
+                # yield 사이에는 호출한 쪽 context에 trace가 남지 않습니다.
+                assert metrics.get_trace_id() is None
+                trace_ids.append(trace_id)
+            return trace_ids
+
+        async def aconsume():
+            trace_ids = []
+            async for trace_id in metrics.atraced("conversation", agenerate()):
+                assert metrics.get_trace_id() is None
+                trace_ids.append(trace_id)
+            return trace_ids
+
+        for trace_ids in [consume(), asyncio.run(aconsume())]:
+            assert trace_ids[0] == trace_ids[1]
+            assert trace_ids[0].startswith("conversation-")
+
+        generator = metrics.traced("conversation", generate())
+        with pytest.raises(StopIteration) as e:
+            for _ in range(3):
+                next(generator)
+        assert e.value.value == "done"
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(config, "METRICS_ENABLED", False)
+
+        with metrics.trace("conversation") as trace_id, metrics.span("stage.branch"):
+            pass
+        assert trace_id is None
+        assert metrics.export_json() == {}
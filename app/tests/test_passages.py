@@ -0,0 +1,93 @@
+from langchain.schema.document import Document
+
+from core.passages import diversify, diversify_by_text, join_text, maximal_marginal_relevance, merge_adjacent_chunks
+
+
+def chunk(content: str, element_index: int, chunk_index: int, data_source: str = "sync", chunk_count: int = 1) -> Document:
+    metadata = {"data_source": data_source, "element_index": element_index, "chunk_index": chunk_index}
+    if chunk_count > 1:
+        metadata["chunk_count"] = chunk_count
+    return Document(page_content=content, metadata=metadata)
+
+
+class TestMaximalMarginalRelevance:
+
+    def test_prefers_diverse_candidates(self):
+        query = [0.95, 0.3]
+        # 0과 1은 거의 같은 chunk이고, 2는 덜 비슷하지만 다른 내용입니다.
+        embeddings = [[1.0, 0.0], [0.98, 0.2], [0.6, 0.8]]
+        assert maximal_marginal_relevance(query, embeddings, k=2, lambda_mult=0.5) == [1, 2]
+        assert maximal_marginal_relevance(query, embeddings, k=2, lambda_mult=1.0) == [1, 0]
+
+    def test_k_larger_than_candidates(self):
+        assert maximal_marginal_relevance([1.0, 0.0], [[1.0, 0.0]], k=3) == [0]
+        assert maximal_marginal_relevance([1.0, 0.0], [], k=3) == []
+
+
+class TestMergeAdjacentChunks:
+
+    def test_join_text_removes_overlap(self):
+        assert join_text("카카오싱크는 간편가입 기능입니다.", "간편가입 기능입니다. 설정 방법") == "카카오싱크는 간편가입 기능입니다. 설정 방법"
+        assert join_text("첫 문단", "두 번째 문단") == "첫 문단\n\n두 번째 문단"
+
+    def test_merges_consecutive_chunks(self):
+        docs = [
+            chunk("다른 문서", 3, 0),
+            chunk("간편가입 기능입니다. 설정 방법", 1, 1),
+            chunk("카카오싱크는 간편가입 기능입니다.", 1, 0),
+        ]
+        merged = merge_adjacent_chunks(docs)
+        assert [doc.page_content for doc in merged] == ["다른 문서", "카카오싱크는 간편가입 기능입니다. 설정 방법"]
+        assert merged[1].metadata["chunk_index"] == 0
+        assert merged[1].metadata["chunk_count"] == 2
+
+    def test_keeps_non_adjacent_chunks(self):
+        docs = [chunk("첫 chunk", 1, 0), chunk("세 번째 chunk", 1, 2), chunk("다른 source", 1, 1, "channel")]
+        assert merge_adjacent_chunks(docs) == docs
+
+    def test_keeps_chunks_without_index(self):
+        docs = [Document(page_content="이전 data", metadata={"data_source": "sync"}), chunk("새 data", 1, 0)]
+        assert merge_adjacent_chunks(docs) == docs
+
+    def test_merge_is_idempotent(self):
+        # vector 결과의 passage(0~1)와 lexical 결과의 chunk(1, 2)를 합쳐도 내용이 두 번 들어가지 않습니다.
+        docs = [
+            chunk("카카오싱크는 간편가입 기능입니다. 설정 방법", 1, 0, chunk_count=2),
+            chunk("간편가입 기능입니다. 설정 방법", 1, 1),
+            chunk("설정 방법을 안내합니다.", 1, 2),
+        ]
+        merged = merge_adjacent_chunks(docs)
+        assert [doc.page_content for doc in merged] == ["카카오싱크는 간편가입 기능입니다. 설정 방법을 안내합니다."]
+        assert merged[0].metadata["chunk_count"] == 3
+        assert merge_adjacent_chunks(merged) == merged
+
+
+class TestDiversify:
+
+    def test_merges_neighbours_before_mmr(self):
+        docs = [
+            chunk("카카오싱크는 간편가입 기능입니다.", 1, 0),
+            chunk("간편가입 기능입니다. 설정 방법", 1, 1),
+            chunk("카카오톡 채널", 2, 0),
+        ]
+        # 이웃 chunk 0, 1은 서로 비슷해서 먼저 MMR을 적용하면 1이 빠집니다.
+        embeddings = [[1.0, 0.0], [0.98, 0.2], [0.6, 0.8]]
+        assert maximal_marginal_relevance([0.95, 0.3], embeddings, k=2) == [1, 2]
+
+        selected = diversify([0.95, 0.3], docs, embeddings, k=2, lambda_mult=0.5)
+        assert [doc.page_content for doc in selected] == ["카카오싱크는 간편가입 기능입니다. 설정 방법", "카카오톡 채널"]
+
+        selected = diversify([0.95, 0.3], docs, embeddings, k=2, lambda_mult=0.5, merge=False)
+        assert [doc.page_content for doc in selected] == ["간편가입 기능입니다. 설정 방법", "카카오톡 채널"]
+
+    def test_diversify_by_text(self):
+        docs = [
+            chunk("카카오싱크 간편가입 설정", 1, 0),
+            chunk("카카오싱크 간편가입 설정 방법", 3, 0),
+            chunk("카카오싱크 동의 항목", 2, 0),
+            chunk("항목을 설정합니다.", 2, 1),
+        ]
+        selected = diversify_by_text(docs, [3.0, 2.9, 2.0, 0.5], k=2, lambda_mult=0.5)
+        # 거의 같은 내용인 두 번째 chunk 대신, 이웃 chunk를 합친 다른 passage를 고릅니다.
+        assert [doc.page_content for doc in selected] == ["카카오싱크 간편가입 설정", "카카오싱크 동의 항목\n\n항목을 설정합니다."]
+        assert diversify_by_text(docs, [3.0, 2.9, 2.0, 0.5], k=2, lambda_mult=1.0)[1].page_content == "카카오싱크 간편가입 설정 방법"
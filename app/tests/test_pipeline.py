@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from core.pipeline import Stage, StageGraph, run_sync
+
+
+def value(result, calls: list[str], name: str):
+    async def func(**kwargs):
+        calls.append(name)
+        return result(**kwargs) if callable(result) else result
+    return func
+
+
+class TestStageGraph:
+
+    def test_runs_only_requested_stages(self):
+        calls = []
+        graph = StageGraph([
+            Stage("a", value(1, calls, "a")),
+            Stage("b", value(lambda a: a + 1, calls, "b"), deps=("a",)),
+            Stage("unused", value(0, calls, "unused"), deps=("a",)),
+        ])
+
+        assert asyncio.run(graph.get("b")) == 2
+        # 의존하는 stage는 한 번만 실행되고, 아무도 요청하지 않은 stage는 실행되지 않습니다.
+        assert calls == ["a", "b"]
+        assert graph.result("b") == 2
+        assert graph.result("unused", "skipped") == "skipped"
+
+    def test_independent_stages_run_concurrently(self):
+        a_started, b_started = asyncio.Event(), asyncio.Event()
+
+        async def a():
+            a_started.set()
+            await b_started.wait()
+            return "a"
+
+        async def b():
+            b_started.set()
+            await a_started.wait()
+            return "b"
+
+        async def run():
+            graph = StageGraph([Stage("a", a), Stage("b", b), Stage("c", value(lambda a, b: a + b, [], "c"), deps=("a", "b"))])
+            # 서로를 기다리므로 동시에 실행되지 않으면 끝나지 않습니다.
+            return await asyncio.wait_for(graph.gather("c", "a"), timeout=1)
+
+        assert asyncio.run(run()) == {"c": "ab", "a": "a"}
+
+    def test_start_prefetches_stage(self):
+        calls = []
+
+        async def run():
+            graph = StageGraph([Stage("a", value(1, calls, "a")), Stage("b", value(2, calls, "b"))])
+            graph.start("a")
+            await asyncio.sleep(0)
+            assert calls == ["a"]
+            await graph.aclose()
+
+        asyncio.run(run())
+
+    def test_unknown_stage(self):
+        with pytest.raises(ValueError, match="unknown stage 'missing'"):
+            StageGraph([Stage("a", value(1, [], "a"), deps=("missing",))])
+
+        graph = StageGraph([Stage("a", value(1, [], "a"))])
+        with pytest.raises(ValueError, match="unknown stage 'b'"):
+            asyncio.run(graph.get("b"))
+
+    def test_cycle(self):
+        with pytest.raises(ValueError, match="cycle detected"):
+            StageGraph([
+                Stage("a", value(1, [], "a"), deps=("c",)),
+                Stage("b", value(1, [], "b"), deps=("a",)),
+                Stage("c", value(1, [], "c"), deps=("b",)),
+            ])
+
+    def test_aclose_cancels_pending_stages(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append("slow")
+                raise
+
+        async def fail():
+            raise RuntimeError("failed")
+
+        async def run():
+            graph = StageGraph([Stage("fast", value(1, [], "fast")), Stage("slow", slow), Stage("fail", fail)])
+            graph.start("slow", "fail")
+            assert await graph.get("fast") == 1
+            await graph.aclose()
+            return graph
+
+        graph = asyncio.run(asyncio.wait_for(run(), timeout=1))
+        assert cancelled == ["slow"]
+        # 취소되거나 실패한 stage의 결과는 default입니다.
+        assert graph.result("slow", "cancelled") == "cancelled"
+        assert graph.result("fail", "failed") == "failed"
+        assert graph.result("fast") == 1
+
+
+class TestRunSync:
+
+    def test_without_running_loop(self):
+        assert run_sync(asyncio.sleep(0, result="done")) == "done"
+
+    def test_inside_running_loop(self):
+        async def run():
+            return run_sync(asyncio.sleep(0, result="done"))
+
+        assert asyncio.run(run()) == "done"
+
+    def test_error(self):
+        async def fail():
+            raise ValueError("failed")
+
+        async def run():
+            return run_sync(fail())
+
+        with pytest.raises(ValueError, match="failed"):
+            asyncio.run(run())
@@ -0,0 +1,39 @@
+import pytest
+from langchain.prompts import PromptTemplate
+from langchain.schema.messages import AIMessage, HumanMessage
+
+from core.memory import HistoryWindow, count_tokens
+from core.prompt_builder import PromptBuilder
+from core.prompts import DEFAULT_RESPONSE
+from rxconfig import config
+
+
+@pytest.mark.usefixtures("fake_encoding")
+class TestPromptBuilder:
+
+    def test_build_reports_tokens(self):
+        builder = PromptBuilder(PromptTemplate.from_template(DEFAULT_RESPONSE), history_budget=100)
+        context = dict(
+            user_message="카카오 싱크가 뭐야",
+            related_documents=["카카오싱크는 간편가입 설루션입니다.", "동의 화면에서 약관까지 동의받습니다."],
+            chat_history=HistoryWindow(messages=[HumanMessage(content="안녕하세요"), AIMessage(content="반갑습니다")]),
+        )
+        inputs, report = builder.build(context)
+
+        assert "간편가입" in inputs["related_documents"]
+        assert inputs["chat_history"] == "Human: 안녕하세요\nAI: 반갑습니다"
+        prompt = builder.prompt.format(**{key: inputs[key] for key in builder.variables})
+        # section 단위로 센 token 수는 완성된 prompt와 거의 같아야 합니다.
+        assert abs(report.total - count_tokens(prompt)) <= len(builder.variables) * 2
+
+    def test_documents_fit_context_window(self):
+        builder = PromptBuilder(PromptTemplate.from_template(DEFAULT_RESPONSE))
+        chunk = "카카오싱크 " * 200
+        inputs, report = builder.build(dict(
+            user_message="카카오 싱크가 뭐야",
+            related_documents=[chunk] * 100,
+            chat_history="",
+        ))
+
+        assert report.dropped_documents > 0
+        assert report.total <= config.DEFAULT_OPENAI_CONTEXT_WINDOW - config.DEFAULT_OPENAI_MAX_TOKENS
@@ -0,0 +1,132 @@
+import asyncio
+
+import openai
+import pytest
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chat_models import ChatOpenAI
+from langchain.chat_models import openai as chat_openai
+from langchain.schema.messages import HumanMessage
+
+import core.ratelimit
+from core.ratelimit import BATCH, INTERACTIVE, RateLimitedChatOpenAI, RateLimiter, call_with_backoff
+from rxconfig import config
+
+
+class TokenCollector(BaseCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.tokens.append(token)
+
+
+def chunk(content: str) -> dict:
+    return {"choices": [{"delta": {"role": "assistant", "content": content}}]}
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """
+    "안녕", "하세요"를 streaming 하는 가짜 OpenAI 응답.
+    fail_after개의 chunk를 보낸 뒤 첫 요청만 연결 오류로 끊깁니다.
+    """
+    monkeypatch.setattr(config, "RATE_LIMIT_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(core.ratelimit, "count_tokens", len)
+    state = {"calls": 0, "fail_after": 0}
+
+    def chunks():
+        state["calls"] += 1
+        for i, content in enumerate(["", "안녕", "하세요"]):
+            if state["calls"] == 1 and i == state["fail_after"]:
+                raise openai.error.APIConnectionError("connection reset")
+            yield chunk(content)
+
+    async def achunks():
+        for item in chunks():
+            yield item
+
+    async def acompletion_with_retry(llm, run_manager=None, **kwargs):
+        return achunks()
+
+    monkeypatch.setattr(ChatOpenAI, "completion_with_retry", lambda self, run_manager=None, **kwargs: chunks())
+    monkeypatch.setattr(chat_openai, "acompletion_with_retry", acompletion_with_retry)
+    return state
+
+
+def predict(model: RateLimitedChatOpenAI, collector: TokenCollector, use_async: bool) -> str:
+    messages = [HumanMessage(content="안녕")]
+    if use_async:
+        return asyncio.run(model.apredict_messages(messages, callbacks=[collector])).content
+    return model.predict_messages(messages, callbacks=[collector]).content
+
+
+class TestRateLimiter:
+
+    def test_priority_order(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000)
+        limiter._requests = 0
+        order = []
+
+        async def request(name: str, priority_level: int):
+            await limiter.aacquire(1, priority_level)
+            order.append(name)
+
+        async def main():
+            await asyncio.gather(
+                *[request(f"batch-{i}", BATCH) for i in range(2)],
+                *[request(f"interactive-{i}", INTERACTIVE) for i in range(2)],
+            )
+
+        asyncio.run(main())
+        assert order == ["interactive-0", "interactive-1", "batch-0", "batch-1"]
+        assert limiter.stats()["acquired"] == 4
+
+    def test_token_budget(self):
+        limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=6000, poll_seconds=0.01)
+        limiter.acquire(6000)
+        assert limiter.stats()["wait_ms_max"] < 100
+        # 100 token은 1초에 채워집니다.
+        limiter.acquire(50)
+        assert 300 < limiter.stats()["wait_ms_max"] < 1500
+
+    def test_call_with_backoff(self, monkeypatch):
+        monkeypatch.setattr(config, "RATE_LIMIT_BACKOFF_BASE_SECONDS", 0.01)
+        calls = []
+
+        def request():
+            calls.append(1)
+            if len(calls) < 3:
+                raise openai.error.RateLimitError("rate limited")
+            return "ok"
+
+        assert call_with_backoff(request, tokens=1) == "ok"
+        assert len(calls) == 3
+
+        monkeypatch.setattr(config, "RATE_LIMIT_MAX_RETRIES", 0)
+        calls.clear()
+        with pytest.raises(openai.error.RateLimitError):
+            call_with_backoff(request, tokens=1)
+
+    @pytest.mark.parametrize("use_async", [False, True])
+    def test_stream_retried_before_first_token(self, stream, use_async):
+        # 빈 role chunk만 보낸 뒤 끊기면 사용자에게 보낸 token이 없으므로 다시 요청합니다.
+        stream["fail_after"] = 1
+        model = RateLimitedChatOpenAI(openai_api_key="test", streaming=True)
+        collector = TokenCollector()
+
+        assert predict(model, collector, use_async) == "안녕하세요"
+        assert stream["calls"] == 2
+        assert "".join(collector.tokens) == "안녕하세요"
+
+    @pytest.mark.parametrize("use_async", [False, True])
+    def test_stream_not_retried_after_token(self, stream, use_async):
+        # "안녕"을 보낸 뒤 끊기면 다시 요청해도 "안녕"이 한 번 더 나가므로 오류를 그대로 냅니다.
+        stream["fail_after"] = 2
+        model = RateLimitedChatOpenAI(openai_api_key="test", streaming=True)
+        collector = TokenCollector()
+
+        with pytest.raises(openai.error.APIConnectionError):
+            predict(model, collector, use_async)
+        assert stream["calls"] == 1
+        assert "".join(collector.tokens) == "안녕"
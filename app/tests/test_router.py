@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+from pprint import pprint
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+import core
+from core import chroma, llm, preprocess, router
+from core.router import EmbeddingRouter, get_or_create_router, evaluate_router
+from rxconfig import config
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """OpenAI 대신 글자 bigram embedding으로 router를 만듭니다."""
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(router, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(router, "ROUTERS", {})
+    monkeypatch.setattr(preprocess, "SUMMARY", {})
+    return embeddings
+
+
+class TestRouter:
+
+    @pytest.mark.parametrize(
+        argnames="name, user_message, expected",
+        argvalues=[
+            ("intent", "안녕하세요~", "hello"),
+            ("intent", "카카오 채널 메시지는 어떻게 보내?", "question"),
+            ("branch", "카카오싱크 간편가입 설정 방법", "sync"),
+            ("branch", "카카오톡 친구 목록 가져오기", "social"),
+        ]
+    )
+    def test_predict(self, embeddings, name: str, user_message: str, expected: str):
+        label, confidence = get_or_create_router(name).predict(user_message)
+        print(label, confidence)
+        assert label == expected
+
+    @pytest.mark.parametrize(argnames="name", argvalues=["intent", "branch"])
+    def test_evaluate_router(self, embeddings, name: str):
+        other = FakeEmbeddings()
+        report = evaluate_router(name, embeddings=other)
+        pprint(report)
+        assert 0 <= report["accuracy"] <= 1
+        assert report["examples"] == sum(len(texts) for texts in router.get_examples(name).values())
+        # 주어진 embedding으로 예시를 한 번에 embedding 합니다.
+        assert other.calls == 1 and embeddings.calls == 0
+
+    def test_softmax_scale(self, monkeypatch):
+        embeddings = FakeEmbeddings()
+        model = EmbeddingRouter({"sync": ["카카오싱크 간편가입"], "channel": ["카카오톡 채널 추가"]}, embeddings).fit()
+        vector = embeddings.embed_query("카카오싱크 간편가입 설정")
+
+        monkeypatch.setattr(config, "ROUTER_SOFTMAX_SCALE", 1.0)
+        label, low = model.predict_vector(vector)
+        monkeypatch.setattr(config, "ROUTER_SOFTMAX_SCALE", 100.0)
+        scaled_label, high = model.predict_vector(vector)
+        # scale은 label을 바꾸지 않고 확신도만 벌립니다.
+        assert label == scaled_label == "sync"
+        assert 0.5 < low < high
+
+    def test_preprocess_resets_branch_router(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(router, "ROUTERS", {"branch": object(), "intent": object()})
+        path = tmp_path / "RESULT.json"
+        path.write_text(json.dumps({"sync": "카카오싱크 요약"}), encoding="utf-8")
+        monkeypatch.setattr(preprocess, "SUCCESS_PATH", f"{path}")
+        monkeypatch.setattr(preprocess, "SUMMARY", {})
+
+        preprocess.load_data_and_upload_chroma()
+        # 새 data source 요약으로 branch centroid를 다시 계산하고, intent router는 그대로 둡니다.
+        assert list(router.ROUTERS) == ["intent"]
+
+    def test_intent_uses_llm_with_history(self, fake_llm, monkeypatch):
+        monkeypatch.setattr(config, "ROUTER_ENABLED", True)
+
+        async def aroute(name: str, vector: list[float]) -> str:
+            return {"intent": "hello", "branch": "sync"}[name]
+
+        monkeypatch.setattr(fake_llm, "aroute", aroute)
+        intent_llm = fake_llm.CHAIN_DICT["intent"].llm
+
+        context = asyncio.run(fake_llm.aprepare_context("그거 버그 같아", "router"))
+        assert context["intent"] == "hello"
+        assert intent_llm.calls == 0
+
+        fake_llm.save_history("router", "카카오싱크가 뭐야", "카카오싱크는 간편가입 기능입니다.")
+        context = asyncio.run(fake_llm.aprepare_context("그거 버그 같아", "router"))
+        # 대화 기록이 있으면 질문만으로 intent를 정하지 않고 LLM이 판단합니다.
+        assert context["intent"] == "question"
+        assert intent_llm.calls == 1
+
+    def test_init_fits_routers(self, embeddings, monkeypatch):
+        monkeypatch.setattr(core, "_INITIALIZED", False)
+        monkeypatch.setattr(chroma, "init_chroma", lambda: None)
+        monkeypatch.setattr(llm, "init_chains", lambda: None)
+        monkeypatch.setattr(preprocess, "load_data_and_upload_chroma", lambda: None)
+
+        core.init()
+        # 첫 질문이 아니라 초기화할 때 예시를 embedding 합니다.
+        assert sorted(router.ROUTERS) == ["branch", "intent"]
+        assert embeddings.calls == 2
+
+
+class TestClassify:
+
+    @pytest.fixture
+    def classify(self, monkeypatch):
+        """embedding 지연과 router 결과를 정할 수 있는 aclassify. fallback의 시작/취소를 기록합니다."""
+        monkeypatch.setattr(config, "ROUTER_FALLBACK_DELAY_SECONDS", 0.05)
+        state = {"label": "sync", "embedding_latency": 0.0, "fallback_latency": 0.0, "started": 0, "cancelled": 0}
+
+        async def aroute(name: str, vector: list[float]):
+            return state["label"]
+
+        async def embedding() -> list[float]:
+            await asyncio.sleep(state["embedding_latency"])
+            return [1.0, 0.0]
+
+        async def fallback() -> str:
+            state["started"] += 1
+            try:
+                await asyncio.sleep(state["fallback_latency"])
+            except asyncio.CancelledError:
+                state["cancelled"] += 1
+                raise
+            return "social"
+
+        monkeypatch.setattr(llm, "aroute", aroute)
+
+        def run() -> tuple[str, float]:
+            started = time.perf_counter()
+            label = asyncio.run(llm.aclassify("branch", embedding, fallback))
+            return label, time.perf_counter() - started
+
+        state["run"] = run
+        return state
+
+    def test_confident_router_skips_llm(self, classify):
+        assert classify["run"]()[0] == "sync"
+        assert classify["started"] == 0
+
+    def test_slow_embedding_starts_llm_then_cancels(self, classify):
+        classify.update(embedding_latency=0.2, fallback_latency=5.0)
+        label, elapsed = classify["run"]()
+        assert label == "sync"
+        assert classify["started"] == classify["cancelled"] == 1
+        assert elapsed < 1
+
+    def test_unsure_router_overlaps_llm(self, classify):
+        classify.update(label=None, embedding_latency=0.2, fallback_latency=0.2)
+        label, elapsed = classify["run"]()
+        assert label == "social"
+        assert classify["started"] == 1 and classify["cancelled"] == 0
+        # embedding을 기다린 뒤 LLM을 호출했다면 0.4초 이상 걸립니다.
+        assert elapsed < 0.35
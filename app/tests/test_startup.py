@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import core에 허용하는 시간(초)
+IMPORT_BUDGET_SECONDS = float(os.getenv("CORE_IMPORT_BUDGET_SECONDS", "0.2"))
+
+
+def run_python(code: str) -> dict:
+    """새 interpreter에서 code를 실행하고, 마지막 줄에 출력한 JSON을 반환합니다."""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartup:
+
+    def test_import_core_budget(self):
+        result = run_python(
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import core\n"
+            "elapsed = time.perf_counter() - started\n"
+            "heavy = [name for name in ('langchain', 'chromadb', 'unstructured', 'reflex') if name in sys.modules]\n"
+            "print(json.dumps({'elapsed': elapsed, 'heavy': heavy, 'initialized': core.is_initialized()}))\n"
+        )
+        assert result["heavy"] == []
+        assert not result["initialized"]
+        assert result["elapsed"] < IMPORT_BUDGET_SECONDS
+
+    def test_import_llm_has_no_side_effects(self):
+        result = run_python(
+            "import json, sys\n"
+            "import core, core.chroma, core.llm\n"
+            "print(json.dumps({\n"
+            "    'chains': list(core.llm.CHAIN_DICT),\n"
+            "    'chroma': core.chroma.DB is not None,\n"
+            "    'initialized': core.is_initialized(),\n"
+            "    'heavy': [name for name in ('chromadb', 'unstructured') if name in sys.modules],\n"
+            "}))\n"
+        )
+        assert result == {"chains": [], "chroma": False, "initialized": False, "heavy": []}
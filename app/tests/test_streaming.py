@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+from langchain.schema import ChatGeneration, ChatResult
+from langchain.schema.messages import AIMessage
+
+from benchmarks.fakes import FakeChatModel
+from core.streaming import amerge_in_order, astream_chain, merge_in_order, stream_chain
+
+
+def slow(items: list[str], delay: float):
+    for item in items:
+        time.sleep(delay)
+        yield item
+
+
+async def aslow(items: list[str], delay: float):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+class TestMergeInOrder:
+
+    def test_concurrent_and_ordered(self):
+        started = time.perf_counter()
+        merged = list(merge_in_order([slow(["a", "b", "c"], 0.05), slow(["d", "e", "f"], 0.05)]))
+
+        assert merged == [(0, "a"), (0, "b"), (0, "c"), (1, "d"), (1, "e"), (1, "f")]
+        # 두 iterator가 동시에 실행되어 하나를 소비하는 시간과 비슷합니다.
+        assert time.perf_counter() - started < 0.25
+
+    def test_error(self):
+        def fail():
+            yield "a"
+            raise ValueError("failed")
+
+        merged = merge_in_order([slow(["x"], 0.01), fail()])
+        assert next(merged) == (0, "x")
+        assert next(merged) == (1, "a")
+        with pytest.raises(ValueError):
+            next(merged)
+
+    def test_async(self):
+        async def collect():
+            return [item async for item in amerge_in_order([aslow(["a", "b"], 0.05), aslow(["c", "d"], 0.05)])]
+
+        started = time.perf_counter()
+        assert asyncio.run(collect()) == [(0, "a"), (0, "b"), (1, "c"), (1, "d")]
+        assert time.perf_counter() - started < 0.18
+
+
+def make_chain(llm: FakeChatModel) -> LLMChain:
+    return LLMChain(llm=llm, prompt=PromptTemplate.from_template("{question}"))
+
+
+class TestStreamChain:
+
+    def test_tokens_in_order(self):
+        llm = FakeChatModel(response="카카오싱크는 간편가입 기능입니다.")
+        assert list(stream_chain(make_chain(llm), {"question": "카카오싱크"})) == llm.get_tokens()
+
+    def test_tokens_arrive_before_chain_finishes(self):
+        released = threading.Event()
+
+        class GatedChatModel(FakeChatModel):
+            def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+                run_manager.on_llm_new_token("안녕")
+                # 소비하는 쪽이 첫 token을 받은 뒤에야 나머지를 생성합니다.
+                if not released.wait(timeout=1):
+                    raise TimeoutError("first token was not streamed")
+                run_manager.on_llm_new_token("하세요")
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content="안녕하세요"))])
+
+        tokens = stream_chain(make_chain(GatedChatModel()), {"question": "인사"})
+        assert next(tokens) == "안녕"
+        released.set()
+        assert list(tokens) == ["하세요"]
+
+    def test_error_reaches_consumer(self):
+        class FailingChatModel(FakeChatModel):
+            def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+                run_manager.on_llm_new_token("안녕")
+                raise ValueError("failed")
+
+        tokens = stream_chain(make_chain(FailingChatModel()), {"question": "인사"})
+        assert next(tokens) == "안녕"
+        with pytest.raises(ValueError, match="failed"):
+            next(tokens)
+
+    def test_without_streaming(self):
+        class BlockingChatModel(FakeChatModel):
+            def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+                return super()._generate(messages, stop=stop, **kwargs)
+
+        llm = BlockingChatModel(response="안녕하세요")
+        assert list(stream_chain(make_chain(llm), {"question": "인사"})) == ["안녕하세요"]
+
+    def test_async(self):
+        class FailingChatModel(FakeChatModel):
+            async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+                await run_manager.on_llm_new_token("안녕")
+                raise ValueError("failed")
+
+        async def collect(llm: FakeChatModel) -> list[str]:
+            return [token async for token in astream_chain(make_chain(llm), {"question": "인사"})]
+
+        llm = FakeChatModel(response="카카오싱크는 간편가입 기능입니다.", token_latency=0.01)
+        assert asyncio.run(collect(llm)) == llm.get_tokens()
+
+        tokens = []
+
+        async def collect_until_error():
+            async for token in astream_chain(make_chain(FailingChatModel()), {"question": "인사"}):
+                tokens.append(token)
+
+        with pytest.raises(ValueError, match="failed"):
+            asyncio.run(collect_until_error())
+        assert tokens == ["안녕"]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from langchain.schema.document import Document
+
+from core.vectorstore import NumpyVectorStore
+
+DOCUMENTS = [
+    Document(page_content="카카오싱크", metadata={"data_source": "sync", "category": "Title"}),
+    Document(page_content="카카오싱크는 간편가입 기능입니다.", metadata={"data_source": "sync", "category": "NarrativeText"}),
+    Document(page_content="카카오톡 채널", metadata={"data_source": "channel", "category": "Title"}),
+    Document(page_content="카카오톡 채널 추가 방법", metadata={"data_source": "channel", "category": "NarrativeText"}),
+    Document(page_content="카카오 로그인 설정", metadata={"data_source": "social"}),
+]
+EMBEDDINGS = [
+    [1.0, 0.0, 0.0],
+    [0.9, 0.1, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.1, 0.9, 0.0],
+    [0.0, 0.0, 2.0],
+]
+
+
+@pytest.fixture
+def store():
+    return NumpyVectorStore.from_documents(DOCUMENTS, EMBEDDINGS)
+
+
+class TestNumpyVectorStore:
+
+    def test_search_matches_exact_cosine(self, store):
+        query = [0.7, 0.3, 0.1]
+        vectors = np.asarray(EMBEDDINGS)
+        similarities = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+
+        hits, = store.search([query], top_k=3)
+        assert [doc.page_content for doc, _ in hits] == [DOCUMENTS[i].page_content for i in np.argsort(-similarities)[:3]]
+        assert hits[0][1] == pytest.approx(1 - similarities.max(), abs=1e-6)
+
+    def test_filters(self, store):
+        filters = {"$and": [{"data_source": "sync"}, {"category": {"$ne": "Title"}}]}
+        hits, = store.search([[1.0, 0.0, 0.0]], top_k=5, filters=filters)
+        assert [doc.page_content for doc, _ in hits] == [DOCUMENTS[1].page_content]
+
+        assert store.mask({"category": {"$in": ["Title", "없는 값"]}}).tolist() == [True, False, True, False, False]
+        assert store.mask({"$or": [{"data_source": "social"}, {"category": "Title"}]}).sum() == 3
+        assert store.mask({"data_source": "없는 값"}).sum() == 0
+        assert store.search([[1.0, 0.0, 0.0]], top_k=5, filters={"data_source": "없는 값"}) == [[]]
+
+    def test_batch_search(self, store):
+        batches = store.search([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], top_k=1)
+        assert [hits[0][0].page_content for hits in batches] == ["카카오싱크", "카카오톡 채널"]
+        assert batches[0][0][0].metadata == DOCUMENTS[0].metadata
+
+    def test_save_and_load(self, store, tmp_path):
+        path = f"{tmp_path / 'project.vectors'}"
+        store.save(path)
+        assert NumpyVectorStore.exists(path)
+
+        loaded = NumpyVectorStore.load(path)
+        assert isinstance(loaded.vectors, np.memmap)
+        assert loaded.search([[0.0, 0.0, 1.0]], top_k=1)[0][0][0].metadata == {"data_source": "social"}
+
+        NumpyVectorStore.remove(path)
+        assert not NumpyVectorStore.exists(path)
+
+    @pytest.mark.parametrize("quantization", ["float16", "int8"])
+    def test_quantized_search_reranks(self, quantization, tmp_path):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 32)).astype(np.float32)
+        documents = [Document(page_content=f"{i}", metadata={"data_source": "sync" if i % 2 else "social"}) for i in range(200)]
+        exact = NumpyVectorStore.from_documents(documents, vectors)
+        path = f"{tmp_path / 'project.vectors'}"
+        exact.save(path)
+        quantized = NumpyVectorStore.load(path, quantization=quantization, rerank_multiplier=4)
+
+        assert quantized.nbytes < exact.nbytes
+        queries = vectors[:10] + 0.1 * rng.normal(size=(10, 32)).astype(np.float32)
+        expected, expected_scores = exact.search_indices(queries, top_k=5, filters={"data_source": "sync"})
+        found, scores = quantized.search_indices(queries, top_k=5, filters={"data_source": "sync"})
+        assert found.tolist() == expected.tolist()
+        # re-ranking 후의 점수는 float32로 계산한 정확한 값입니다.
+        assert scores == pytest.approx(expected_scores, abs=1e-5)